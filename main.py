@@ -1,13 +1,36 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from src.router import router
-from src.database import Base, engine
+
+from src.cache import cache_bus
 from src.config import APP_ENV
+from src.execution import execution_engine
+from src.ingestion import price_ingestor
+from src.instrumentation import MetricsMiddleware
 from src.migration_examples import create_examples
+from src.migrations import migrate
+from src.passwords import password_hasher
+from src.router import router
+from src.streaming import stream_hub
 
 if APP_ENV == 'DEV':
-    Base.metadata.create_all(bind=engine)
+    migrate()
     create_examples()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    cache_bus.start()
+    price_ingestor.start()
+    execution_engine.start()
+    stream_hub.start()
+    yield
+    stream_hub.stop()
+    execution_engine.stop()
+    price_ingestor.stop()
+    cache_bus.stop()
+    password_hasher.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(router)
\ No newline at end of file
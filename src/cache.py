@@ -0,0 +1,597 @@
+"""Caches de respuestas ya serializadas y su invalidación entre workers.
+
+Dos backends con la misma interfaz (get / set / invalidate / stats, y aget / aset
+para los handlers async): TTLCache, en memoria del proceso, y RedisCache,
+compartido entre workers en cualquier servidor que hable RESP (Redis, Valkey,
+KeyDB). FakeRedis implementa en proceso el
+subconjunto de comandos que se usa, para tests (CACHE_URL=fake://).
+
+Toda invalidación pasa por el CacheBus: se aplica en el proceso y, si hay
+CACHE_URL, se publica en CACHE_CHANNEL; cada worker escucha el canal en un hilo y
+descarta sus entradas locales. Si la suscripción se corta, al reconectar se vacían
+los caches locales: los mensajes perdidos no se pueden recuperar.
+"""
+import fnmatch
+import hashlib
+import json
+import queue
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from typing import Any, NamedTuple, Optional
+from urllib.parse import unquote, urlsplit
+
+from fastapi import Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import TypeAdapter
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from src.config import (
+    CACHE_BACKEND,
+    CACHE_CHANNEL,
+    CACHE_POOL_SIZE,
+    CACHE_URL,
+    CATALOGUE_CACHE_SIZE,
+    CATALOGUE_CACHE_TTL,
+    USER_CACHE_SIZE,
+    USER_CACHE_TTL,
+)
+from src.models import Stock
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+
+
+class TTLCache:
+    """LRU acotado con expiración por entrada; seguro entre threads"""
+    def __init__(self, maxsize: int = 128, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key: str, value: Any, ttl: float | None = None) -> Any:
+        """`ttl` reemplaza el del cache para esta entrada"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+    
+    # En memoria no hay E/S: los handlers async lo usan sin salir del event loop
+    async def aget(self, key: str) -> Any | None:
+        return self.get(key)
+    
+    async def aset(self, key: str, value: Any, ttl: float | None = None) -> Any:
+        return self.set(key, value, ttl)
+    
+    def invalidate(self, key: str | None = None):
+        """Elimina una entrada, o todo el cache si no se indica key"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+    
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class RespError(Exception):
+    """Respuesta de error del servidor (-ERR ...)"""
+
+
+def _encode_command(args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+def _read_reply(file):
+    line = file.readline()
+    if not line:
+        raise ConnectionError("Conexión cerrada por el servidor")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload
+    if kind == b"-":
+        raise RespError(payload.decode())
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = file.read(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        length = int(payload)
+        return None if length < 0 else [_read_reply(file) for _ in range(length)]
+    raise RespError(f"Respuesta RESP inválida: {line!r}")
+
+
+class RespClient:
+    """Cliente mínimo de RESP2 sin dependencias. Cada comando usa una conexión
+    del pool (hasta `pool_size` ociosas), así los threads no esperan uno detrás
+    de otro; si la conexión se cae, se descartan las ociosas y se reintenta una vez"""
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0,
+                 password: str | None = None, timeout: float = 1.0, pool_size: int = 16):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._idle: list = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url: str, **options) -> "RespClient":
+        parts = urlsplit(url)
+        return cls(
+            host=parts.hostname or "localhost",
+            port=parts.port or 6379,
+            db=int(parts.path.lstrip("/") or 0),
+            password=unquote(parts.password) if parts.password else None,
+            **options
+        )
+
+    def _connect(self, timeout: float | None):
+        sock = socket.create_connection((self.host, self.port), self.timeout)
+        sock.settimeout(timeout)
+        file = sock.makefile("rb")
+        try:
+            if self.password:
+                sock.sendall(_encode_command(("AUTH", self.password)))
+                _read_reply(file)
+            if self.db:
+                sock.sendall(_encode_command(("SELECT", self.db)))
+                _read_reply(file)
+        except BaseException:
+            sock.close()
+            raise
+        return sock, file
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._connect(self.timeout)
+
+    def _release(self, connection):
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(connection)
+                return
+        connection[0].close()
+
+    def _close_idle(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for sock, _ in idle:
+            sock.close()
+
+    def execute(self, *args):
+        for attempt in range(2):
+            connection = None
+            try:
+                connection = self._acquire()
+                connection[0].sendall(_encode_command(args))
+                reply = _read_reply(connection[1])
+            except (OSError, ConnectionError):
+                # Si el servidor se reinició, las demás conexiones ociosas también murieron
+                if connection is not None:
+                    connection[0].close()
+                self._close_idle()
+                if attempt:
+                    raise
+                continue
+            except RespError:
+                self._release(connection)
+                raise
+            self._release(connection)
+            return reply
+
+    def subscribe(self, channel: str) -> "RespSubscription":
+        """Conexión propia, sin timeout: SUBSCRIBE la deja solo para mensajes"""
+        sock, file = self._connect(None)
+        sock.sendall(_encode_command(("SUBSCRIBE", channel)))
+        _read_reply(file)
+        return RespSubscription(sock, file)
+
+
+class RespSubscription:
+    def __init__(self, sock, file):
+        self._sock = sock
+        self._file = file
+
+    def next(self) -> bytes | None:
+        """Bloquea hasta el próximo mensaje; None si la conexión se cerró"""
+        try:
+            while True:
+                reply = _read_reply(self._file)
+                if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                    return reply[2]
+        except (OSError, ConnectionError, ValueError):
+            return None
+
+    def close(self):
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+
+
+class FakeRedis:
+    """Servidor en proceso con los comandos que usa este módulo (GET, SET con PX,
+    DEL, SCAN, PUBLISH y SUBSCRIBE) y la misma interfaz que RespClient. Varios
+    CacheBus sobre la misma instancia se comportan como workers de un mismo Redis."""
+    def __init__(self):
+        self._data: dict = {}
+        self._subscribers: dict = defaultdict(list)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _bytes(value) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def _live(self, key: bytes):
+        item = self._data.get(key)
+        if item is not None and item[0] is not None and item[0] < time.monotonic():
+            del self._data[key]
+            return None
+        return item
+
+    def execute(self, *args):
+        command, args = str(args[0]).upper(), [self._bytes(arg) for arg in args[1:]]
+        with self._lock:
+            if command == "GET":
+                item = self._live(args[0])
+                return None if item is None else item[1]
+            if command == "SET":
+                expires_at = None
+                if len(args) == 4 and args[2].upper() == b"PX":
+                    expires_at = time.monotonic() + int(args[3]) / 1000
+                self._data[args[0]] = (expires_at, args[1])
+                return b"OK"
+            if command == "DEL":
+                return sum(self._data.pop(key, None) is not None for key in args)
+            if command == "SCAN":
+                pattern = args[args.index(b"MATCH") + 1].decode() if b"MATCH" in args else "*"
+                keys = [key for key in list(self._data) if self._live(key) and fnmatch.fnmatchcase(key.decode(), pattern)]
+                return [b"0", keys]
+            if command == "PUBLISH":
+                subscribers = self._subscribers.get(args[0], ())
+                for subscriber in subscribers:
+                    subscriber.put(args[1])
+                return len(subscribers)
+        raise RespError(f"ERR unknown command '{command}'")
+
+    def subscribe(self, channel: str) -> "FakeSubscription":
+        subscription = FakeSubscription(self, self._bytes(channel))
+        with self._lock:
+            self._subscribers[subscription.channel].append(subscription.messages)
+        return subscription
+
+    def _unsubscribe(self, subscription: "FakeSubscription"):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel, [])
+            if subscription.messages in subscribers:
+                subscribers.remove(subscription.messages)
+
+
+class FakeSubscription:
+    def __init__(self, server: FakeRedis, channel: bytes):
+        self.server = server
+        self.channel = channel
+        self.messages: queue.Queue = queue.Queue()
+
+    def next(self) -> bytes | None:
+        return self.messages.get()
+
+    def close(self):
+        self.server._unsubscribe(self)
+        self.messages.put(None)
+
+
+class RedisCache:
+    """Entradas compartidas por todos los workers, con la interfaz de TTLCache.
+    Guarda CachedResponse (etag y cuerpo); si el servidor no responde, get es un
+    miss y set no guarda: el cache nunca hace fallar un request."""
+    def __init__(self, client, namespace: str, ttl: float = 60):
+        self.client = client
+        self.namespace = namespace
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, key: str) -> Optional["CachedResponse"]:
+        try:
+            raw = self.client.execute("GET", self.namespace + key)
+        except (OSError, ConnectionError, RespError):
+            self.errors += 1
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        etag, _, body = raw.partition(b"\n")
+        return CachedResponse(body=body, etag=etag.decode())
+
+    def set(self, key: str, value: "CachedResponse", ttl: float | None = None) -> "CachedResponse":
+        milliseconds = int((self.ttl if ttl is None else ttl) * 1000)
+        try:
+            self.client.execute("SET", self.namespace + key, value.etag.encode() + b"\n" + value.body, "PX", milliseconds)
+        except (OSError, ConnectionError, RespError):
+            self.errors += 1
+        return value
+
+    # Cada comando es E/S de red: en los handlers async corre en el threadpool
+    async def aget(self, key: str) -> Optional["CachedResponse"]:
+        return await run_in_threadpool(self.get, key)
+
+    async def aset(self, key: str, value: "CachedResponse", ttl: float | None = None) -> "CachedResponse":
+        return await run_in_threadpool(self.set, key, value, ttl)
+
+    def invalidate(self, key: str | None = None):
+        try:
+            if key is not None:
+                self.client.execute("DEL", self.namespace + key)
+                return
+            cursor = b"0"
+            while True:
+                cursor, keys = self.client.execute("SCAN", cursor, "MATCH", self.namespace + "*", "COUNT", 1000)
+                if keys:
+                    self.client.execute("DEL", *keys)
+                if cursor in (b"0", 0):
+                    break
+        except (OSError, ConnectionError, RespError):
+            self.errors += 1
+
+    @property
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "redis",
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class CacheBus:
+    """Caches registrados por nombre e invalidación entre workers por pub/sub"""
+    def __init__(self, client=None, channel: str = CACHE_CHANNEL):
+        self.client = client
+        self.channel = channel
+        # Identifica a este proceso para ignorar sus propios mensajes
+        self.origin = uuid.uuid4().hex
+        self.caches: dict = {}
+        self.stats = {"published": 0, "received": 0, "errors": 0, "resets": 0}
+        self._subscription = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def register(self, name: str, cache):
+        self.caches[name] = cache
+        return cache
+
+    def invalidate(self, name: str, *keys: str):
+        """Descarta las keys (o todo el cache si no se indican) en este proceso y
+        en los demás workers"""
+        cache = self.caches[name]
+        for key in keys or (None,):
+            cache.invalidate(key)
+        if self.client is None:
+            return
+        message = json.dumps({"origin": self.origin, "cache": name, "keys": list(keys)})
+        try:
+            self.client.execute("PUBLISH", self.channel, message)
+            self.stats["published"] += 1
+        except (OSError, ConnectionError, RespError):
+            self.stats["errors"] += 1
+
+    def apply(self, raw: bytes):
+        """Aplica un mensaje de otro worker; los caches compartidos ya se
+        invalidaron en el servidor"""
+        message = json.loads(raw)
+        if message["origin"] == self.origin:
+            return
+        cache = self.caches.get(message["cache"])
+        if cache is None or isinstance(cache, RedisCache):
+            return
+        self.stats["received"] += 1
+        for key in message["keys"] or (None,):
+            cache.invalidate(key)
+
+    def _reset(self):
+        for cache in self.caches.values():
+            if not isinstance(cache, RedisCache):
+                cache.invalidate()
+        self.stats["resets"] += 1
+
+    def _run(self):
+        connected_before = False
+        while not self._stop.is_set():
+            try:
+                self._subscription = self.client.subscribe(self.channel)
+            except (OSError, ConnectionError, RespError):
+                self.stats["errors"] += 1
+                self._stop.wait(1.0)
+                continue
+            # Lo publicado mientras no había suscripción se perdió
+            if connected_before:
+                self._reset()
+            connected_before = True
+            while (raw := self._subscription.next()) is not None:
+                try:
+                    self.apply(raw)
+                except (ValueError, KeyError):
+                    self.stats["errors"] += 1
+            self._subscription.close()
+            if not self._stop.is_set():
+                self.stats["errors"] += 1
+                self._stop.wait(1.0)
+
+    def start(self):
+        if self.client is None or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cache-bus", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._subscription is not None:
+            self._subscription.close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+fake_redis = FakeRedis()
+
+
+def cache_client(url: str):
+    if not url:
+        return None
+    if url.startswith("fake://"):
+        return fake_redis
+    return RespClient.from_url(url, pool_size=CACHE_POOL_SIZE)
+
+
+cache_bus = CacheBus(cache_client(CACHE_URL))
+
+
+def make_cache(name: str, maxsize: int, ttl: float):
+    if CACHE_BACKEND == "redis":
+        if cache_bus.client is None:
+            raise RuntimeError("CACHE_BACKEND=redis requiere CACHE_URL")
+        cache = RedisCache(cache_bus.client, f"racional:{name}:", ttl)
+    else:
+        cache = TTLCache(maxsize=maxsize, ttl=ttl)
+    return cache_bus.register(name, cache)
+
+
+catalogue_cache = make_cache("catalogue", CATALOGUE_CACHE_SIZE, CATALOGUE_CACHE_TTL)
+# Vistas por usuario: "<vista>:<user_id>"
+user_cache = make_cache("user", USER_CACHE_SIZE, USER_CACHE_TTL)
+USER_VIEWS = ("portfolio", "history")
+
+
+def invalidate_catalogue(*keys: str):
+    cache_bus.invalidate("catalogue", *keys)
+
+
+def invalidate_users(*user_ids: int):
+    """Llamar después del commit de cualquier escritura que cambie saldos,
+    órdenes, posiciones o portfolios de esos usuarios"""
+    if user_ids:
+        cache_bus.invalidate("user", *(f"{view}:{user_id}" for user_id in set(user_ids) for view in USER_VIEWS))
+
+
+async def ainvalidate_users(*user_ids: int):
+    # Con CACHE_URL el PUBLISH es E/S de red: no bloquear el event loop
+    if cache_bus.client is None:
+        invalidate_users(*user_ids)
+    else:
+        await run_in_threadpool(invalidate_users, *user_ids)
+
+
+def _entry(body: bytes) -> CachedResponse:
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    return CachedResponse(body=body, etag=etag)
+
+
+def serialize(payload: Any) -> CachedResponse:
+    return _entry(json.dumps(payload, separators=(",", ":")).encode())
+
+
+def serialize_model(adapter: TypeAdapter, payload: Any) -> CachedResponse:
+    """Como serialize, validando contra el response_model de la ruta (que no se
+    aplica cuando el handler devuelve un Response)"""
+    return _entry(adapter.dump_json(adapter.validate_python(payload)))
+
+
+def cached_json_response(request: Request, entry: CachedResponse) -> Response:
+    """Devuelve el JSON ya serializado, o 304 si el cliente tiene la misma versión"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if "*" in tags or entry.etag in tags:
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED,
+                headers={"ETag": entry.etag}
+            )
+    
+    return Response(
+        content=entry.body,
+        media_type="application/json",
+        headers={"ETag": entry.etag}
+    )
+
+
+# Invalidación: cualquier flush que cambie precio o cantidad de un Stock marca la
+# sesión, y el catálogo se descarta cuando esa transacción hace commit.
+# Las escrituras masivas (UPDATE directo) deben llamar a invalidate_catalogue().
+@event.listens_for(Session, "after_flush")
+def _track_stock_changes(session, flush_context):
+    for obj in session.new | session.deleted:
+        if isinstance(obj, Stock):
+            session.info["stock_catalogue_dirty"] = True
+            return
+    for obj in session.dirty:
+        if isinstance(obj, Stock):
+            state = inspect(obj)
+            if (state.attrs.unit_value.history.has_changes()
+                    or state.attrs.quantity.history.has_changes()):
+                session.info["stock_catalogue_dirty"] = True
+                return
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_stock_catalogue(session):
+    if session.info.pop("stock_catalogue_dirty", False):
+        invalidate_catalogue("stocks")
+
+@event.listens_for(Session, "after_rollback")
+def _discard_stock_changes(session):
+    session.info.pop("stock_catalogue_dirty", None)
\ No newline at end of file
@@ -1,10 +1,71 @@
-from decouple import config
+from decouple import Csv, config
 from passlib.context import CryptContext
 
 DB_URL = config('DB_URL', default="sqlite:///./mydb.sqlite", cast=str)
+# Opt-in async mode, e.g. "sqlite+aiosqlite:///./mydb.sqlite" or "postgresql+asyncpg://..."
+ASYNC_DB_URL = config('ASYNC_DB_URL', default='', cast=str)
+# Réplicas de lectura, separadas por coma
+DB_REPLICA_URLS = config('DB_REPLICA_URLS', default='', cast=Csv())
+ASYNC_DB_REPLICA_URLS = config('ASYNC_DB_REPLICA_URLS', default='', cast=Csv())
+# Ventana en que un cliente lee del primario después de escribir
+READ_AFTER_WRITE_SECONDS = config('READ_AFTER_WRITE_SECONDS', default=5, cast=int)
+# Pool de conexiones (no aplica a SQLite en memoria)
+DB_POOL_SIZE = config('DB_POOL_SIZE', default=5, cast=int)
+DB_MAX_OVERFLOW = config('DB_MAX_OVERFLOW', default=10, cast=int)
+DB_POOL_TIMEOUT = config('DB_POOL_TIMEOUT', default=30, cast=float)
+DB_POOL_RECYCLE = config('DB_POOL_RECYCLE', default=1800, cast=int)
+DB_POOL_PRE_PING = config('DB_POOL_PRE_PING', default=True, cast=bool)
+# Perfil de producción para SQLite: WAL, pragmas y un único escritor
+SQLITE_PERFORMANCE_MODE = config('SQLITE_PERFORMANCE_MODE', default=False, cast=bool)
+SQLITE_BUSY_TIMEOUT_MS = config('SQLITE_BUSY_TIMEOUT_MS', default=5000, cast=int)
+SQLITE_MMAP_SIZE = config('SQLITE_MMAP_SIZE', default=268435456, cast=int)
+# Negativo: tamaño en KiB (64 MB)
+SQLITE_CACHE_SIZE = config('SQLITE_CACHE_SIZE', default=-64000, cast=int)
 APP_ENV = config('APP_ENV', default='DEV', cast=str)
 SECRET_KEY = config('SECRET_KEY', default='secret', cast=str)
 COOKIE_NAME = config('COOKIE_NAME', default="auth_token", cast=str)
 TOKEN_EXPIRE_MINUTES = config('TOKEN_EXPIRE_MINUTES', default=30, cast=int)
+TOKEN_CACHE_SIZE = config('TOKEN_CACHE_SIZE', default=4096, cast=int)
+# Detector de N+1: off | log | raise (para tests)
+QUERY_GUARD = config('QUERY_GUARD', default='log' if APP_ENV == 'DEV' else 'off', cast=str)
+QUERY_BUDGET_DEFAULT = config('QUERY_BUDGET_DEFAULT', default=20, cast=int)
+QUERY_REPEAT_THRESHOLD = config('QUERY_REPEAT_THRESHOLD', default=3, cast=int)
+CATALOGUE_CACHE_TTL = config('CATALOGUE_CACHE_TTL', default=30, cast=float)
+CATALOGUE_CACHE_SIZE = config('CATALOGUE_CACHE_SIZE', default=128, cast=int)
+# Vistas por usuario (portfolio, historial); las escrituras las invalidan, el TTL es el respaldo
+USER_CACHE_TTL = config('USER_CACHE_TTL', default=10, cast=float)
+USER_CACHE_SIZE = config('USER_CACHE_SIZE', default=4096, cast=int)
+# Backend de cache (src/cache.py): memory | redis. Con CACHE_URL (redis://host:6379/0,
+# o fake:// para tests) las invalidaciones se publican a los demás workers
+CACHE_BACKEND = config('CACHE_BACKEND', default='memory', cast=str)
+CACHE_URL = config('CACHE_URL', default='', cast=str)
+# Conexiones ociosas que conserva el cliente de CACHE_URL, una por request concurrente
+CACHE_POOL_SIZE = config('CACHE_POOL_SIZE', default=16, cast=int)
+CACHE_CHANNEL = config('CACHE_CHANNEL', default='racional:cache-invalidation', cast=str)
+PRICE_FLUSH_INTERVAL = config('PRICE_FLUSH_INTERVAL', default=1.0, cast=float)
+PRICE_FEED_KEY = config('PRICE_FEED_KEY', default='feed-secret', cast=str)
+PRICE_ROLLUP_INTERVAL = config('PRICE_ROLLUP_INTERVAL', default=3600, cast=int)
+# Motor de ejecución de órdenes (src/execution.py)
+EXECUTION_INTERVAL = config('EXECUTION_INTERVAL', default=0.5, cast=float)
+EXECUTION_BATCH_SIZE = config('EXECUTION_BATCH_SIZE', default=200, cast=int)
+# Segundos que una orden puede seguir `routed` antes de volver a `pending`
+EXECUTION_LEASE = config('EXECUTION_LEASE', default=60, cast=float)
+# Libro de órdenes límite en memoria: con varios procesos lo corre solo el que
+# tiene el lease, que se renueva en cada ciclo y vence tras ORDER_MATCHING_LEASE
+ORDER_MATCHING = config('ORDER_MATCHING', default=True, cast=bool)
+ORDER_MATCHING_LEASE = config('ORDER_MATCHING_LEASE', default=15, cast=float)
+SIMULATED_BROKER_LATENCY = config('SIMULATED_BROKER_LATENCY', default=0.05, cast=float)
+SIMULATED_BROKER_MAX_QUANTITY = config('SIMULATED_BROKER_MAX_QUANTITY', default=10000, cast=float)
+# Push de precios y órdenes (src/streaming.py): una entrega cada STREAM_INTERVAL
+STREAM_INTERVAL = config('STREAM_INTERVAL', default=0.25, cast=float)
+STREAM_KEEPALIVE = config('STREAM_KEEPALIVE', default=15, cast=float)
+STREAM_MAX_SECONDS = config('STREAM_MAX_SECONDS', default=300, cast=float)
+STREAM_RETRY_MS = config('STREAM_RETRY_MS', default=3000, cast=int)
+# bcrypt corre en un pool propio: workers en ejecución + cupo de espera
+PASSWORD_WORKERS = config('PASSWORD_WORKERS', default=2, cast=int)
+PASSWORD_QUEUE_SIZE = config('PASSWORD_QUEUE_SIZE', default=8, cast=int)
+LOGIN_WINDOW_SECONDS = config('LOGIN_WINDOW_SECONDS', default=60, cast=float)
+LOGIN_MAX_ATTEMPTS_PER_USER = config('LOGIN_MAX_ATTEMPTS_PER_USER', default=5, cast=int)
+LOGIN_MAX_ATTEMPTS_PER_IP = config('LOGIN_MAX_ATTEMPTS_PER_IP', default=20, cast=int)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
\ No newline at end of file
@@ -1,18 +1,156 @@
-from sqlalchemy import create_engine
+import itertools
+import time
+
+from fastapi import Request, Response
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from src.config import DB_URL
+from sqlalchemy.orm import Session, sessionmaker
 
-engine = create_engine(
-    DB_URL, connect_args={"check_same_thread": False}
+from src.config import (
+    ASYNC_DB_REPLICA_URLS,
+    ASYNC_DB_URL,
+    DB_REPLICA_URLS,
+    DB_URL,
+    READ_AFTER_WRITE_SECONDS,
+    SQLITE_PERFORMANCE_MODE,
 )
+from src.instrumentation import mark_threadpool_start
+from src.pool import engine_options
+from src.sqlite import WRITER_OPTION, configure_sqlite
+
+# Después de escribir, el cliente lee del primario hasta este instante (epoch)
+PRIMARY_COOKIE = "db_primary_until"
+
+engine = create_engine(DB_URL, **engine_options(DB_URL))
+# Mismo pool; las transacciones que escriben se marcan para que SQLite las serialice
+write_engine = engine.execution_options(**{WRITER_OPTION: True})
+if SQLITE_PERFORMANCE_MODE and engine.dialect.name == "sqlite":
+    configure_sqlite(engine)
+
+# Réplicas de solo lectura; sin réplicas las lecturas van al primario
+replica_engines = [
+    create_engine(url, **engine_options(url, name=f"replica-{i}"))
+    for i, url in enumerate(DB_REPLICA_URLS)
+]
+for replica in replica_engines:
+    if SQLITE_PERFORMANCE_MODE and replica.dialect.name == "sqlite":
+        configure_sqlite(replica, single_writer=False)
+
+
+class WriteSession(Session):
+    """Sesión de los endpoints que escriben; al hacer commit fija la lectura
+    desde el primario para el cliente (read-your-writes)"""
+
+
+@event.listens_for(WriteSession, "after_commit")
+def _stick_to_primary(session):
+    response = session.info.get("response")
+    if response is not None and (replica_engines or async_replica_engines):
+        until = time.time() + READ_AFTER_WRITE_SECONDS
+        response.set_cookie(
+            PRIMARY_COOKIE, f"{until:.3f}", max_age=READ_AFTER_WRITE_SECONDS,
+            httponly=True, samesite="lax"
+        )
+
+
+def reads_from_primary(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+WriteSessionLocal = sessionmaker(
+    class_=WriteSession, autocommit=False, autoflush=False, bind=write_engine
+)
+ReplicaSessionLocals = [
+    sessionmaker(autocommit=False, autoflush=False, bind=replica) for replica in replica_engines
+]
+_next_replica = itertools.count()
 
 Base = declarative_base()
 
 def get_db():
+    mark_threadpool_start()
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def get_write_db(response: Response):
+    """Sesión para endpoints que escriben"""
+    mark_threadpool_start()
+    db = WriteSessionLocal()
+    db.info["response"] = response
+    try:
+        yield db
+    finally:
+        db.close()
+
+def read_session_factory(request: Request):
+    """Réplica en round-robin, salvo que el cliente haya escrito hace menos de
+    READ_AFTER_WRITE_SECONDS"""
+    if not ReplicaSessionLocals or reads_from_primary(request):
+        return SessionLocal
+    return ReplicaSessionLocals[next(_next_replica) % len(ReplicaSessionLocals)]
+
+def get_read_db(request: Request):
+    """Sesión para endpoints de solo lectura (ver read_session_factory)"""
+    mark_threadpool_start()
+    db = read_session_factory(request)()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Async mode: only built when ASYNC_DB_URL is configured, so the async driver
+# (aiosqlite/asyncpg) stays an optional dependency.
+async_engine = None
+async_replica_engines = []
+AsyncSessionLocal = None
+AsyncWriteSessionLocal = None
+AsyncReplicaSessionLocals = []
+
+if ASYNC_DB_URL:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(ASYNC_DB_URL, **engine_options(ASYNC_DB_URL, is_async=True))
+    async_replica_engines = [
+        create_async_engine(url, **engine_options(url, is_async=True, name=f"async-replica-{i}"))
+        for i, url in enumerate(ASYNC_DB_REPLICA_URLS)
+    ]
+    if SQLITE_PERFORMANCE_MODE:
+        for sqlite_engine in [async_engine] + async_replica_engines:
+            if sqlite_engine.dialect.name == "sqlite":
+                configure_sqlite(sqlite_engine.sync_engine, single_writer=False)
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine, autoflush=False, expire_on_commit=False
+    )
+    AsyncWriteSessionLocal = async_sessionmaker(
+        bind=async_engine.execution_options(**{WRITER_OPTION: True}),
+        sync_session_class=WriteSession, autoflush=False, expire_on_commit=False
+    )
+    AsyncReplicaSessionLocals = [
+        async_sessionmaker(bind=replica, autoflush=False, expire_on_commit=False)
+        for replica in async_replica_engines
+    ]
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_write_db(response: Response):
+    async with AsyncWriteSessionLocal() as db:
+        db.info["response"] = response
+        yield db
+
+def async_read_session_factory(request: Request):
+    if not AsyncReplicaSessionLocals or reads_from_primary(request):
+        return AsyncSessionLocal
+    return AsyncReplicaSessionLocals[next(_next_replica) % len(AsyncReplicaSessionLocals)]
+
+async def get_async_read_db(request: Request):
+    async with async_read_session_factory(request)() as db:
+        yield db
\ No newline at end of file
@@ -0,0 +1,633 @@
+"""Ejecución de órdenes en segundo plano.
+
+Los endpoints solo reservan fondos (compras) o acciones (ventas) y guardan la orden
+como `pending`; la latencia del request no depende de la del broker. El
+ExecutionEngine toma las pendientes en lotes, las marca `routed`, las envía al
+adaptador de su broker y las liquida:
+
+    pending -> routed -> filled | rejected
+
+Al tomarlas se guarda `claimed_at`: si el proceso se cae o falla al liquidar, las
+órdenes `routed` por más de EXECUTION_LEASE segundos vuelven a `pending` y sus
+reservas se liquidan en el reintento. Solo se liquida una orden que sigue con la
+misma toma, así un worker atrasado no pisa el reintento.
+
+Las órdenes límite no van al broker: se cruzan en el libro en memoria de
+src/order_book.py (pending -> open -> filled) y sus fills se escriben en las mismas
+filas. El libro vive en el proceso, así que con varios workers solo cruza el que
+tiene el lease `matcher` (tabla engine_lease); al tomarlo reconstruye el libro
+desde las órdenes `open`. Un fill solo se escribe si las órdenes siguen abiertas
+en la base; si no, el libro se descarta y se vuelve a cargar.
+
+Cada transición es un UPDATE condicional sobre el estado anterior, así varios
+workers pueden correr el motor sin tomar dos veces la misma orden.
+"""
+import abc
+import logging
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from typing import NamedTuple
+from uuid import uuid4
+
+from sqlalchemy import bindparam, case, func, insert, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from src.cache import invalidate_users
+from src.config import (
+    EXECUTION_BATCH_SIZE,
+    EXECUTION_INTERVAL,
+    EXECUTION_LEASE,
+    ORDER_MATCHING,
+    ORDER_MATCHING_LEASE,
+    SIMULATED_BROKER_LATENCY,
+    SIMULATED_BROKER_MAX_QUANTITY,
+)
+from src.database import write_engine
+from src.ledger import (
+    credit_balance,
+    position_params,
+    position_values,
+    release_position,
+    sell_position,
+)
+from src.metrics import CounterFamily
+from src.models import (
+    BuyOrder,
+    EngineLease,
+    OrderState,
+    Portfolio,
+    PortfolioStock,
+    SellOrder,
+    utcnow,
+)
+from src.money import amount_for, to_major
+from src.order_book import MatchingEngine
+from src.streaming import stream_hub
+
+logger = logging.getLogger(__name__)
+
+MODELS = {"buy": BuyOrder, "sell": SellOrder}
+# Estados en los que una orden límite sigue en el libro
+RESTING = (OrderState.OPEN, OrderState.CANCELLING)
+
+orders_executed = CounterFamily(
+    "orders_executed_total", "Órdenes liquidadas por el motor de ejecución", ("side", "state")
+)
+order_fills = CounterFamily("order_fills_total", "Cruces en el libro de órdenes límite", ())
+
+
+class RoutedOrder(NamedTuple):
+    side: str
+    id: int
+    portfolio_id: int
+    broker_id: int | None
+    stock_id: int
+    amount: int
+    stock_quantity: float
+    claimed_at: datetime | None = None
+
+
+class BrokerAdapter(abc.ABC):
+    """Recibe un lote de órdenes `routed` de un mismo broker y devuelve, en el
+    mismo orden, None por cada orden ejecutada o el motivo del rechazo. Una orden
+    cuya toma venció se vuelve a enviar con el mismo id: el adaptador debe usarlo
+    para no ejecutarla dos veces."""
+    @abc.abstractmethod
+    def execute(self, orders: list) -> list:
+        ...
+
+
+class SimulatedBroker(BrokerAdapter):
+    """Broker local para desarrollo y pruebas: ejecuta todo al precio reservado
+    tras `latency` segundos por lote y rechaza las órdenes sobre `max_quantity`"""
+    def __init__(self, latency: float = SIMULATED_BROKER_LATENCY, max_quantity: float = SIMULATED_BROKER_MAX_QUANTITY):
+        self.latency = latency
+        self.max_quantity = max_quantity
+
+    def execute(self, orders: list) -> list:
+        if self.latency:
+            time.sleep(self.latency)
+        return [
+            "Cantidad excede el máximo del broker" if order.stock_quantity > self.max_quantity else None
+            for order in orders
+        ]
+
+
+def cancel_pending(model, order_id: int):
+    """pending -> cancelled; la orden aún no llegó al broker ni al libro, quien
+    cancela libera la reserva en la misma transacción"""
+    return update(model).where(
+        model.id == order_id,
+        model.state == OrderState.PENDING
+    ).values(state=OrderState.CANCELLED).returning(model.id).execution_options(synchronize_session=False)
+
+
+def request_cancel(model, order_id: int):
+    """open -> cancelling; el motor la saca del libro y libera lo que no se ejecutó"""
+    return update(model).where(
+        model.id == order_id,
+        model.state == OrderState.OPEN
+    ).values(state=OrderState.CANCELLING).returning(model.id).execution_options(synchronize_session=False)
+
+
+def _owners(conn, portfolio_ids) -> dict:
+    return dict(conn.execute(select(Portfolio.id, Portfolio.user_id).where(
+        Portfolio.id.in_(set(portfolio_ids))
+    )).all())
+
+
+def _credit(conn, credits: dict):
+    for user_id, amount in credits.items():
+        if amount:
+            conn.execute(credit_balance(user_id, amount))
+
+
+def _order_events(conn, side: str, rows: list, state: str, owners: dict | None = None) -> list:
+    """Eventos (user_id, evento) de un cambio de estado, para _publish"""
+    if not rows:
+        return []
+    if owners is None:
+        owners = _owners(conn, (row.portfolio_id for row in rows))
+    return [
+        (owners[row.portfolio_id], {"side": side, "id": row.id, "stock_id": row.stock_id, "state": state})
+        for row in rows
+    ]
+
+
+def _publish(events: list):
+    """Después del commit: los streams de src/streaming.py reciben los eventos y
+    las vistas cacheadas de esos usuarios se invalidan en todos los workers"""
+    stream_hub.publish_orders(events)
+    invalidate_users(*{user_id for user_id, _ in events})
+
+
+def _totals(orders: list) -> dict:
+    """Cantidades y montos agrupados por posición (portfolio_id, stock_id)"""
+    totals = {}
+    for order in orders:
+        key = (order.portfolio_id, order.stock_id)
+        quantity, amount = totals.get(key, (0, 0))
+        totals[key] = (quantity + order.stock_quantity, amount + order.amount)
+    return totals
+
+
+def _position_statement(statement, *names: str):
+    """Sentencia de src/ledger.py con bindparams para executemany (ver position_params)"""
+    names = names or ("b_portfolio_id", "b_stock_id", "b_quantity", "b_amount")
+    return statement(*(bindparam(name) for name in names))
+
+
+def _release_statement():
+    return _position_statement(release_position, "b_portfolio_id", "b_stock_id", "b_quantity")
+
+
+# Dialectos con INSERT ... ON CONFLICT DO UPDATE
+_UPSERT = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+
+def _add_to_positions(conn, totals: dict):
+    """Suma compras ejecutadas con un INSERT ... ON CONFLICT DO UPDATE sobre el
+    índice único (portfolio_id, stock_id): dos liquidaciones que abren la misma
+    posición a la vez se suman en vez de chocar"""
+    statement = _UPSERT[conn.dialect.name](PortfolioStock)
+    conn.execute(
+        statement.on_conflict_do_update(
+            index_elements=[PortfolioStock.portfolio_id, PortfolioStock.stock_id],
+            set_={
+                "cost_basis": func.coalesce(PortfolioStock.cost_basis, 0) + statement.excluded.cost_basis,
+                "quantity": func.coalesce(PortfolioStock.quantity, 0) + statement.excluded.quantity
+            }
+        ),
+        [
+            position_values(portfolio_id, stock_id, quantity, amount)
+            for (portfolio_id, stock_id), (quantity, amount) in totals.items()
+        ]
+    )
+
+
+class ExecutionEngine:
+    """Hilo que procesa las órdenes pendientes cada `interval` segundos, o antes si
+    un endpoint llama notify() tras registrar una orden"""
+    def __init__(
+        self,
+        bind=write_engine,
+        interval: float = EXECUTION_INTERVAL,
+        batch_size: int = EXECUTION_BATCH_SIZE,
+        lease: float = EXECUTION_LEASE,
+        adapter_factory: Callable[[], BrokerAdapter] = SimulatedBroker,
+        matching: bool = ORDER_MATCHING,
+        matching_lease: float = ORDER_MATCHING_LEASE
+    ):
+        self.bind = bind
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lease = lease
+        self._next_reclaim = 0.0
+        self.adapter_factory = adapter_factory
+        # broker_id -> adaptador; las órdenes sin broker usan la clave None
+        self.adapters: dict = {}
+        self.matching = matching
+        self.matching_lease = matching_lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        # Si este proceso tiene el lease del libro
+        self.leading = False
+        self.matcher = MatchingEngine()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.stats = {
+            "routed": 0,
+            "filled": 0,
+            "rejected": 0,
+            "requeued": 0,
+            "reclaimed": 0,
+            "opened": 0,
+            "fills": 0,
+            "cancelled": 0,
+            "batches": 0,
+            "last_batch_ms": 0.0,
+        }
+
+    def register(self, broker_id: int | None, adapter: BrokerAdapter):
+        self.adapters[broker_id] = adapter
+
+    def adapter(self, broker_id: int | None) -> BrokerAdapter:
+        adapter = self.adapters.get(broker_id)
+        if adapter is None:
+            adapter = self.adapters.setdefault(broker_id, self.adapter_factory())
+        return adapter
+
+    def notify(self):
+        self._wake.set()
+
+    def _claim(self, side: str) -> list:
+        """pending -> routed para un lote, en orden de llegada"""
+        model = MODELS[side]
+        pending = select(model.id).where(
+            model.state == OrderState.PENDING,
+            model.limit_price.is_(None)
+        ).order_by(model.id).limit(self.batch_size).with_for_update(skip_locked=True)
+        claimed_at = utcnow()
+        with self.bind.begin() as conn:
+            rows = conn.execute(
+                update(model).where(
+                    model.id.in_(pending.scalar_subquery()),
+                    model.state == OrderState.PENDING
+                ).values(state=OrderState.ROUTED, claimed_at=claimed_at).returning(
+                    model.id, model.portfolio_id, model.broker_id, model.stock_id,
+                    model.amount, model.stock_quantity
+                )
+            ).all()
+            orders = sorted((RoutedOrder(side, *row, claimed_at) for row in rows), key=lambda order: order.id)
+            events = _order_events(conn, side, orders, OrderState.ROUTED)
+        _publish(events)
+        self.stats["routed"] += len(rows)
+        return orders
+
+    def _transition(self, conn, side: str, orders: list, target: str, **values) -> list:
+        """routed -> target para las órdenes de una misma toma; devuelve las que
+        la conservaban (las demás vencieron y volvieron a `pending`)"""
+        if not orders:
+            return []
+        model = MODELS[side]
+        moved = set(conn.scalars(update(model).where(
+            model.id.in_([order.id for order in orders]),
+            model.state == OrderState.ROUTED,
+            model.claimed_at == orders[0].claimed_at
+        ).values(state=target, **values).returning(model.id)).all())
+        return [order for order in orders if order.id in moved]
+
+    def _requeue(self, side: str, orders: list):
+        """routed -> pending cuando el adaptador falla, para reintentar en el próximo ciclo"""
+        with self.bind.begin() as conn:
+            orders = self._transition(conn, side, orders, OrderState.PENDING, claimed_at=None)
+            events = _order_events(conn, side, orders, OrderState.PENDING)
+        _publish(events)
+        self.stats["requeued"] += len(orders)
+
+    def _reclaim_expired(self) -> int:
+        """routed -> pending para las órdenes tomadas hace más de `lease` segundos:
+        el proceso que las tomó se cayó o falló al liquidarlas"""
+        expired = utcnow() - timedelta(seconds=self.lease)
+        count = 0
+        events = []
+        with self.bind.begin() as conn:
+            for side, model in MODELS.items():
+                rows = conn.execute(update(model).where(
+                    model.state == OrderState.ROUTED,
+                    or_(model.claimed_at.is_(None), model.claimed_at < expired)
+                ).values(state=OrderState.PENDING, claimed_at=None).returning(
+                    model.id, model.portfolio_id, model.stock_id
+                )).all()
+                events.extend(_order_events(conn, side, rows, OrderState.PENDING))
+                count += len(rows)
+        _publish(events)
+        self.stats["reclaimed"] += count
+        return count
+
+    def _settle(self, side: str, orders: list, reasons: list):
+        """routed -> filled | rejected y sus efectos sobre saldos y posiciones,
+        en una sola transacción"""
+        filled = [order for order, reason in zip(orders, reasons) if reason is None]
+        rejected = [order for order, reason in zip(orders, reasons) if reason is not None]
+        with self.bind.begin() as conn:
+            owners = _owners(conn, (order.portfolio_id for order in orders))
+            filled = self._transition(conn, side, filled, OrderState.FILLED)
+            rejected = self._transition(conn, side, rejected, OrderState.REJECTED)
+            events = _order_events(conn, side, filled, OrderState.FILLED, owners) + \
+                _order_events(conn, side, rejected, OrderState.REJECTED, owners)
+
+            # Compras: los fondos ya se descontaron al registrar la orden.
+            # Ventas: las acciones ya se apartaron al registrar la orden.
+            credits = defaultdict(int)
+            if side == "buy":
+                if filled:
+                    _add_to_positions(conn, _totals(filled))
+                for order in rejected:
+                    credits[owners[order.portfolio_id]] += order.amount
+            else:
+                if filled:
+                    conn.execute(_position_statement(sell_position), position_params(_totals(filled)))
+                for order in filled:
+                    credits[owners[order.portfolio_id]] += order.amount
+                if rejected:
+                    conn.execute(_release_statement(), position_params(_totals(rejected)))
+            _credit(conn, credits)
+        _publish(events)
+
+        self.stats["filled"] += len(filled)
+        self.stats["rejected"] += len(rejected)
+        orders_executed.labels(side, OrderState.FILLED).inc(len(filled))
+        orders_executed.labels(side, OrderState.REJECTED).inc(len(rejected))
+
+    def _hold_lease(self) -> bool:
+        """Toma o renueva el lease `matcher`; lo consigue si nadie lo tiene, si
+        ya era de este proceso o si venció"""
+        now = utcnow()
+        values = {"owner": self.owner, "expires_at": now + timedelta(seconds=self.matching_lease)}
+        with self.bind.begin() as conn:
+            held = conn.execute(update(EngineLease).where(
+                EngineLease.name == "matcher",
+                or_(EngineLease.owner == self.owner, EngineLease.expires_at < now)
+            ).values(**values)).rowcount
+        if held:
+            return True
+        try:
+            with self.bind.begin() as conn:
+                conn.execute(insert(EngineLease).values(name="matcher", **values))
+        except IntegrityError:
+            # Otro proceso tiene el lease vigente
+            return False
+        return True
+
+    def _release_lease(self):
+        with self.bind.begin() as conn:
+            conn.execute(update(EngineLease).where(
+                EngineLease.name == "matcher",
+                EngineLease.owner == self.owner
+            ).values(expires_at=utcnow()))
+        self.leading = False
+
+    def _lead(self) -> bool:
+        """Renueva el lease en cada ciclo; al tomarlo el libro se reconstruye desde
+        la base, porque otro proceso pudo cruzar órdenes mientras tanto"""
+        leading = self._hold_lease()
+        if leading and not self.leading:
+            self.load_books()
+        self.leading = leading
+        return leading
+
+    def load_books(self):
+        """Reconstruye los libros desde las órdenes `open` y `cancelling`, en orden
+        de llegada; en una base consistente no se cruzan entre sí"""
+        self.matcher = MatchingEngine()
+        resting = []
+        with self.bind.connect() as conn:
+            for side, model in MODELS.items():
+                resting.extend((side, row) for row in conn.execute(select(
+                    model.id, model.portfolio_id, model.stock_id, model.limit_price, model.timestamp,
+                    (model.stock_quantity - func.coalesce(model.filled_quantity, 0)).label("remaining")
+                ).where(model.state.in_((OrderState.OPEN, OrderState.CANCELLING)))))
+        for side, row in sorted(resting, key=lambda item: (item[1].timestamp, item[1].id)):
+            self.matcher.submit(row.stock_id, side, row.id, row.limit_price, row.remaining, row.portfolio_id)
+
+    def _cancel_requested(self) -> int:
+        """cancelling -> cancelled: saca las órdenes del libro y libera los fondos o
+        acciones de la parte no ejecutada"""
+        count = 0
+        events = []
+        with self.bind.begin() as conn:
+            for side, model in MODELS.items():
+                rows = conn.execute(update(model).where(
+                    model.state == OrderState.CANCELLING
+                ).values(state=OrderState.CANCELLED).returning(
+                    model.id, model.portfolio_id, model.stock_id, model.limit_price,
+                    (model.stock_quantity - func.coalesce(model.filled_quantity, 0)).label("remaining")
+                )).all()
+                if not rows:
+                    continue
+                for row in rows:
+                    self.matcher.cancel(row.stock_id, side, row.id)
+                events.extend(_order_events(conn, side, rows, OrderState.CANCELLED))
+                if side == "buy":
+                    owners = _owners(conn, (row.portfolio_id for row in rows))
+                    credits = defaultdict(int)
+                    for row in rows:
+                        credits[owners[row.portfolio_id]] += amount_for(row.limit_price, row.remaining)
+                    _credit(conn, credits)
+                else:
+                    totals = {}
+                    for row in rows:
+                        key = (row.portfolio_id, row.stock_id)
+                        quantity, amount = totals.get(key, (0, 0))
+                        totals[key] = (quantity + row.remaining, amount)
+                    conn.execute(_release_statement(), position_params(totals))
+                count += len(rows)
+        _publish(events)
+        self.stats["cancelled"] += count
+        return count
+
+    def _match(self) -> int:
+        """pending -> open para un lote de órdenes límite de ambos lados; se cruzan
+        en orden de llegada y los fills se escriben en la misma transacción"""
+        claimed = []
+        with self.bind.begin() as conn:
+            for side, model in MODELS.items():
+                pending = select(model.id).where(
+                    model.state == OrderState.PENDING,
+                    model.limit_price.is_not(None)
+                ).order_by(model.id).limit(self.batch_size).with_for_update(skip_locked=True)
+                claimed.extend((side, row) for row in conn.execute(
+                    update(model).where(
+                        model.id.in_(pending.scalar_subquery()),
+                        model.state == OrderState.PENDING
+                    ).values(state=OrderState.OPEN).returning(
+                        model.id, model.portfolio_id, model.stock_id, model.limit_price,
+                        model.stock_quantity, model.timestamp
+                    )
+                ).all())
+            events = [
+                event for side in MODELS
+                for event in _order_events(conn, side, [row for s, row in claimed if s == side], OrderState.OPEN)
+            ]
+            fills = []
+            for side, row in sorted(claimed, key=lambda item: (item[1].timestamp, item[1].id)):
+                fills.extend(
+                    (row.stock_id, fill) for fill in self.matcher.submit(
+                        row.stock_id, side, row.id, row.limit_price, row.stock_quantity, row.portfolio_id
+                    )
+                )
+            if fills:
+                events.extend(self._record_fills(conn, fills))
+        _publish(events)
+        self.stats["opened"] += len(claimed)
+        return len(claimed)
+
+    def _record_fills(self, conn, fills: list) -> list:
+        """Escribe los fills en las órdenes (filled_quantity, amount y estado), las
+        posiciones y los saldos. Ambas partes reservaron a su precio límite y el
+        cruce se hace al precio de la orden en reposo: la diferencia se ajusta en
+        `amount` y, para el comprador, se le devuelve."""
+        ids = {
+            "buy": {fill.buy_id for _, fill in fills},
+            "sell": {fill.sell_id for _, fill in fills},
+        }
+        orders = {
+            side: {row.id: row for row in conn.execute(
+                select(model.id, model.portfolio_id, model.limit_price).where(
+                    model.id.in_(ids[side]),
+                    model.state.in_(RESTING)
+                ).with_for_update()
+            )}
+            for side, model in MODELS.items()
+        }
+        if any(len(orders[side]) != len(ids[side]) for side in MODELS):
+            # Otro proceso canceló o ejecutó una de estas órdenes: run_once revierte
+            # la transacción y recarga el libro
+            raise RuntimeError("El libro de órdenes no coincide con la base")
+        owners = _owners(conn, (
+            row.portfolio_id for side_orders in orders.values() for row in side_orders.values()
+        ))
+        params = {"buy": [], "sell": []}
+        bought, sold = [], []
+        credits = defaultdict(int)
+        for stock_id, fill in fills:
+            buy, sell = orders["buy"][fill.buy_id], orders["sell"][fill.sell_id]
+            notional = amount_for(fill.price, fill.quantity)
+            params["buy"].append({
+                "b_id": buy.id, "b_quantity": fill.quantity,
+                "b_delta": notional - amount_for(buy.limit_price, fill.quantity)
+            })
+            params["sell"].append({
+                "b_id": sell.id, "b_quantity": fill.quantity,
+                "b_delta": notional - amount_for(sell.limit_price, fill.quantity)
+            })
+            bought.append(RoutedOrder("buy", buy.id, buy.portfolio_id, None, stock_id, notional, fill.quantity))
+            sold.append(RoutedOrder("sell", sell.id, sell.portfolio_id, None, stock_id, notional, fill.quantity))
+            credits[owners[buy.portfolio_id]] += amount_for(buy.limit_price, fill.quantity) - notional
+            credits[owners[sell.portfolio_id]] += notional
+
+        for side, model in MODELS.items():
+            filled_quantity = func.coalesce(model.filled_quantity, 0) + bindparam("b_quantity")
+            conn.execute(update(model).where(
+                model.id == bindparam("b_id"),
+                model.state.in_(RESTING)
+            ).values(
+                filled_quantity=filled_quantity,
+                amount=model.amount + bindparam("b_delta"),
+                state=case((filled_quantity >= model.stock_quantity, OrderState.FILLED), else_=model.state)
+            ), params[side])
+        _add_to_positions(conn, _totals(bought))
+        conn.execute(_position_statement(sell_position), position_params(_totals(sold)))
+        _credit(conn, credits)
+
+        self.stats["fills"] += len(fills)
+        order_fills.labels().inc(len(fills))
+        # Las órdenes que ya no están en el libro se ejecutaron completas
+        events = []
+        for stock_id, fill in fills:
+            for side, order_id in (("buy", fill.buy_id), ("sell", fill.sell_id)):
+                order = orders[side][order_id]
+                state = OrderState.OPEN if self.matcher.find(stock_id, side, order_id) else OrderState.FILLED
+                events.append((owners[order.portfolio_id], {
+                    "side": side, "id": order_id, "stock_id": stock_id, "state": state,
+                    "fill_price": to_major(fill.price), "fill_quantity": fill.quantity
+                }))
+        return events
+
+    def run_once(self) -> int:
+        """Procesa un lote por lado; devuelve cuántas órdenes se liquidaron"""
+        started = time.perf_counter()
+        settled = 0
+        if time.monotonic() >= self._next_reclaim:
+            self._next_reclaim = time.monotonic() + self.lease
+            self._reclaim_expired()
+        if self.matching and self._lead():
+            try:
+                settled += self._cancel_requested() + self._match()
+            except Exception:
+                # El libro en memoria quedó adelantado respecto de la base
+                self.load_books()
+                raise
+        for side in MODELS:
+            orders = self._claim(side)
+            if not orders:
+                continue
+            by_broker = defaultdict(list)
+            for order in orders:
+                by_broker[order.broker_id].append(order)
+            for broker_id, group in by_broker.items():
+                try:
+                    reasons = self.adapter(broker_id).execute(group)
+                except Exception:
+                    logger.exception("Error al enviar órdenes al broker %s", broker_id)
+                    self._requeue(side, group)
+                    continue
+                self._settle(side, group, reasons)
+                settled += len(group)
+        if settled:
+            self.stats["batches"] += 1
+            self.stats["last_batch_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return settled
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                # Vacía la cola antes de volver a esperar
+                while not self._stop.is_set() and self.run_once():
+                    pass
+            except Exception:
+                logger.exception("Error al ejecutar órdenes")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            # El libro se carga al tomar el lease, en el primer ciclo
+            self.leading = False
+            # Al iniciar se recuperan las órdenes que quedaron `routed`
+            self._next_reclaim = 0.0
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="order-executor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        # Las órdenes pendientes quedan en la base y se procesan al volver a iniciar
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.leading:
+            # Otro worker puede tomar el libro sin esperar a que venza
+            self._release_lease()
+
+
+execution_engine = ExecutionEngine()
\ No newline at end of file
@@ -0,0 +1,208 @@
+"""Exportación completa del historial en streaming (CSV, NDJSON o Parquet).
+
+Transacciones, compras y ventas se leen con cursores del servidor (`yield_per`),
+cada una en orden cronológico, y se intercalan en Python con un merge de k vías:
+la base no ordena la unión y en memoria hay a lo sumo un chunk por formato.
+Parquet requiere pyarrow (extra opcional `export`).
+"""
+import csv
+import heapq
+import io
+import json
+from datetime import datetime
+from itertools import islice
+
+from src.history_feed import (
+    BUY_RANK,
+    SELL_RANK,
+    history_type,
+    orders_select,
+    transactions_select,
+)
+from src.models import BuyOrder, SellOrder, Transaction
+from src.money import to_major
+
+EXPORT_CHUNK = 1000
+COLUMNS = ("type", "id", "timestamp", "amount", "stock_symbol", "quantity", "portfolio_name")
+
+
+def export_queries(user_id: int) -> list:
+    """Una consulta por tabla, en orden (timestamp, id) ascendente"""
+    return [
+        transactions_select(user_id).order_by(Transaction.timestamp, Transaction.id),
+        orders_select(BuyOrder, BUY_RANK, user_id).order_by(BuyOrder.timestamp, BuyOrder.id),
+        orders_select(SellOrder, SELL_RANK, user_id).order_by(SellOrder.timestamp, SellOrder.id),
+    ]
+
+
+def _sort_key(row):
+    return (row.timestamp, row.rank, row.id)
+
+
+def export_row(row) -> tuple:
+    return (
+        history_type(row.rank, row.amount), row.id, row.timestamp, to_major(abs(row.amount)),
+        row.stock_symbol, row.quantity, row.portfolio_name,
+    )
+
+
+def merged_rows(results):
+    """Intercala resultados ya ordenados sin materializarlos"""
+    return heapq.merge(*results, key=_sort_key)
+
+
+async def async_merged_rows(results):
+    """merged_rows para resultados async; mantiene solo la fila siguiente de cada uno"""
+    iterators = [result.__aiter__() for result in results]
+    heap = []
+    for index, iterator in enumerate(iterators):
+        row = await anext(iterator, None)
+        if row is not None:
+            heap.append((_sort_key(row), index, row))
+    heapq.heapify(heap)
+    while heap:
+        _, index, row = heap[0]
+        yield row
+        following = await anext(iterators[index], None)
+        if following is None:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (_sort_key(following), index, following))
+
+
+def chunks(rows, size: int = EXPORT_CHUNK):
+    iterator = iter(rows)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+async def async_chunks(rows, size: int = EXPORT_CHUNK):
+    chunk = []
+    async for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class CsvEncoder:
+    media_type = "text/csv"
+    extension = "csv"
+
+    @staticmethod
+    def _write(records) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(records)
+        return buffer.getvalue().encode()
+
+    def header(self) -> bytes:
+        return self._write([COLUMNS])
+
+    def encode(self, chunk: list) -> bytes:
+        return self._write(export_row(row) for row in chunk)
+
+    def footer(self) -> bytes:
+        return b""
+
+
+class NdjsonEncoder:
+    media_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, chunk: list) -> bytes:
+        return "".join(
+            json.dumps(dict(zip(COLUMNS, export_row(row))), default=datetime.isoformat) + "\n"
+            for row in chunk
+        ).encode()
+
+    def footer(self) -> bytes:
+        return b""
+
+
+class _Sink(io.RawIOBase):
+    """Archivo en memoria que se vacía cada vez que se leen sus bytes"""
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+class ParquetEncoder:
+    """Un row group por chunk; el footer se escribe al cerrar"""
+    media_type = "application/vnd.apache.parquet"
+    extension = "parquet"
+
+    def __init__(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        self.schema = pa.schema([
+            ("type", pa.string()),
+            ("id", pa.int64()),
+            ("timestamp", pa.timestamp("us")),
+            ("amount", pa.float64()),
+            ("stock_symbol", pa.string()),
+            ("quantity", pa.float64()),
+            ("portfolio_name", pa.string()),
+        ])
+        self._sink = _Sink()
+        self._writer = pq.ParquetWriter(self._sink, self.schema)
+
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, chunk: list) -> bytes:
+        columns = list(zip(*(export_row(row) for row in chunk)))
+        self._writer.write_table(self._pa.Table.from_arrays(
+            [self._pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema
+        ))
+        return self._sink.drain()
+
+    def footer(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+ENCODERS = {"csv": CsvEncoder, "ndjson": NdjsonEncoder, "parquet": ParquetEncoder}
+
+
+def export_chunks(db, user_id: int, encoder):
+    results = [
+        db.execute(query, execution_options={"yield_per": EXPORT_CHUNK})
+        for query in export_queries(user_id)
+    ]
+    yield encoder.header()
+    for chunk in chunks(merged_rows(results)):
+        yield encoder.encode(chunk)
+    yield encoder.footer()
+
+
+async def async_export_chunks(db, user_id: int, encoder):
+    results = [
+        await db.stream(query, execution_options={"yield_per": EXPORT_CHUNK})
+        for query in export_queries(user_id)
+    ]
+    yield encoder.header()
+    async for chunk in async_chunks(async_merged_rows(results)):
+        yield encoder.encode(chunk)
+    yield encoder.footer()
\ No newline at end of file
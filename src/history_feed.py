@@ -0,0 +1,126 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, literal, null, or_, select, union_all
+
+from src.models import BuyOrder, Portfolio, SellOrder, Stock, Transaction
+from src.money import to_major
+
+# Orden total del feed: (timestamp, rank, id) descendente; el rank desempata
+# movimientos de distintas tablas con el mismo timestamp
+TRANSACTION_RANK, BUY_RANK, SELL_RANK = 0, 1, 2
+
+
+def encode_cursor(timestamp: datetime, rank: int, id: int) -> str:
+    raw = json.dumps([timestamp.isoformat(), rank, id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Lanza ValueError si el cursor no es válido"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, rank, id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), int(rank), int(id)
+    except (TypeError, json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ValueError("Cursor inválido") from e
+
+
+def _after_cursor(timestamp_col, id_col, rank: int, cursor: tuple | None):
+    """Condición keyset de una rama: filas estrictamente después del cursor"""
+    if cursor is None:
+        return None
+    c_timestamp, c_rank, c_id = cursor
+    if rank < c_rank:
+        return timestamp_col <= c_timestamp
+    if rank > c_rank:
+        return timestamp_col < c_timestamp
+    return or_(
+        timestamp_col < c_timestamp,
+        and_(timestamp_col == c_timestamp, id_col < c_id)
+    )
+
+
+def _branch(statement, timestamp_col, id_col, rank: int, cursor, limit: int):
+    condition = _after_cursor(timestamp_col, id_col, rank, cursor)
+    if condition is not None:
+        statement = statement.where(condition)
+    # Cada rama lee a lo sumo `limit` filas por su índice, sin importar la profundidad
+    branch = statement.order_by(timestamp_col.desc(), id_col.desc()).limit(limit).subquery()
+    return select(branch)
+
+
+def transactions_select(user_id: int):
+    return select(
+        literal(TRANSACTION_RANK).label("rank"),
+        Transaction.id.label("id"),
+        Transaction.timestamp.label("timestamp"),
+        Transaction.amount.label("amount"),
+        null().label("stock_symbol"),
+        null().label("quantity"),
+        null().label("portfolio_name")
+    ).where(Transaction.user_id == user_id)
+
+
+def orders_select(model, rank: int, user_id: int):
+    return select(
+        literal(rank).label("rank"),
+        model.id.label("id"),
+        model.timestamp.label("timestamp"),
+        model.amount.label("amount"),
+        Stock.stock.label("stock_symbol"),
+        model.stock_quantity.label("quantity"),
+        Portfolio.portfolio.label("portfolio_name")
+    ).join(
+        Portfolio, Portfolio.id == model.portfolio_id
+    ).join(
+        Stock, Stock.id == model.stock_id
+    ).where(Portfolio.user_id == user_id)
+
+
+def feed_query(user_id: int, cursor: tuple | None, limit: int):
+    """UNION ALL de transacciones, compras y ventas del usuario, ya unidas con
+    stock y portfolio, ordenado por (timestamp, rank, id) descendente"""
+    transactions = _branch(
+        transactions_select(user_id), Transaction.timestamp, Transaction.id, TRANSACTION_RANK, cursor, limit
+    )
+    buys = _branch(
+        orders_select(BuyOrder, BUY_RANK, user_id), BuyOrder.timestamp, BuyOrder.id, BUY_RANK, cursor, limit
+    )
+    sells = _branch(
+        orders_select(SellOrder, SELL_RANK, user_id), SellOrder.timestamp, SellOrder.id, SELL_RANK, cursor, limit
+    )
+    
+    feed = union_all(transactions, buys, sells).subquery()
+    return select(feed).order_by(
+        feed.c.timestamp.desc(), feed.c.rank.desc(), feed.c.id.desc()
+    ).limit(limit)
+
+
+def history_type(rank: int, amount: int) -> str:
+    if rank == TRANSACTION_RANK:
+        return "deposit" if amount > 0 else "withdrawal"
+    return "buy" if rank == BUY_RANK else "sell"
+
+
+def format_feed(rows, limit: int) -> dict:
+    """`rows` viene de feed_query(..., limit + 1); la fila extra indica que hay más"""
+    items = []
+    for row in rows[:limit]:
+        items.append({
+            "id": row.id,
+            "type": history_type(row.rank, row.amount),
+            "amount": to_major(abs(row.amount)),
+            "stock_symbol": row.stock_symbol,
+            "quantity": row.quantity,
+            "portfolio_name": row.portfolio_name,
+            "timestamp": row.timestamp
+        })
+    
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.timestamp, last.rank, last.id)
+    
+    return {"items": items, "next_cursor": next_cursor}
\ No newline at end of file
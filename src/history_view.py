@@ -0,0 +1,67 @@
+"""Vista de /v1/history (últimas transacciones y órdenes), compartida por el router
+sync y el async: cada uno ejecuta history_queries con su sesión y arma la
+respuesta con format_history."""
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+
+from src.models import BuyOrder, Portfolio, SellOrder, Transaction
+from src.money import to_major
+
+
+def orders_query(model, user_id: int, limit: int):
+    """Órdenes con su acción y su portfolio en la misma consulta (sin N+1 y sin
+    lazy loading, que AsyncSession no permite)"""
+    return select(model).join(
+        model.portfolio
+    ).where(
+        Portfolio.user_id == user_id
+    ).options(
+        joinedload(model.stock),
+        joinedload(model.portfolio)
+    ).order_by(
+        model.timestamp.desc()
+    ).limit(limit)
+
+
+def history_queries(user_id: int, limit: int) -> tuple:
+    """Transacciones de dinero, compras y ventas; se ejecutan con scalars()"""
+    return (
+        select(Transaction).where(
+            Transaction.user_id == user_id
+        ).order_by(
+            Transaction.timestamp.desc()
+        ).limit(limit),
+        orders_query(BuyOrder, user_id, limit),
+        orders_query(SellOrder, user_id, limit),
+    )
+
+
+def format_history(transactions, buy_orders, sell_orders, limit: int) -> dict:
+    orders = [
+        {
+            "id": order.id,
+            "type": "buy" if isinstance(order, BuyOrder) else "sell",
+            "stock_symbol": order.stock.stock,
+            "quantity": order.stock_quantity,
+            "amount": to_major(order.amount),
+            "portfolio_name": order.portfolio.portfolio,
+            "timestamp": order.timestamp
+        }
+        for order in [*buy_orders, *sell_orders]
+    ]
+    # Ordenar todas las órdenes por timestamp (más reciente primero)
+    orders.sort(key=lambda order: order["timestamp"], reverse=True)
+    
+    return {
+        "transactions": [
+            {
+                "id": t.id,
+                "type": "deposit" if t.amount > 0 else "withdrawal",
+                "amount": to_major(abs(t.amount)),
+                "description": "Transferencia de fondos",
+                "timestamp": t.timestamp
+            }
+            for t in transactions
+        ],
+        "orders": orders[:limit]  # Aplicar límite también a las órdenes combinadas
+    }
\ No newline at end of file
@@ -0,0 +1,194 @@
+import csv
+import json
+import logging
+import threading
+import time
+from collections.abc import Iterable
+from datetime import UTC, datetime
+from decimal import Decimal
+
+from sqlalchemy import bindparam, or_, select, update
+
+from src.cache import invalidate_catalogue
+from src.config import PRICE_FLUSH_INTERVAL
+from src.database import write_engine
+from src.models import Stock, utcnow
+from src.money import to_minor
+from src.prices import Candle, bucket_start, record_prices
+from src.streaming import stream_hub
+
+logger = logging.getLogger(__name__)
+
+
+def naive_utc(timestamp: datetime) -> datetime:
+    """El historial guarda fechas UTC sin zona: un timestamp con zona se pasa a
+    UTC para poder compararlo con los demás"""
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(UTC).replace(tzinfo=None)
+
+
+class PriceTickIngestor:
+    """Recibe ticks de precio, los agrupa en una vela por símbolo y bucket y cada
+    `flush_interval` segundos escribe en lote el último precio sobre
+    Stock.unit_value y las velas en el historial"""
+    def __init__(self, bind=write_engine, flush_interval: float = PRICE_FLUSH_INTERVAL):
+        self.bind = bind
+        self.flush_interval = flush_interval
+        self._pending: dict = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.stats = {
+            "ticks_received": 0,
+            "ticks_coalesced": 0,
+            "rows_written": 0,
+            "flushes": 0,
+            "last_flush_ms": 0.0,
+        }
+    
+    def submit(self, ticks: Iterable[tuple]) -> int:
+        """Encola ticks (symbol, price[, timestamp]) con el precio en unidades;
+        devuelve cuántos se aceptaron"""
+        received = 0
+        with self._lock:
+            for tick in ticks:
+                symbol, price = tick[0], to_minor(tick[1])
+                timestamp = naive_utc(tick[2]) if len(tick) > 2 and tick[2] is not None else utcnow()
+                received += 1
+                key = (symbol, bucket_start(timestamp))
+                candle = self._pending.get(key)
+                if candle is None:
+                    self._pending[key] = Candle(price, timestamp)
+                else:
+                    self.stats["ticks_coalesced"] += 1
+                    candle.merge(Candle(price, timestamp))
+            self.stats["ticks_received"] += received
+        return received
+    
+    def flush(self) -> int:
+        """Escribe los precios pendientes con un único executemany y los agrega
+        al historial"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            
+            started = time.perf_counter()
+            latest = {}
+            for (symbol, _), candle in pending.items():
+                current = latest.get(symbol)
+                if current is None or current[1] <= candle.closed_at:
+                    latest[symbol] = (candle.close, candle.closed_at)
+            # Un tick atrasado va al historial pero no pisa un precio más reciente
+            statement = update(Stock).where(
+                Stock.stock == bindparam("symbol"),
+                or_(Stock.priced_at.is_(None), Stock.priced_at <= bindparam("priced_at"))
+            ).values(unit_value=bindparam("price"), priced_at=bindparam("priced_at"))
+            
+            try:
+                with self.bind.begin() as conn:
+                    for symbol, priced_at in conn.execute(
+                        select(Stock.stock, Stock.priced_at).where(Stock.stock.in_(latest))
+                    ):
+                        if priced_at is not None and priced_at > latest[symbol][1]:
+                            del latest[symbol]
+                    written = 0
+                    if latest:
+                        written = max(conn.execute(statement, [
+                            {"symbol": symbol, "price": price, "priced_at": priced_at}
+                            for symbol, (price, priced_at) in latest.items()
+                        ]).rowcount, 0)
+                    record_prices(conn, pending)
+            except Exception:
+                self._restore(pending)
+                raise
+            invalidate_catalogue("stocks")
+            stream_hub.publish_prices(latest)
+            
+            self.stats["rows_written"] += written
+            self.stats["flushes"] += 1
+            self.stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            return written
+    
+    def _restore(self, pending: dict):
+        """Devuelve a la cola un lote que no se pudo escribir, sin pisar los
+        ticks más recientes que llegaron mientras tanto"""
+        with self._lock:
+            for key, candle in pending.items():
+                current = self._pending.get(key)
+                if current is None:
+                    self._pending[key] = candle
+                else:
+                    current.merge(candle)
+    
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Error al escribir precios")
+    
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="price-flusher", daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+price_ingestor = PriceTickIngestor()
+
+
+def read_ticks(path: str):
+    """Lee ticks desde un archivo CSV (symbol,price[,timestamp]) o NDJSON"""
+    with open(path) as f:
+        if path.endswith((".ndjson", ".jsonl")):
+            for line in f:
+                if line.strip():
+                    # Decimal: el precio del archivo se convierte sin pasar por float
+                    tick = json.loads(line, parse_float=Decimal)
+                    timestamp = tick.get("timestamp")
+                    yield (
+                        tick["symbol"],
+                        tick["price"],
+                        datetime.fromisoformat(timestamp) if timestamp else None
+                    )
+        else:
+            for row in csv.reader(f):
+                if not row or row[0] == "symbol":
+                    continue
+                timestamp = datetime.fromisoformat(row[2]) if len(row) > 2 and row[2] else None
+                yield (row[0], Decimal(row[1]), timestamp)
+
+
+def replay_file(path: str, ingestor: PriceTickIngestor = price_ingestor, batch_size: int = 1000) -> int:
+    """Reproduce un archivo de ticks en lotes, útil para pruebas locales"""
+    batch, total = [], 0
+    for tick in read_ticks(path):
+        batch.append(tick)
+        if len(batch) >= batch_size:
+            total += ingestor.submit(batch)
+            batch = []
+    if batch:
+        total += ingestor.submit(batch)
+    ingestor.flush()
+    return total
+
+
+if __name__ == "__main__":
+    import sys
+    
+    started = time.perf_counter()
+    count = replay_file(sys.argv[1])
+    elapsed = time.perf_counter() - started
+    print(f"✅ {count} ticks en {elapsed:.2f}s ({count / elapsed:.0f} ticks/s)")
+    print(price_ingestor.stats)
\ No newline at end of file
@@ -0,0 +1,183 @@
+"""Métricas por request: latencia, consultas SQL, espera en el threadpool y tamaño
+de respuesta, agrupadas por ruta (el template, no la URL) y expuestas en /metrics."""
+import json
+import threading
+import time
+from contextvars import ContextVar
+
+from fastapi import Depends
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src import query_guard
+from src.metrics import HistogramFamily, collectors, render_histogram
+from src.pool import pool_metrics
+
+SIZE_BUCKETS = (100, 500, 1_000, 5_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 10_000_000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+request_duration = HistogramFamily(
+    "http_request_duration_seconds", "Latencia del request", ("method", "route", "status")
+)
+request_sql_queries = HistogramFamily(
+    "http_request_sql_queries", "Consultas SQL por request", ("method", "route"), QUERY_COUNT_BUCKETS
+)
+request_sql_seconds = HistogramFamily(
+    "http_request_sql_seconds", "Tiempo total en SQL por request", ("method", "route")
+)
+request_threadpool_wait = HistogramFamily(
+    "http_request_threadpool_wait_seconds",
+    "Espera desde que llega el request hasta que su primera dependencia sync corre en el threadpool",
+    ("method", "route")
+)
+response_size = HistogramFamily(
+    "http_response_size_bytes", "Tamaño del cuerpo de la respuesta", ("method", "route"), SIZE_BUCKETS
+)
+
+
+class RequestStats:
+    __slots__ = ("fingerprints", "query_budget", "sql_queries", "sql_seconds", "started", "threadpool_wait")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_queries = 0
+        self.sql_seconds = 0.0
+        self.threadpool_wait: float | None = None
+        # Solo con QUERY_GUARD activo: huella de cada sentencia -> veces ejecutada
+        self.fingerprints = query_guard.new_fingerprints()
+        self.query_budget: int | None = None
+
+
+# Se copia al threadpool y a los greenlets de SQLAlchemy async; se muta, no se reasigna
+current_request: ContextVar[RequestStats | None] = ContextVar("current_request", default=None)
+
+
+def mark_threadpool_start():
+    """Llamar al inicio de las dependencias sync: la primera que corre en un
+    worker registra cuánto esperó el request por un thread"""
+    stats = current_request.get()
+    if stats is not None and stats.threadpool_wait is None and threading.current_thread() is not threading.main_thread():
+        stats.threadpool_wait = time.perf_counter() - stats.started
+
+
+def query_budget(limit: int):
+    """Dependencia de ruta: `dependencies=[query_budget(n)]` declara cuántas
+    consultas puede hacer el request (ver src/query_guard.py)"""
+    def declare():
+        stats = current_request.get()
+        if stats is not None:
+            stats.query_budget = limit
+    return Depends(declare)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_request.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_request.get()
+    if stats is not None and conn.info.get("query_started"):
+        stats.sql_seconds += time.perf_counter() - conn.info["query_started"].pop()
+        if query_guard.is_control(statement):
+            return
+        stats.sql_queries += 1
+        if stats.fingerprints is not None:
+            stats.fingerprints[query_guard.fingerprint(statement)] += 1
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: observa los mensajes de la respuesta sin bufferearla; solo
+    la reemplaza si QUERY_GUARD=raise y el request excedió su presupuesto"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status_code = 500
+        body_size = 0
+        rejected = False
+        reported = False
+        method = scope["method"]
+
+        async def send_wrapper(message):
+            nonlocal status_code, body_size, rejected, reported
+            if rejected:
+                return
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if stats.fingerprints is not None:
+                    found = query_guard.violations(stats)
+                    if found is not None:
+                        path = getattr(scope.get("route"), "path", scope["path"])
+                        query_guard.report(method, path, found)
+                        reported = True
+                        if query_guard.QUERY_GUARD == "raise":
+                            rejected = True
+                            status_code = 500
+                            await _send_violation(send, found)
+                            return
+            elif message["type"] == "http.response.body":
+                body_size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            route = scope.get("route")
+            # Rutas sin match se agrupan para no crear una serie por URL
+            path = getattr(route, "path", "unmatched")
+            # Las respuestas en streaming consultan después de enviar los headers:
+            # ya no se pueden rechazar, pero se reportan
+            if stats.fingerprints is not None and not reported and not rejected:
+                found = query_guard.violations(stats)
+                if found is not None:
+                    query_guard.report(method, path, found)
+            request_duration.labels(method, path, status_code).observe(time.perf_counter() - stats.started)
+            request_sql_queries.labels(method, path).observe(stats.sql_queries)
+            request_sql_seconds.labels(method, path).observe(stats.sql_seconds)
+            if stats.threadpool_wait is not None:
+                request_threadpool_wait.labels(method, path).observe(stats.threadpool_wait)
+            response_size.labels(method, path).observe(body_size)
+
+
+async def _send_violation(send, found: dict):
+    body = json.dumps({"detail": "Presupuesto de consultas excedido", **found}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 500,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _collect_pools() -> list:
+    lines = [
+        "# HELP db_pool_checkout_wait_seconds Espera por una conexión del pool",
+        "# TYPE db_pool_checkout_wait_seconds histogram",
+    ]
+    for name, metrics in pool_metrics.items():
+        lines.extend(render_histogram("db_pool_checkout_wait_seconds", metrics.checkout_wait, {"engine": name}))
+    for metric, attr, kind in (
+        ("db_pool_checkouts_total", "checkouts", "counter"),
+        ("db_pool_saturated_total", "saturated", "counter"),
+        ("db_pool_timeouts_total", "timeouts", "counter"),
+    ):
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.extend(f'{metric}{{engine="{name}"}} {getattr(m, attr).value}' for name, m in pool_metrics.items())
+    lines.append("# TYPE db_pool_checked_out gauge")
+    lines.extend(
+        f'db_pool_checked_out{{engine="{name}"}} {m.pool.checkedout()}'
+        for name, m in pool_metrics.items() if m.pool is not None
+    )
+    return lines
+
+
+collectors.append(_collect_pools)
\ No newline at end of file
@@ -0,0 +1,129 @@
+from sqlalchemy import cast, func, update
+
+from src.models import OrderState, PortfolioStock, User
+from src.money import Money, amount_for, to_minor
+
+# Todas las mutaciones de saldo y posiciones son un único UPDATE condicional,
+# así dos requests concurrentes (en cualquier worker) no pisan sus cambios.
+# Los montos son enteros en unidades menores (src/money.py).
+
+
+def credit_balance(user_id: int, amount: int):
+    """Suma `amount` al saldo; RETURNING entrega el saldo nuevo"""
+    return update(User).where(
+        User.id == user_id
+    ).values(
+        balance=func.coalesce(User.balance, 0) + amount
+    ).returning(User.balance).execution_options(synchronize_session=False)
+
+
+def debit_balance(user_id: int, amount: int):
+    """Resta `amount` solo si el saldo alcanza; sin fila de vuelta = fondos insuficientes"""
+    return update(User).where(
+        User.id == user_id,
+        User.balance >= amount
+    ).values(
+        balance=User.balance - amount
+    ).returning(User.balance).execution_options(synchronize_session=False)
+
+
+def position_values(portfolio_id: int, stock_id: int, quantity: float, amount: int) -> dict:
+    return {
+        "portfolio_id": portfolio_id,
+        "stock_id": stock_id,
+        "quantity": quantity,
+        "cost_basis": amount,
+        "realized_pnl": 0,
+        "reserved_quantity": 0
+    }
+
+
+def reserve_position(portfolio_id: int, stock_id: int, quantity: float):
+    """Aparta las acciones de una venta pendiente, solo si hay suficientes sin
+    apartar; sin filas afectadas = acciones insuficientes. Siguen en la posición
+    (y en su costo promedio) hasta que la venta se ejecuta."""
+    reserved = func.coalesce(PortfolioStock.reserved_quantity, 0)
+    return update(PortfolioStock).where(
+        PortfolioStock.portfolio_id == portfolio_id,
+        PortfolioStock.stock_id == stock_id,
+        PortfolioStock.quantity - reserved >= quantity
+    ).values(
+        reserved_quantity=reserved + quantity
+    ).execution_options(synchronize_session=False)
+
+
+def available_quantity():
+    """Acciones de la posición que no están apartadas por ventas pendientes"""
+    return PortfolioStock.quantity - func.coalesce(PortfolioStock.reserved_quantity, 0)
+
+
+def release_position(portfolio_id: int, stock_id: int, quantity: float):
+    """Libera las acciones apartadas por una venta rechazada"""
+    return update(PortfolioStock).where(
+        PortfolioStock.portfolio_id == portfolio_id,
+        PortfolioStock.stock_id == stock_id
+    ).values(
+        reserved_quantity=PortfolioStock.reserved_quantity - quantity
+    ).execution_options(synchronize_session=False)
+
+
+def _cost_of(quantity):
+    """Parte del costo de la posición que corresponde a `quantity` acciones,
+    redondeada al entero más cercano con aritmética entera"""
+    cost = func.coalesce(PortfolioStock.cost_basis, 0)
+    return cast((2 * cost * quantity + PortfolioStock.quantity) / (2 * PortfolioStock.quantity), Money)
+
+
+def sell_position(portfolio_id: int, stock_id: int, quantity: float, amount: int):
+    """Descuenta una venta ejecutada (ya apartada con reserve_position) y acumula
+    la ganancia realizada contra el costo promedio; el costo que sale de la
+    posición deja de contar en cost_basis.
+    La fila se conserva con cantidad 0 para no perder el P&L realizado."""
+    sold_cost = _cost_of(quantity)
+    return update(PortfolioStock).where(
+        PortfolioStock.portfolio_id == portfolio_id,
+        PortfolioStock.stock_id == stock_id
+    ).values(
+        realized_pnl=func.coalesce(PortfolioStock.realized_pnl, 0) + amount - sold_cost,
+        cost_basis=func.coalesce(PortfolioStock.cost_basis, 0) - sold_cost,
+        quantity=PortfolioStock.quantity - quantity,
+        reserved_quantity=PortfolioStock.reserved_quantity - quantity
+    ).execution_options(synchronize_session=False)
+
+def order_row(order, stock, timestamp) -> dict:
+    """Columnas de una orden pendiente; el monto reservado sale del precio actual
+    o, en las órdenes límite, de su precio límite"""
+    limit_price = to_minor(order.limit_price) if order.limit_price is not None else None
+    return {
+        "portfolio_id": order.portfolio_id,
+        "broker_id": order.broker_id,
+        "stock_id": order.stock_id,
+        "amount": amount_for(limit_price or stock.unit_value, order.stock_quantity),
+        "stock_quantity": order.stock_quantity,
+        "limit_price": limit_price,
+        "state": OrderState.PENDING,
+        "timestamp": timestamp
+    }
+
+
+def plan_batch(legs, stocks: dict, timestamp):
+    """Calcula el monto de cada pata de un batch de órdenes pendientes y agrupa
+    cantidades y montos de las ventas por posición (portfolio_id, stock_id)"""
+    buy_rows, sell_rows = [], []
+    sells = {}
+    for leg in legs:
+        row = order_row(leg, stocks[leg.stock_id], timestamp)
+        (buy_rows if leg.side == "buy" else sell_rows).append(row)
+        if leg.side == "sell":
+            key = (leg.portfolio_id, leg.stock_id)
+            quantity, total = sells.get(key, (0, 0))
+            sells[key] = (quantity + leg.stock_quantity, total + row["amount"])
+    return buy_rows, sell_rows, sells
+
+
+def position_params(totals: dict) -> list:
+    """Parámetros para ejecutar las sentencias de posición con executemany"""
+    return [
+        {"b_portfolio_id": portfolio_id, "b_stock_id": stock_id, "b_quantity": quantity, "b_amount": amount}
+        for (portfolio_id, stock_id), (quantity, amount) in totals.items()
+    ]
@@ -1,6 +1,8 @@
-from src.database import SessionLocal
 from src.config import pwd_context
-from src.models import User, Broker, Portfolio, Stock, PortfolioStock
+from src.database import SessionLocal
+from src.models import Broker, Portfolio, PortfolioStock, Stock, User
+from src.money import amount_for, to_minor
+
 
 def create_examples():
     db = SessionLocal()
@@ -10,7 +12,7 @@ def create_examples():
             username="john_doe",
             email="example@example.dev",
             hashed_password=pwd_context.hash('123456'),
-            balance=10000.0  # Increased balance for testing
+            balance=to_minor(10000)  # Increased balance for testing
         )
         existing_user = db.query(User).filter(User.email == user_data.email).first()
         if not existing_user:
@@ -72,7 +74,7 @@ def create_examples():
                 stock = Stock(
                     stock=data["stock"],
                     quantity=data["quantity"],
-                    unit_value=data["unit_value"]
+                    unit_value=to_minor(data["unit_value"])
                 )
                 db.add(stock)
                 db.commit()
@@ -105,7 +107,9 @@ def create_examples():
                     portfolio_stock = PortfolioStock(
                         portfolio_id=first_portfolio.id,
                         stock_id=item["stock"].id,
-                        quantity=item["quantity"]
+                        quantity=item["quantity"],
+                        cost_basis=amount_for(to_minor(item["average_price"]), item["quantity"]),
+                        realized_pnl=0
                     )
                     db.add(portfolio_stock)
                     print(f"✅ Added {item['stock'].stock} to {first_portfolio.portfolio}")
@@ -117,7 +121,7 @@ def create_examples():
         print("🎉 Example data creation complete!")
     except Exception as e:
         db.rollback()
-        print(f"❌ Error creating examples: {str(e)}")
+        print(f"❌ Error creating examples: {e!s}")
         raise
     finally:
         db.close()
\ No newline at end of file
@@ -0,0 +1,345 @@
+"""Migración incremental del esquema: `create_all` solo crea tablas nuevas, así que
+aquí se agregan columnas e índices faltantes en bases SQLite/Postgres existentes,
+se pasan a unidades menores los montos guardados como float, se exigen NOT NULL
+nuevos y se verifica que las consultas más usadas no hagan full scan.
+
+Uso: python -m src.migrations [--check-plans]
+"""
+import re
+import sys
+from datetime import datetime
+
+from sqlalchemy import Integer, func, inspect, literal, select, text, update
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateTable
+
+from src.database import Base, engine
+from src.history_feed import feed_query
+from src.models import (
+    BuyOrder,
+    OrderState,
+    Portfolio,
+    PortfolioStock,
+    SellOrder,
+    Stock,
+    Transaction,
+    User,
+)
+from src.money import MINOR_UNITS, Money
+from src.prices import candles_query
+
+# Columnas de dinero que reemplazan a una columna float con otro significado:
+# (tabla, columna) -> (columna vieja, expresión en unidades)
+DERIVED_MONEY = {
+    ("portfolio_stock", "cost_basis"): ("average_price", "quantity * average_price"),
+}
+
+
+# Columnas que pasaron a NOT NULL: (tabla, columna) -> valor para las filas en NULL.
+# Sin fecha conocida, los movimientos quedan como los más viejos del historial
+NOT_NULL_BACKFILL = {
+    ("transaction", "timestamp"): datetime(1970, 1, 1),
+    ("buy_order", "timestamp"): datetime(1970, 1, 1),
+    ("sell_order", "timestamp"): datetime(1970, 1, 1),
+}
+
+
+def _minor(expression: str) -> str:
+    return f"CAST(ROUND(({expression}) * {MINOR_UNITS}) AS BIGINT)"
+
+
+def money_conversions(bind=engine) -> dict:
+    """Tablas con montos todavía en float: tabla -> {columna: expresión SQL que la
+    calcula en unidades menores a partir de las columnas actuales}"""
+    inspector = inspect(bind)
+    quote = bind.dialect.identifier_preparer.quote
+    conversions = {}
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"]: column for column in inspector.get_columns(table.name)}
+        columns = {}
+        for column in table.columns:
+            if not isinstance(column.type, Money):
+                continue
+            current = existing.get(column.name)
+            if current is not None:
+                if not isinstance(current["type"], Integer):
+                    columns[column.name] = _minor(quote(column.name))
+            elif (table.name, column.name) in DERIVED_MONEY:
+                source, expression = DERIVED_MONEY[(table.name, column.name)]
+                if source in existing:
+                    columns[column.name] = _minor(expression)
+        if columns:
+            conversions[table.name] = columns
+    return conversions
+
+
+def _rebuild_sqlite_table(conn, table, existing: set, conversions: dict):
+    """SQLite no cambia el tipo ni la nulabilidad de una columna: se crea la tabla
+    nueva, se copian las filas convirtiendo los montos y se reemplaza la vieja. Los
+    índices los vuelve a crear add_missing_indexes()."""
+    preparer = conn.dialect.identifier_preparer
+    name, staging = preparer.format_table(table), preparer.quote(f"{table.name}__rebuild")
+    ddl = str(CreateTable(table).compile(dialect=conn.dialect))
+    conn.execute(text(ddl.replace(f"CREATE TABLE {name}", f"CREATE TABLE {staging}", 1)))
+    names, values = [], []
+    for column in table.columns:
+        if column.name in conversions:
+            value = conversions[column.name]
+        elif column.name in existing:
+            value = preparer.quote(column.name)
+        elif column.default is not None and column.default.is_scalar:
+            value = str(literal(column.default.arg).compile(
+                dialect=conn.dialect, compile_kwargs={"literal_binds": True}
+            ))
+        else:
+            continue
+        names.append(preparer.quote(column.name))
+        values.append(value)
+    conn.execute(text(f"INSERT INTO {staging} ({', '.join(names)}) SELECT {', '.join(values)} FROM {name}"))
+    conn.execute(text(f"DROP TABLE {name}"))
+    conn.execute(text(f"ALTER TABLE {staging} RENAME TO {name}"))
+
+
+def convert_money_columns(bind=engine) -> list:
+    """Pasa los montos en float a BigInteger en unidades menores (src/money.py).
+    Solo toca columnas que todavía no son enteras, así correrlo de nuevo no
+    vuelve a multiplicar."""
+    conversions = money_conversions(bind)
+    if not conversions:
+        return []
+    inspector = inspect(bind)
+    preparer = bind.dialect.identifier_preparer
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            columns = conversions.get(table.name)
+            if columns is None:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            if bind.dialect.name == "sqlite":
+                _rebuild_sqlite_table(conn, table, existing, columns)
+                continue
+            name = preparer.format_table(table)
+            for column, expression in columns.items():
+                quoted = preparer.quote(column)
+                if column in existing:
+                    conn.execute(text(f"ALTER TABLE {name} ALTER COLUMN {quoted} TYPE BIGINT USING {expression}"))
+                else:
+                    conn.execute(text(f"ALTER TABLE {name} ADD COLUMN {quoted} BIGINT"))
+                    conn.execute(text(f"UPDATE {name} SET {quoted} = {expression}"))
+            for (table_name, _), (source, _) in DERIVED_MONEY.items():
+                if table_name == table.name and source in existing:
+                    conn.execute(text(f"ALTER TABLE {name} DROP COLUMN {preparer.quote(source)}"))
+    return list(conversions)
+
+
+def _nullable_backfills(inspector) -> dict:
+    """Columnas de NOT_NULL_BACKFILL que en la base todavía aceptan NULL:
+    tabla -> {columna: valor de relleno}"""
+    pending = {}
+    for (table, column), value in NOT_NULL_BACKFILL.items():
+        if not inspector.has_table(table):
+            continue
+        existing = {c["name"]: c for c in inspector.get_columns(table)}
+        if column in existing and existing[column]["nullable"]:
+            pending.setdefault(table, {})[column] = value
+    return pending
+
+
+def backfill_nulls(bind=engine) -> list:
+    """Rellena los NULL de las columnas que pasaron a NOT NULL. Corre antes de
+    convert_money_columns(): en SQLite esa conversión rehace la tabla con el DDL
+    del modelo, que ya no acepta NULL"""
+    pending = _nullable_backfills(inspect(bind))
+    filled = []
+    with bind.begin() as conn:
+        for table_name, columns in pending.items():
+            table = Base.metadata.tables[table_name]
+            for column, value in columns.items():
+                result = conn.execute(
+                    update(table).where(table.c[column].is_(None)).values({column: value})
+                )
+                if result.rowcount:
+                    filled.append(f"{table_name}.{column}")
+    return filled
+
+
+def require_not_null(bind=engine) -> list:
+    """Aplica NOT NULL a las columnas ya rellenadas por backfill_nulls()"""
+    inspector = inspect(bind)
+    pending = _nullable_backfills(inspector)
+    preparer = bind.dialect.identifier_preparer
+    required = []
+    with bind.begin() as conn:
+        for table_name, columns in pending.items():
+            table = Base.metadata.tables[table_name]
+            if bind.dialect.name == "sqlite":
+                existing = {column["name"] for column in inspector.get_columns(table_name)}
+                _rebuild_sqlite_table(conn, table, existing, {})
+            else:
+                name = preparer.format_table(table)
+                for column in columns:
+                    conn.execute(text(f"ALTER TABLE {name} ALTER COLUMN {preparer.quote(column)} SET NOT NULL"))
+            required += [f"{table_name}.{column}" for column in columns]
+    return required
+
+
+def add_missing_columns(bind=engine) -> list:
+    inspector = inspect(bind)
+    added = []
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = CreateColumn(column).compile(dialect=bind.dialect)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN {ddl}'))
+                # Las filas existentes quedan en NULL; se rellenan con el default del modelo
+                if column.default is not None and column.default.is_scalar:
+                    conn.execute(update(table).values({column.name: column.default.arg}))
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
+class DuplicateValues(Exception):
+    """Filas repetidas impiden crear un índice único"""
+
+
+def duplicate_values(index, bind=engine, limit: int = 5) -> list:
+    """Hasta `limit` combinaciones repetidas en las columnas del índice, como
+    (valores..., veces); los NULL no chocan en un índice único y no cuentan"""
+    columns = list(index.columns)
+    count = func.count()
+    statement = select(*columns, count).where(
+        *(column.is_not(None) for column in columns)
+    ).group_by(*columns).having(count > 1).order_by(count.desc()).limit(limit)
+    with bind.connect() as conn:
+        return conn.execute(statement).all()
+
+
+def add_missing_indexes(bind=engine) -> list:
+    """En Postgres los índices se crean CONCURRENTLY para no bloquear escrituras.
+    Antes de crear alguno se buscan duplicados para los únicos: si hay, no se
+    crea ninguno y se lanza DuplicateValues con los valores a corregir"""
+    inspector = inspect(bind)
+    concurrently = bind.dialect.name == "postgresql"
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        missing += [
+            index for index in sorted(table.indexes, key=lambda i: i.name)
+            if index.name not in existing
+        ]
+    
+    problems = []
+    for index in missing:
+        if not index.unique:
+            continue
+        duplicates = duplicate_values(index, bind)
+        if duplicates:
+            columns = ", ".join(column.name for column in index.columns)
+            values = ", ".join(f"{tuple(row[:-1])} x{row[-1]}" for row in duplicates)
+            problems.append(f"{index.name} en {index.table.name} ({columns}): {values}")
+    if problems:
+        raise DuplicateValues(
+            "No se pueden crear índices únicos porque hay valores repetidos; "
+            "corrija esas filas y vuelva a migrar:\n  " + "\n  ".join(problems)
+        )
+    
+    created = []
+    for index in missing:
+        ddl = str(CreateIndex(index).compile(dialect=bind.dialect))
+        if concurrently:
+            ddl = re.sub(r"^CREATE (UNIQUE )?INDEX", r"CREATE \1INDEX CONCURRENTLY", ddl)
+            with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text(ddl))
+        else:
+            with bind.begin() as conn:
+                conn.execute(text(ddl))
+        created.append(index.name)
+    return created
+
+
+def migrate(bind=engine):
+    Base.metadata.create_all(bind=bind)
+    for column in backfill_nulls(bind):
+        print(f"✅ Filled NULL values of {column}")
+    for table in convert_money_columns(bind):
+        print(f"✅ Converted money columns of {table} to minor units")
+    for column in add_missing_columns(bind):
+        print(f"✅ Added column {column}")
+    for column in require_not_null(bind):
+        print(f"✅ Made {column} NOT NULL")
+    for index in add_missing_indexes(bind):
+        print(f"✅ Created index {index}")
+
+
+def hot_queries() -> dict:
+    """Consultas de los endpoints más usados, con parámetros de ejemplo"""
+    return {
+        "login": select(User).where(User.username == "john_doe"),
+        "update_info_email": select(User).where(User.email == "example@example.dev", User.id != 1),
+        "user_portfolios": select(Portfolio).where(Portfolio.user_id == 1),
+        "position": select(PortfolioStock).where(
+            PortfolioStock.portfolio_id == 1, PortfolioStock.stock_id == 1
+        ),
+        "stock_by_symbol": select(Stock).where(Stock.stock == "AAPL"),
+        "transactions": select(Transaction).where(
+            Transaction.user_id == 1
+        ).order_by(Transaction.timestamp.desc()).limit(10),
+        "buy_orders": select(BuyOrder).where(
+            BuyOrder.portfolio_id == 1
+        ).order_by(BuyOrder.timestamp.desc()).limit(10),
+        "sell_orders": select(SellOrder).where(
+            SellOrder.portfolio_id == 1
+        ).order_by(SellOrder.timestamp.desc()).limit(10),
+        "candles": candles_query(1, 60, None, None),
+        "history_feed": feed_query(1, None, 21),
+        "pending_orders": select(BuyOrder.id).where(
+            BuyOrder.state == OrderState.PENDING
+        ).order_by(BuyOrder.id).limit(200),
+    }
+
+
+def full_scans(statement, bind=engine) -> list:
+    """Devuelve las tablas que el plan de la consulta recorre completas"""
+    tables = set(Base.metadata.tables)
+    compiled = statement.compile(dialect=bind.dialect, compile_kwargs={"literal_binds": True})
+    with bind.connect() as conn:
+        if bind.dialect.name == "sqlite":
+            plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+            pattern = re.compile(r"^SCAN (\w+)")
+        else:
+            # Con tablas chicas Postgres prefiere Seq Scan; se desactiva para ver si
+            # existe un índice utilizable
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+            plan = [row[0] for row in conn.execute(text(f"EXPLAIN {compiled}"))]
+            pattern = re.compile(r"Seq Scan on (\w+)")
+    scans = []
+    for line in plan:
+        match = pattern.search(line.strip())
+        if match and match.group(1) in tables:
+            scans.append(line.strip())
+    return scans
+
+
+def check_query_plans(bind=engine) -> bool:
+    ok = True
+    for name, statement in hot_queries().items():
+        scans = full_scans(statement, bind)
+        if scans:
+            ok = False
+            print(f"❌ {name}: {'; '.join(scans)}")
+        else:
+            print(f"✅ {name}")
+    return ok
+
+
+if __name__ == "__main__":
+    try:
+        migrate()
+    except DuplicateValues as e:
+        sys.exit(f"❌ {e}")
+    if "--check-plans" in sys.argv and not check_query_plans():
+        sys.exit(1)
\ No newline at end of file
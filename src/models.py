@@ -1,43 +1,102 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from datetime import UTC, datetime
+
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship
+
 from .database import Base
 
+# Montos y precios en unidades menores (ver src/money.py)
+from .money import Money
+
+
+def utcnow() -> datetime:
+    """Las fechas se guardan en UTC sin zona"""
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
 class User(Base):
     __tablename__ = 'user'
+    __table_args__ = (
+        Index('ix_user_username', 'username', unique=True),
+        Index('ix_user_email', 'email', unique=True),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     username = Column(String, nullable=False)
     email = Column(String, nullable=False)
     hashed_password = Column(String, nullable=False)
-    balance = Column(Float)
+    balance = Column(Money)
     
     transactions = relationship("Transaction", back_populates="user")
     portfolios = relationship("Portfolio", back_populates="user")
 
 class Stock(Base):
     __tablename__ = 'stock'
+    __table_args__ = (
+        Index('ix_stock_stock', 'stock', unique=True),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     stock = Column(String, nullable=False)
     quantity = Column(Integer)
-    unit_value = Column(Float)
+    unit_value = Column(Money)
+    # Hora del tick que fijó unit_value; uno más viejo no la pisa (src/ingestion.py)
+    priced_at = Column(DateTime)
     
     portfolio_stocks = relationship("PortfolioStock", back_populates="stock")
     buy_orders = relationship("BuyOrder", back_populates="stock")
     sell_orders = relationship("SellOrder", back_populates="stock")
 
+class StockPrice(Base):
+    """Historial de precios, solo se agregan filas"""
+    __tablename__ = 'stock_price'
+    __table_args__ = (
+        Index('ix_stock_price_stock_id_timestamp', 'stock_id', 'timestamp'),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    stock_id = Column(Integer, ForeignKey('stock.id'), nullable=False)
+    price = Column(Money, nullable=False)
+    timestamp = Column(DateTime, nullable=False)
+
+class StockPriceRollup(Base):
+    """Velas OHLC precalculadas cada PRICE_ROLLUP_INTERVAL segundos"""
+    __tablename__ = 'stock_price_rollup'
+    __table_args__ = (
+        Index('ix_stock_price_rollup_stock_id_bucket', 'stock_id', 'bucket', unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    stock_id = Column(Integer, ForeignKey('stock.id'), nullable=False)
+    bucket = Column(DateTime, nullable=False)
+    open = Column(Money, nullable=False)
+    high = Column(Money, nullable=False)
+    low = Column(Money, nullable=False)
+    close = Column(Money, nullable=False)
+    # Hora de los ticks de apertura y cierre: un tick atrasado solo reemplaza la
+    # apertura si es anterior y el cierre si es posterior. NULL en filas previas
+    opened_at = Column(DateTime)
+    closed_at = Column(DateTime)
+
 class Transaction(Base):
     __tablename__ = 'transaction'
+    __table_args__ = (
+        Index('ix_transaction_user_id_timestamp', 'user_id', 'timestamp'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('user.id'), nullable=False)
-    amount = Column(Float, nullable=False)
-    timestamp = Column(DateTime)
+    amount = Column(Money, nullable=False)
+    # El feed de historial pagina por (timestamp, id); un NULL rompe el cursor
+    timestamp = Column(DateTime, nullable=False, default=utcnow)
     
     user = relationship("User", back_populates="transactions")
 
 class Portfolio(Base):
     __tablename__ = 'portfolio'
+    __table_args__ = (
+        Index('ix_portfolio_user_id', 'user_id'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('user.id'), nullable=False)
@@ -50,11 +109,19 @@ class Portfolio(Base):
 
 class PortfolioStock(Base):
     __tablename__ = 'portfolio_stock'
+    __table_args__ = (
+        Index('ix_portfolio_stock_portfolio_id_stock_id', 'portfolio_id', 'stock_id', unique=True),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     portfolio_id = Column(Integer, ForeignKey('portfolio.id'), nullable=False)
     stock_id = Column(Integer, ForeignKey('stock.id'), nullable=False)
     quantity = Column(Integer)
+    # Costo total de las acciones en posición; el precio promedio es cost_basis / quantity
+    cost_basis = Column(Money, default=0)
+    realized_pnl = Column(Money, default=0)
+    # Acciones apartadas por ventas pendientes (ver src/execution.py)
+    reserved_quantity = Column(Integer, default=0)
     
     portfolio = relationship("Portfolio", back_populates="portfolio_stocks")
     stock = relationship("Stock", back_populates="portfolio_stocks")
@@ -68,17 +135,40 @@ class Broker(Base):
     buy_orders = relationship("BuyOrder", back_populates="broker")
     sell_orders = relationship("SellOrder", back_populates="broker")
 
+class OrderState:
+    """Ciclo de vida de una orden (ver src/execution.py):
+    a mercado: pending -> routed -> filled | rejected
+    límite:    pending -> open -> filled | cancelling -> cancelled
+    y cualquier orden pending -> cancelled"""
+    PENDING = "pending"
+    ROUTED = "routed"
+    OPEN = "open"
+    FILLED = "filled"
+    REJECTED = "rejected"
+    CANCELLING = "cancelling"
+    CANCELLED = "cancelled"
+
 class BuyOrder(Base):
     __tablename__ = 'buy_order'
+    __table_args__ = (
+        Index('ix_buy_order_portfolio_id_timestamp', 'portfolio_id', 'timestamp'),
+        # El motor de ejecución busca las pendientes por estado
+        Index('ix_buy_order_state_id', 'state', 'id'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     portfolio_id = Column(Integer, ForeignKey('portfolio.id'), nullable=False)
     broker_id = Column(Integer, ForeignKey('broker.id'), nullable=True)
     stock_id = Column(Integer, ForeignKey('stock.id'), nullable=False)
-    amount = Column(Float, nullable=False)
+    amount = Column(Money, nullable=False)
     stock_quantity = Column(Integer, nullable=False)
+    # Solo órdenes límite; se ejecutan en el libro de src/order_book.py
+    limit_price = Column(Money, nullable=True)
+    filled_quantity = Column(Integer, default=0)
     state = Column(String)
-    timestamp = Column(DateTime)
+    timestamp = Column(DateTime, nullable=False, default=utcnow)
+    # Cuándo el motor la marcó `routed`; vence tras EXECUTION_LEASE segundos
+    claimed_at = Column(DateTime, nullable=True)
     
     portfolio = relationship("Portfolio", back_populates="buy_orders")
     broker = relationship("Broker", back_populates="buy_orders")
@@ -86,16 +176,35 @@ class BuyOrder(Base):
 
 class SellOrder(Base):
     __tablename__ = 'sell_order'
+    __table_args__ = (
+        Index('ix_sell_order_portfolio_id_timestamp', 'portfolio_id', 'timestamp'),
+        # El motor de ejecución busca las pendientes por estado
+        Index('ix_sell_order_state_id', 'state', 'id'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     portfolio_id = Column(Integer, ForeignKey('portfolio.id'), nullable=False)
     broker_id = Column(Integer, ForeignKey('broker.id'), nullable=True)
     stock_id = Column(Integer, ForeignKey('stock.id'), nullable=False)
-    amount = Column(Float, nullable=False)
+    amount = Column(Money, nullable=False)
     stock_quantity = Column(Integer, nullable=False)
+    # Solo órdenes límite; se ejecutan en el libro de src/order_book.py
+    limit_price = Column(Money, nullable=True)
+    filled_quantity = Column(Integer, default=0)
     state = Column(String)
-    timestamp = Column(DateTime)
+    timestamp = Column(DateTime, nullable=False, default=utcnow)
+    # Cuándo el motor la marcó `routed`; vence tras EXECUTION_LEASE segundos
+    claimed_at = Column(DateTime, nullable=True)
     
     portfolio = relationship("Portfolio", back_populates="sell_orders")
     broker = relationship("Broker", back_populates="sell_orders")
-    stock = relationship("Stock", back_populates="sell_orders")
\ No newline at end of file
+    stock = relationship("Stock", back_populates="sell_orders")
+
+class EngineLease(Base):
+    """Qué proceso corre un componente que no se puede repetir entre workers,
+    como el libro de órdenes límite de src/execution.py"""
+    __tablename__ = 'engine_lease'
+    
+    name = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
\ No newline at end of file
@@ -0,0 +1,52 @@
+"""Dinero como enteros en unidades menores (centavos).
+
+Saldos, montos y precios se guardan como BigInteger y toda la aritmética es
+entera: sumas y restas exactas y monto = precio × cantidad sin error de
+redondeo, en Python y en los UPDATE de src/ledger.py. Los cálculos masivos
+(valorización, P&L, velas) trabajan sobre arrays int64.
+
+La conversión ocurre solo en el borde de la API: to_minor al recibir un monto y
+to_major al responder. La API sigue usando números decimales en JSON.
+"""
+from decimal import ROUND_HALF_EVEN, Decimal
+
+import numpy as np
+from sqlalchemy import BigInteger
+
+# Unidades menores por unidad; cambiarlo requiere migrar los datos guardados
+MINOR_UNITS = 100
+
+# Tipo de columna para montos y precios
+Money = BigInteger
+
+
+def to_minor(value) -> int:
+    """Monto en unidades (int, float o Decimal) -> unidades menores, redondeando
+    al par. Para floats basta con round(): el error de value * MINOR_UNITS es
+    mucho menor que medio centavo en cualquier monto representable."""
+    if isinstance(value, int):
+        return value * MINOR_UNITS
+    if isinstance(value, Decimal):
+        return int((value * MINOR_UNITS).to_integral_value(ROUND_HALF_EVEN))
+    return round(value * MINOR_UNITS)
+
+
+def to_major(units: int | None) -> float | None:
+    """Unidades menores -> unidades para la respuesta JSON; el float resultante
+    se serializa con sus decimales exactos (12.34, no 12.3399999)"""
+    return None if units is None else units / MINOR_UNITS
+
+
+def amount_for(price: int, quantity) -> int:
+    """Monto de `quantity` acciones a `price`; exacto con cantidades enteras"""
+    amount = price * quantity
+    return amount if isinstance(amount, int) else round(amount)
+
+
+def unit_price(amount: int, quantity) -> float:
+    """Precio promedio en unidades (p. ej. costo de la posición / cantidad)"""
+    return amount / quantity / MINOR_UNITS if quantity else 0.0
+
+
+def to_major_array(units) -> np.ndarray:
+    return np.asarray(units, dtype=np.int64) / MINOR_UNITS
\ No newline at end of file
@@ -0,0 +1,229 @@
+"""Libro de órdenes límite en memoria, uno por acción, con prioridad precio-tiempo.
+
+Cada lado guarda un dict precio -> nivel (OrderedDict en orden de llegada) y un
+heap con los precios. Insertar es O(log n) por el heap; cancelar es O(1): la
+orden sale de su nivel y, si el nivel queda vacío, su precio se descarta del heap
+recién cuando llega al tope. Una orden que cruza el spread se ejecuta contra las
+órdenes en reposo al precio de estas. Los precios son enteros en unidades menores
+(src/money.py): cada nivel es una clave exacta del dict.
+"""
+import heapq
+from collections import OrderedDict
+from typing import NamedTuple
+
+BUY = "buy"
+SELL = "sell"
+
+
+class Fill(NamedTuple):
+    buy_id: int
+    sell_id: int
+    price: int
+    quantity: float
+
+
+class BookOrder:
+    __slots__ = ("id", "portfolio_id", "price", "quantity", "side")
+
+    def __init__(self, id: int, side: str, price: int, quantity: float, portfolio_id: int | None = None):
+        self.id = id
+        self.side = side
+        self.price = price
+        self.quantity = quantity
+        self.portfolio_id = portfolio_id
+
+
+class OrderBook:
+    def __init__(self):
+        self._bids: dict = {}
+        self._asks: dict = {}
+        # Heaps de precios: las compras se guardan negadas para tener un max-heap
+        self._bid_prices: list = []
+        self._ask_prices: list = []
+        # Precios presentes en cada heap, para no repetirlos si un nivel se vacía
+        # y vuelve a crearse antes de salir del heap
+        self._bid_heaped: set = set()
+        self._ask_heaped: set = set()
+        # (side, id) -> BookOrder; compras y ventas vienen de tablas distintas
+        self._orders: dict = {}
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def __contains__(self, key) -> bool:
+        return key in self._orders
+
+    def submit(self, side: str, order_id: int, price: int, quantity: float, portfolio_id: int | None = None) -> list:
+        """Cruza la orden contra el lado opuesto y deja el resto en el libro;
+        devuelve los fills en orden de ejecución"""
+        fills = []
+        if side == BUY:
+            levels, prices, heaped = self._asks, self._ask_prices, self._ask_heaped
+            while quantity > 0 and prices:
+                best = prices[0]
+                level = levels.get(best)
+                if level is None:
+                    heaped.discard(heapq.heappop(prices))
+                    continue
+                if best > price:
+                    break
+                quantity = self._take(level, BUY, order_id, quantity, fills)
+                if not level:
+                    del levels[best]
+                    heaped.discard(heapq.heappop(prices))
+        else:
+            levels, prices, heaped = self._bids, self._bid_prices, self._bid_heaped
+            while quantity > 0 and prices:
+                best = -prices[0]
+                level = levels.get(best)
+                if level is None:
+                    heaped.discard(-heapq.heappop(prices))
+                    continue
+                if best < price:
+                    break
+                quantity = self._take(level, SELL, order_id, quantity, fills)
+                if not level:
+                    del levels[best]
+                    heaped.discard(-heapq.heappop(prices))
+        if quantity > 0:
+            self._rest(BookOrder(order_id, side, price, quantity, portfolio_id))
+        return fills
+
+    def _take(self, level: OrderedDict, side: str, order_id: int, quantity: float, fills: list) -> float:
+        orders = self._orders
+        while quantity > 0 and level:
+            resting = next(iter(level.values()))
+            traded = min(quantity, resting.quantity)
+            if side == BUY:
+                fills.append(Fill(order_id, resting.id, resting.price, traded))
+            else:
+                fills.append(Fill(resting.id, order_id, resting.price, traded))
+            resting.quantity -= traded
+            quantity -= traded
+            if not resting.quantity:
+                level.popitem(last=False)
+                del orders[(resting.side, resting.id)]
+        return quantity
+
+    def _rest(self, order: BookOrder):
+        if order.side == BUY:
+            levels, prices, heaped, key = self._bids, self._bid_prices, self._bid_heaped, -order.price
+        else:
+            levels, prices, heaped, key = self._asks, self._ask_prices, self._ask_heaped, order.price
+        level = levels.get(order.price)
+        if level is None:
+            level = levels[order.price] = OrderedDict()
+            if order.price not in heaped:
+                heaped.add(order.price)
+                heapq.heappush(prices, key)
+        level[order.id] = order
+        self._orders[(order.side, order.id)] = order
+
+    def cancel(self, side: str, order_id: int) -> BookOrder | None:
+        """Saca la orden del libro; None si ya no estaba (ejecutada o cancelada)"""
+        order = self._orders.pop((side, order_id), None)
+        if order is None:
+            return None
+        levels = self._bids if side == BUY else self._asks
+        level = levels[order.price]
+        del level[order_id]
+        if not level:
+            del levels[order.price]
+        return order
+
+    def best_bid(self) -> int | None:
+        return self._best(self._bids, self._bid_prices, self._bid_heaped, -1)
+
+    def best_ask(self) -> int | None:
+        return self._best(self._asks, self._ask_prices, self._ask_heaped, 1)
+
+    @staticmethod
+    def _best(levels: dict, prices: list, heaped: set, sign: int) -> int | None:
+        while prices and sign * prices[0] not in levels:
+            heaped.discard(sign * heapq.heappop(prices))
+        return sign * prices[0] if prices else None
+
+    def depth(self, limit: int = 10) -> dict:
+        """Cantidad total por nivel de precio, los `limit` mejores de cada lado"""
+        def side(levels: dict, reverse: bool) -> list:
+            return [
+                {"price": price, "quantity": sum(order.quantity for order in levels[price].values())}
+                for price in sorted(levels, reverse=reverse)[:limit]
+            ]
+        return {"bids": side(self._bids, True), "asks": side(self._asks, False)}
+
+
+class MatchingEngine:
+    """Un OrderBook por acción (stock_id)"""
+    def __init__(self):
+        self.books: dict = {}
+
+    def book(self, stock_id: int) -> OrderBook:
+        book = self.books.get(stock_id)
+        if book is None:
+            book = self.books[stock_id] = OrderBook()
+        return book
+
+    def submit(self, stock_id: int, side: str, order_id: int, price: int, quantity: float,
+               portfolio_id: int | None = None) -> list:
+        return self.book(stock_id).submit(side, order_id, price, quantity, portfolio_id)
+
+    def cancel(self, stock_id: int, side: str, order_id: int) -> BookOrder | None:
+        book = self.books.get(stock_id)
+        return book.cancel(side, order_id) if book is not None else None
+
+    def find(self, stock_id: int, side: str, order_id: int) -> BookOrder | None:
+        book = self.books.get(stock_id)
+        return book._orders.get((side, order_id)) if book is not None else None
+
+
+def benchmark(events: int = 1_000_000, stocks: int = 10, seed: int = 1) -> dict:
+    """Flujo sintético: ~70% órdenes nuevas alrededor de un precio medio y ~30%
+    cancelaciones de órdenes en reposo"""
+    import random
+    import time
+
+    rng = random.Random(seed)
+    # Se genera antes de medir, para cronometrar solo el motor
+    script = []
+    resting = []
+    next_id = 1
+    for _ in range(events):
+        if resting and rng.random() < 0.3:
+            index = rng.randrange(len(resting))
+            resting[index], resting[-1] = resting[-1], resting[index]
+            script.append((False,) + resting.pop())
+        else:
+            side = BUY if rng.random() < 0.5 else SELL
+            offset = rng.randint(0, 20)
+            price = 10_000 - offset if side == BUY else 10_000 + offset - 10
+            stock_id = rng.randrange(stocks)
+            script.append((True, stock_id, side, next_id, price, rng.randint(1, 100)))
+            resting.append((stock_id, side, next_id))
+            next_id += 1
+
+    engine = MatchingEngine()
+    submit, cancel = engine.submit, engine.cancel
+    fills = 0
+    started = time.perf_counter()
+    for event in script:
+        if event[0]:
+            fills += len(submit(event[1], event[2], event[3], event[4], event[5]))
+        else:
+            cancel(event[1], event[2], event[3])
+    elapsed = time.perf_counter() - started
+    return {
+        "events": events,
+        "fills": fills,
+        "resting": sum(len(book) for book in engine.books.values()),
+        "seconds": round(elapsed, 3),
+        "events_per_second": round(events / elapsed),
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    result = benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
+    print(f"✅ {result['events']} eventos en {result['seconds']}s ({result['events_per_second']} eventos/s)")
+    print(result)
\ No newline at end of file
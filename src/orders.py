@@ -0,0 +1,145 @@
+"""Consultas, sentencias y respuestas de las órdenes de /v1/stock, compartidas
+por el router sync (src/router/stock.py) y el async (src/router/aio/stock.py):
+cada router solo las ejecuta con su sesión. Los errores HTTP de validación
+están en src/router/stock.py."""
+from sqlalchemy import bindparam, select
+
+from src.ledger import (
+    available_quantity,
+    credit_balance,
+    position_params,
+    release_position,
+    reserve_position,
+)
+from src.models import Broker, OrderState, Portfolio, PortfolioStock, Stock
+from src.money import to_major
+
+
+def owned_portfolio_query(user_id: int, portfolio_id: int):
+    return select(Portfolio).where(
+        Portfolio.id == portfolio_id,
+        Portfolio.user_id == user_id
+    )
+
+
+def owned_portfolio_ids_query(user_id: int, portfolio_ids: set):
+    return select(Portfolio.id).where(
+        Portfolio.id.in_(portfolio_ids),
+        Portfolio.user_id == user_id
+    )
+
+
+def stocks_query(stock_ids: set):
+    return select(Stock).where(Stock.id.in_(stock_ids))
+
+
+def broker_ids_query(broker_ids: set):
+    return select(Broker.id).where(Broker.id.in_(broker_ids))
+
+
+def user_order_query(model, order_id: int, user_id: int):
+    """La orden, solo si es de un portfolio del usuario"""
+    return select(model).join(
+        Portfolio, Portfolio.id == model.portfolio_id
+    ).where(
+        model.id == order_id,
+        Portfolio.user_id == user_id
+    )
+
+
+def batch_targets(legs) -> tuple:
+    """Ids de portfolios, acciones y brokers que referencia un batch"""
+    return (
+        {leg.portfolio_id for leg in legs},
+        {leg.stock_id for leg in legs},
+        {leg.broker_id for leg in legs if leg.broker_id is not None}
+    )
+
+
+def reserve_order(order):
+    """Aparta las acciones de una venta, solo si hay suficientes; devuelve las
+    que quedan disponibles"""
+    return reserve_position(
+        order.portfolio_id, order.stock_id, order.stock_quantity
+    ).returning(available_quantity())
+
+
+def batch_reservations(dialect, sells: dict) -> list:
+    """(sentencia, parámetros) que apartan las acciones de las ventas de un batch
+    agrupadas por posición; reserved_positions() cuenta cuántas se apartaron"""
+    params = position_params(sells)
+    if dialect.supports_sane_multi_rowcount:
+        return [(reserve_position(
+            bindparam("b_portfolio_id"), bindparam("b_stock_id"), bindparam("b_quantity")
+        ), params)]
+    # asyncpg and psycopg2 batches don't report the rowcount of an
+    # executemany: reserve each position on its own
+    return [
+        (reserve_position(
+            row["b_portfolio_id"], row["b_stock_id"], row["b_quantity"]
+        ).returning(PortfolioStock.id), None)
+        for row in params
+    ]
+
+
+def reserved_positions(result) -> int:
+    return len(result.all()) if result.returns_rows else result.rowcount
+
+
+def release_reservation(side: str, user_id: int, order):
+    """Devuelve lo que reservó una orden cancelada: los fondos de una compra o
+    las acciones de una venta"""
+    if side == "buy":
+        return credit_balance(user_id, order.amount)
+    return release_position(order.portfolio_id, order.stock_id, order.stock_quantity)
+
+
+def buy_order_registered(order, new_balance: int) -> dict:
+    return {
+        "message": "Orden de compra registrada exitosamente",
+        "new_balance": to_major(new_balance),
+        "order_id": order.id,
+        "state": OrderState.PENDING
+    }
+
+
+def sell_order_registered(order, remaining_stocks) -> dict:
+    return {
+        "message": "Orden de venta registrada exitosamente",
+        "order_id": order.id,
+        "state": OrderState.PENDING,
+        "remaining_stocks": remaining_stocks
+    }
+
+
+def batch_registered(new_balance: int, buy_order_ids: list, sell_order_ids: list) -> dict:
+    return {
+        "message": "Órdenes registradas exitosamente",
+        "new_balance": to_major(new_balance),
+        "buy_order_ids": buy_order_ids,
+        "sell_order_ids": sell_order_ids
+    }
+
+
+def cancel_registered(order_id: int, state: str) -> dict:
+    return {
+        "message": "Cancelación registrada exitosamente",
+        "order_id": order_id,
+        "state": state
+    }
+
+
+def order_status(side: str, order) -> dict:
+    return {
+        "id": order.id,
+        "side": side,
+        "portfolio_id": order.portfolio_id,
+        "broker_id": order.broker_id,
+        "stock_id": order.stock_id,
+        "amount": to_major(order.amount),
+        "stock_quantity": order.stock_quantity,
+        "limit_price": to_major(order.limit_price),
+        "filled_quantity": order.filled_quantity or 0,
+        "state": order.state,
+        "timestamp": order.timestamp
+    }
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""bcrypt fuera del threadpool de requests: hash y verificación corren en un pool
+dedicado y acotado, y el login tiene un rate limiter por username e IP para que
+una ráfaga de logins no degrade los endpoints de trading."""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from src.config import (
+    LOGIN_MAX_ATTEMPTS_PER_IP,
+    LOGIN_MAX_ATTEMPTS_PER_USER,
+    LOGIN_WINDOW_SECONDS,
+    PASSWORD_QUEUE_SIZE,
+    PASSWORD_WORKERS,
+    pwd_context,
+)
+
+
+class PasswordPoolBusy(Exception):
+    """El pool de bcrypt y su cola están llenos"""
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """Pool de threads para bcrypt (libera el GIL) con cupo fijo: `workers` en
+    ejecución más `queue_size` esperando; lo que exceda se rechaza de inmediato"""
+    def __init__(self, workers: int, queue_size: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordPoolBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def verify(self, password: str, hashed: str) -> bool:
+        return self._submit(pwd_context.verify, password, hashed).result()
+
+    def hash(self, password: str) -> str:
+        return self._submit(pwd_context.hash, password).result()
+
+    async def averify(self, password: str, hashed: str) -> bool:
+        """Espera el resultado sin ocupar un thread del servidor"""
+        return await asyncio.wrap_future(self._submit(pwd_context.verify, password, hashed))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class SlidingWindowLimiter:
+    """Máximo de intentos por key dentro de una ventana deslizante"""
+    def __init__(self, window: float):
+        self.window = window
+        self._hits: dict = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: int):
+        """Registra un intento; lanza RateLimited si la key ya agotó su cupo"""
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.setdefault(key, deque())
+            while hits and hits[0] <= now - self.window:
+                hits.popleft()
+            if len(hits) >= limit:
+                raise RateLimited(hits[0] + self.window - now)
+            hits.append(now)
+            if len(self._hits) > 10_000:
+                self._purge(now)
+
+    def _purge(self, now: float):
+        for key in [k for k, hits in self._hits.items() if not hits or hits[-1] <= now - self.window]:
+            del self._hits[key]
+
+    def reset(self):
+        with self._lock:
+            self._hits.clear()
+
+
+password_hasher = PasswordHasher(PASSWORD_WORKERS, PASSWORD_QUEUE_SIZE)
+login_limiter = SlidingWindowLimiter(LOGIN_WINDOW_SECONDS)
+
+
+def check_login_rate(username: str, ip: str):
+    # Primero la IP: una IP que prueba muchos usernames no consume el cupo de ellos
+    login_limiter.hit(f"ip:{ip}", LOGIN_MAX_ATTEMPTS_PER_IP)
+    login_limiter.hit(f"user:{username}", LOGIN_MAX_ATTEMPTS_PER_USER)
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""Construcción de engines según el driver y telemetría del pool de conexiones"""
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from src.config import (
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+)
+from src.metrics import Counter, Histogram
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.checkout_wait = Histogram()
+        self.checkouts = Counter()
+        # Checkouts que encontraron el pool completo (size + overflow) y tuvieron que esperar
+        self.saturated = Counter()
+        self.timeouts = Counter()
+        self.pool = None
+
+    def snapshot(self) -> dict:
+        stats = {
+            "checkouts": self.checkouts.value,
+            "saturated": self.saturated.value,
+            "timeouts": self.timeouts.value,
+            "checkout_wait_seconds": self.checkout_wait.snapshot(),
+        }
+        if self.pool is not None:
+            stats.update(
+                size=self.pool.size(),
+                checked_in=self.pool.checkedin(),
+                checked_out=self.pool.checkedout(),
+                overflow=self.pool.overflow(),
+            )
+        return stats
+
+
+# Por engine: "sync", "async" y una entrada por réplica
+pool_metrics: dict = {}
+
+
+class _InstrumentedPool:
+    """Mide cuánto espera cada checkout; `recreate()` (engine.dispose) conserva las métricas"""
+    metrics_key = "sync"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = pool_metrics.setdefault(self.metrics_key, PoolMetrics())
+        self.metrics.pool = self
+
+    def connect(self):
+        metrics = self.metrics
+        if self.checkedout() >= self.size() + self._max_overflow:
+            metrics.saturated.inc()
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            metrics.timeouts.inc()
+            raise
+        finally:
+            metrics.checkout_wait.observe(time.perf_counter() - start)
+        metrics.checkouts.inc()
+        return connection
+
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    metrics_key = "sync"
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    metrics_key = "async"
+
+
+def engine_options(url: str, is_async: bool = False, name: str | None = None) -> dict:
+    """Argumentos de create_engine/create_async_engine según el driver de la URL;
+    `name` separa las métricas del pool de este engine"""
+    url = make_url(url)
+    options = {}
+    if url.get_backend_name() == "sqlite":
+        if url.get_driver_name() == "pysqlite":
+            # Los requests usan la conexión desde threads distintos al que la abrió
+            options["connect_args"] = {"check_same_thread": False}
+        if url.database in (None, "", ":memory:"):
+            # Cada conexión sería una base distinta: se deja el pool por defecto de SQLAlchemy
+            return options
+
+    poolclass = InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool
+    if name is not None:
+        poolclass = type(poolclass.__name__, (poolclass,), {"metrics_key": name})
+    options.update(
+        poolclass=poolclass,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    return options
\ No newline at end of file
@@ -0,0 +1,161 @@
+"""Snapshot de portfolios en streaming: una consulta por colección (posiciones,
+compras, ventas), cada una ordenada por portfolio y recorrida con yield_per, y
+una línea NDJSON por portfolio. Las órdenes se limitan a las `cap` más recientes
+por portfolio con ROW_NUMBER(), así la memoria no crece con el historial."""
+import json
+from datetime import datetime
+from itertools import groupby
+
+from sqlalchemy import func, select
+
+from src.models import BuyOrder, Portfolio, PortfolioStock, SellOrder
+from src.money import to_major, unit_price
+
+STREAM_CHUNK = 500
+
+
+def portfolios_query(user_id: int):
+    return select(Portfolio.id, Portfolio.portfolio).where(
+        Portfolio.user_id == user_id
+    ).order_by(Portfolio.id)
+
+
+def positions_query(user_id: int):
+    return select(
+        PortfolioStock.portfolio_id, PortfolioStock.stock_id,
+        PortfolioStock.quantity, PortfolioStock.cost_basis
+    ).join(
+        Portfolio, Portfolio.id == PortfolioStock.portfolio_id
+    ).where(
+        Portfolio.user_id == user_id,
+        PortfolioStock.quantity > 0
+    ).order_by(PortfolioStock.portfolio_id, PortfolioStock.stock_id)
+
+
+def recent_orders_query(model, user_id: int, cap: int):
+    """Las `cap` + 1 órdenes más recientes de cada portfolio; la fila extra indica
+    que hay más"""
+    rank = func.row_number().over(
+        partition_by=model.portfolio_id,
+        order_by=(model.timestamp.desc(), model.id.desc())
+    ).label("rank")
+    ranked = select(
+        model.id, model.portfolio_id, model.stock_id, model.amount,
+        model.stock_quantity, model.state, model.timestamp, rank
+    ).join(
+        Portfolio, Portfolio.id == model.portfolio_id
+    ).where(Portfolio.user_id == user_id).subquery()
+    return select(ranked).where(
+        ranked.c.rank <= cap + 1
+    ).order_by(ranked.c.portfolio_id, ranked.c.rank)
+
+
+def snapshot_queries(user_id: int, cap: int) -> tuple:
+    return (
+        positions_query(user_id),
+        recent_orders_query(BuyOrder, user_id, cap),
+        recent_orders_query(SellOrder, user_id, cap),
+    )
+
+
+def format_order(row) -> dict:
+    return {
+        "id": row.id,
+        "stock_id": row.stock_id,
+        "amount": to_major(row.amount),
+        "stock_quantity": row.stock_quantity,
+        "state": row.state,
+        "timestamp": row.timestamp,
+    }
+
+
+def format_portfolio(portfolio, positions: list, buys: list, sells: list, cap: int) -> dict:
+    return {
+        "id": portfolio.id,
+        "name": portfolio.portfolio,
+        "stocks": [
+            {"stock_id": p.stock_id, "quantity": p.quantity, "average_price": unit_price(p.cost_basis or 0, p.quantity)}
+            for p in positions
+        ],
+        "buy_orders": [format_order(row) for row in buys[:cap]],
+        "sell_orders": [format_order(row) for row in sells[:cap]],
+        "more_buy_orders": len(buys) > cap,
+        "more_sell_orders": len(sells) > cap,
+    }
+
+
+class GroupedRows:
+    """Recorre un resultado ordenado por portfolio_id entregando el grupo de cada
+    portfolio, sin leer más allá del grupo pedido"""
+    def __init__(self, rows):
+        self._groups = groupby(rows, key=lambda row: row.portfolio_id)
+        self._current = next(self._groups, None)
+
+    def take(self, portfolio_id: int) -> list:
+        while self._current is not None and self._current[0] < portfolio_id:
+            self._current = next(self._groups, None)
+        if self._current is None or self._current[0] != portfolio_id:
+            return []
+        group = list(self._current[1])
+        self._current = next(self._groups, None)
+        return group
+
+
+class AsyncGroupedRows:
+    """Equivalente de GroupedRows para resultados async (AsyncSession.stream)"""
+    def __init__(self, rows):
+        self._rows = rows.__aiter__()
+        self._pending = None
+        self._done = False
+
+    async def _next(self):
+        if self._pending is not None:
+            row, self._pending = self._pending, None
+            return row
+        if self._done:
+            return None
+        try:
+            return await self._rows.__anext__()
+        except StopAsyncIteration:
+            self._done = True
+            return None
+
+    async def take(self, portfolio_id: int) -> list:
+        group = []
+        while (row := await self._next()) is not None:
+            if row.portfolio_id < portfolio_id:
+                continue
+            if row.portfolio_id > portfolio_id:
+                self._pending = row
+                break
+            group.append(row)
+        return group
+
+
+def _line(data: dict) -> str:
+    return json.dumps(data, default=datetime.isoformat) + "\n"
+
+
+def snapshot_lines(db, user_id: int, cap: int):
+    portfolios = db.execute(portfolios_query(user_id)).all()
+    positions, buys, sells = (
+        GroupedRows(db.execute(query, execution_options={"yield_per": STREAM_CHUNK}))
+        for query in snapshot_queries(user_id, cap)
+    )
+    for portfolio in portfolios:
+        yield _line(format_portfolio(
+            portfolio, positions.take(portfolio.id), buys.take(portfolio.id), sells.take(portfolio.id), cap
+        ))
+
+
+async def async_snapshot_lines(db, user_id: int, cap: int):
+    portfolios = (await db.execute(portfolios_query(user_id))).all()
+    positions, buys, sells = [
+        AsyncGroupedRows(await db.stream(query, execution_options={"yield_per": STREAM_CHUNK}))
+        for query in snapshot_queries(user_id, cap)
+    ]
+    for portfolio in portfolios:
+        yield _line(format_portfolio(
+            portfolio, await positions.take(portfolio.id), await buys.take(portfolio.id),
+            await sells.take(portfolio.id), cap
+        ))
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""Vista de /v1/portfolio (portfolios con posiciones y órdenes), compartida por el
+router sync y el async: cada uno ejecuta portfolios_view_query con su sesión y
+arma la respuesta con format_portfolios."""
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from src.models import Portfolio
+from src.money import unit_price
+from src.portfolio_snapshot import format_order
+
+
+def portfolios_view_query(user_id: int):
+    """Portfolios del usuario con sus colecciones, una consulta por colección
+    (tres joinedload multiplican las filas); se cargan por adelantado porque
+    AsyncSession no permite lazy loading"""
+    return select(Portfolio).where(
+        Portfolio.user_id == user_id
+    ).options(
+        selectinload(Portfolio.portfolio_stocks),
+        selectinload(Portfolio.buy_orders),
+        selectinload(Portfolio.sell_orders)
+    )
+
+
+def format_portfolios(portfolios) -> list:
+    return [
+        {
+            "id": portfolio.id,
+            "name": portfolio.portfolio,
+            # Las posiciones cerradas quedan en el ledger con cantidad 0
+            "stocks": [
+                {
+                    "stock_id": stock.stock_id,
+                    "quantity": stock.quantity,
+                    "average_price": unit_price(stock.cost_basis or 0, stock.quantity)
+                }
+                for stock in portfolio.portfolio_stocks if stock.quantity
+            ],
+            "buy_orders": [format_order(order) for order in portfolio.buy_orders],
+            "sell_orders": [format_order(order) for order in portfolio.sell_orders]
+        }
+        for portfolio in portfolios
+    ]
\ No newline at end of file
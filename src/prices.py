@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import bindparam, case, func, insert, select, update
+
+from src.config import PRICE_ROLLUP_INTERVAL
+from src.models import Stock, StockPrice, StockPriceRollup
+from src.money import to_major_array
+
+
+def bucket_start(timestamp: datetime, interval: int = PRICE_ROLLUP_INTERVAL) -> datetime:
+    epoch = int((timestamp - datetime(1970, 1, 1)).total_seconds())
+    return datetime(1970, 1, 1) + timedelta(seconds=epoch - epoch % interval)
+
+
+class Candle:
+    """Precios (en unidades menores) de un símbolo dentro de un bucket entre dos
+    flushes, con el momento de cada extremo"""
+    __slots__ = ("close", "closed_at", "high", "high_at", "low", "low_at", "open", "opened_at")
+    
+    def __init__(self, price: int, timestamp: datetime):
+        self.open = self.high = self.low = self.close = price
+        self.opened_at = self.high_at = self.low_at = self.closed_at = timestamp
+    
+    def merge(self, other: "Candle"):
+        if other.opened_at < self.opened_at:
+            self.open, self.opened_at = other.open, other.opened_at
+        if other.high > self.high:
+            self.high, self.high_at = other.high, other.high_at
+        if other.low < self.low:
+            self.low, self.low_at = other.low, other.low_at
+        # Un tick atrasado no pisa el cierre de uno más reciente
+        if other.closed_at >= self.closed_at:
+            self.close, self.closed_at = other.close, other.closed_at
+    
+    def points(self) -> dict:
+        """timestamp -> precio de la apertura, el máximo, el mínimo y el cierre"""
+        return {
+            self.opened_at: self.open,
+            self.high_at: self.high,
+            self.low_at: self.low,
+            self.closed_at: self.close,
+        }
+
+
+def record_prices(conn, candles: dict):
+    """Agrega al historial las velas {(symbol, bucket): Candle} y las combina con
+    las del rollup; pensado para correr dentro del flush"""
+    symbol_ids = dict(conn.execute(
+        select(Stock.stock, Stock.id).where(Stock.stock.in_({symbol for symbol, _ in candles}))
+    ).all())
+    rows = [
+        {"stock_id": symbol_ids[symbol], "bucket": bucket, "candle": candle}
+        for (symbol, bucket), candle in candles.items()
+        if symbol in symbol_ids
+    ]
+    if not rows:
+        return
+    
+    # Apertura, máximo, mínimo y cierre con su hora: las velas armadas desde el
+    # historial conservan los extremos aunque el ingestor agrupe los ticks
+    conn.execute(insert(StockPrice), [
+        {"stock_id": r["stock_id"], "price": price, "timestamp": timestamp}
+        for r in rows
+        for timestamp, price in sorted(r["candle"].points().items())
+    ])
+    
+    existing = set(conn.execute(
+        select(StockPriceRollup.stock_id, StockPriceRollup.bucket).where(
+            StockPriceRollup.stock_id.in_({r["stock_id"] for r in rows}),
+            StockPriceRollup.bucket.in_({r["bucket"] for r in rows})
+        )
+    ).all())
+    to_update = [r for r in rows if (r["stock_id"], r["bucket"]) in existing]
+    to_insert = [r for r in rows if (r["stock_id"], r["bucket"]) not in existing]
+    
+    if to_update:
+        high, low = bindparam("high"), bindparam("low")
+        opened_at, closed_at = bindparam("opened_at"), bindparam("closed_at")
+        # Las filas previas a opened_at/closed_at cuentan desde el inicio del bucket
+        earlier = opened_at < func.coalesce(StockPriceRollup.opened_at, StockPriceRollup.bucket)
+        later = closed_at >= func.coalesce(StockPriceRollup.closed_at, StockPriceRollup.bucket)
+        conn.execute(
+            update(StockPriceRollup).where(
+                StockPriceRollup.stock_id == bindparam("b_stock_id"),
+                StockPriceRollup.bucket == bindparam("b_bucket")
+            ).values(
+                open=case((earlier, bindparam("open")), else_=StockPriceRollup.open),
+                opened_at=case((earlier, opened_at), else_=StockPriceRollup.opened_at),
+                high=case((StockPriceRollup.high < high, high), else_=StockPriceRollup.high),
+                low=case((StockPriceRollup.low > low, low), else_=StockPriceRollup.low),
+                close=case((later, bindparam("close")), else_=StockPriceRollup.close),
+                closed_at=case((later, closed_at), else_=StockPriceRollup.closed_at)
+            ),
+            [{"b_stock_id": r["stock_id"], "b_bucket": r["bucket"], **_candle_values(r["candle"])}
+             for r in to_update]
+        )
+    if to_insert:
+        conn.execute(insert(StockPriceRollup), [
+            {"stock_id": r["stock_id"], "bucket": r["bucket"], **_candle_values(r["candle"])}
+            for r in to_insert
+        ])
+
+
+def _candle_values(candle: Candle) -> dict:
+    return {
+        "open": candle.open, "opened_at": candle.opened_at, "high": candle.high,
+        "low": candle.low, "close": candle.close, "closed_at": candle.closed_at
+    }
+
+
+def candles_query(stock_id: int, interval: int, start: datetime | None, end: datetime | None):
+    """Usa el rollup cuando el intervalo es múltiplo de él; si no, el historial"""
+    if interval % PRICE_ROLLUP_INTERVAL == 0:
+        table, column = StockPriceRollup, StockPriceRollup.bucket
+        statement = select(
+            column, table.open, table.high, table.low, table.close
+        )
+    else:
+        table, column = StockPrice, StockPrice.timestamp
+        statement = select(
+            column, table.price, table.price, table.price, table.price
+        )
+    
+    statement = statement.where(table.stock_id == stock_id)
+    if start is not None:
+        statement = statement.where(column >= start)
+    if end is not None:
+        statement = statement.where(column < end)
+    return statement.order_by(column)
+
+
+def build_candles(rows, interval: int) -> list:
+    """Agrupa filas (timestamp, open, high, low, close) ordenadas por tiempo en
+    velas de `interval` segundos, en una sola pasada vectorizada sobre los precios
+    enteros (unidades menores); se convierten a unidades al final"""
+    if not rows:
+        return []
+    
+    timestamps, opens, highs, lows, closes = zip(*rows)
+    seconds = np.array(timestamps, dtype="datetime64[s]").astype(np.int64)
+    buckets = seconds // interval
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+    
+    bucket_times = (buckets[starts] * interval).astype("datetime64[s]").tolist()
+    opens = to_major_array(np.asarray(opens, dtype=np.int64)[starts])
+    highs = to_major_array(np.maximum.reduceat(np.asarray(highs, dtype=np.int64), starts))
+    lows = to_major_array(np.minimum.reduceat(np.asarray(lows, dtype=np.int64), starts))
+    closes = to_major_array(np.asarray(closes, dtype=np.int64)[ends])
+    
+    return [
+        {"timestamp": t, "open": o, "high": h, "low": lo, "close": c}
+        for t, o, h, lo, c in zip(bucket_times, opens.tolist(), highs.tolist(),
+                                  lows.tolist(), closes.tolist())
+    ]
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""Detector de N+1 y presupuesto de consultas por request (modo desarrollo/test).
+
+Cada sentencia SQL se normaliza a una huella (sin literales ni largo de listas IN),
+así las consultas que solo cambian de parámetros cuentan como repetidas. El
+control de transacciones (BEGIN, COMMIT, SAVEPOINT, PRAGMA...) no cuenta: el modo
+rendimiento de SQLite emite un BEGIN explícito en cada conexión. Una ruta
+declara su presupuesto con `dependencies=[query_budget(n)]` (src.instrumentation); las que no
+lo declaran usan QUERY_BUDGET_DEFAULT. Con QUERY_GUARD=log se avisa en el log; con
+QUERY_GUARD=raise el request responde 500 con el detalle.
+"""
+import logging
+import re
+from collections import Counter
+
+from src.config import QUERY_BUDGET_DEFAULT, QUERY_GUARD, QUERY_REPEAT_THRESHOLD
+
+logger = logging.getLogger("query_guard")
+
+enabled = QUERY_GUARD in ("log", "raise")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r"\(\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|\$\d+|:\w+))*\s*\)")
+_SPACES = re.compile(r"\s+")
+_CONTROL = re.compile(r"\s*(BEGIN|COMMIT|END|ROLLBACK|SAVEPOINT|RELEASE|PRAGMA)\b", re.IGNORECASE)
+
+
+def is_control(statement: str) -> bool:
+    return _CONTROL.match(statement) is not None
+
+
+def fingerprint(statement: str) -> str:
+    statement = _STRING.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _PLACEHOLDERS.sub("(?+)", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+
+def violations(stats) -> dict | None:
+    budget = stats.query_budget if stats.query_budget is not None else QUERY_BUDGET_DEFAULT
+    repeated = {
+        statement: count for statement, count in stats.fingerprints.items()
+        if count >= QUERY_REPEAT_THRESHOLD
+    }
+    if stats.sql_queries <= budget and not repeated:
+        return None
+    return {"queries": stats.sql_queries, "budget": budget, "repeated": repeated}
+
+
+def report(method: str, path: str, found: dict):
+    logger.warning(
+        "🚨 %s %s: %d consultas (presupuesto %d)%s", method, path, found["queries"], found["budget"],
+        "".join(f"\n  x{count} {statement}" for statement, count in found["repeated"].items())
+    )
+
+
+def new_fingerprints() -> Counter | None:
+    return Counter() if enabled else None
\ No newline at end of file
@@ -1,11 +1,22 @@
 from fastapi import APIRouter
+
+from src.config import ASYNC_DB_URL
+
 from .auth import auth_router
-from .user import user_router
-from .transaction import transaction_router
-from .stock import stock_router
 from .broker import broker_router
-from .portfolio import portfolio_router
-from .history import history_router
+from .price import price_router
+from .stream import stream_router
+from .system import metrics_router, system_router
+from .user import user_router
+
+if ASYNC_DB_URL:
+    # Modo async: estos handlers usan AsyncSession en vez del threadpool
+    from .aio import history_router, portfolio_router, stock_router, transaction_router
+else:
+    from .history import history_router
+    from .portfolio import portfolio_router
+    from .stock import stock_router
+    from .transaction import transaction_router
 
 router = APIRouter()
 
@@ -15,4 +26,8 @@ router.include_router(transaction_router)
 router.include_router(stock_router)
 router.include_router(broker_router)
 router.include_router(portfolio_router)
-router.include_router(history_router)
\ No newline at end of file
+router.include_router(history_router)
+router.include_router(price_router)
+router.include_router(system_router)
+router.include_router(metrics_router)
+router.include_router(stream_router)
\ No newline at end of file
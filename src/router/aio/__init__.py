@@ -0,0 +1,6 @@
+from .history import history_router
+from .portfolio import portfolio_router
+from .stock import stock_router
+from .transaction import transaction_router
+
+__all__ = ["history_router", "portfolio_router", "stock_router", "transaction_router"]
\ No newline at end of file
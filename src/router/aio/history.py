@@ -0,0 +1,69 @@
+
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.cache import cached_json_response, serialize_model, user_cache
+from src.database import async_read_session_factory, get_async_read_db
+from src.history_export import async_export_chunks
+from src.history_feed import feed_query, format_feed
+from src.history_view import format_history, history_queries
+from src.instrumentation import query_budget
+
+from ..auth import current_user_id
+from ..history import (
+    HISTORY_DEFAULT_LIMIT,
+    ExportFormat,
+    HistoryFeedResponse,
+    HistoryResponse,
+    export_encoder,
+    export_response,
+    history_adapter,
+    parse_cursor,
+)
+
+history_router = APIRouter(prefix="/v1/history", tags=["Historail"])
+
+async def stream_export(factory, user_id: int, encoder):
+    async with factory() as db:
+        async for chunk in async_export_chunks(db, user_id, encoder):
+            yield chunk
+
+@history_router.get("/export", dependencies=[query_budget(3)])
+async def export_user_history(
+    request: Request,
+    user_id: int = Depends(current_user_id),
+    format: ExportFormat = "csv"
+):
+    encoder = export_encoder(format)
+    
+    return export_response(stream_export(async_read_session_factory(request), user_id, encoder), encoder)
+
+@history_router.get("/feed", response_model=HistoryFeedResponse, dependencies=[query_budget(1)])
+async def user_history_feed(
+    user_id: int = Depends(current_user_id),
+    db: AsyncSession = Depends(get_async_read_db),
+    cursor: str | None = None,  # next_cursor de la página anterior
+    limit: int = Query(20, gt=0, le=200)
+):
+    rows = (await db.execute(feed_query(user_id, parse_cursor(cursor), limit + 1))).all()
+    
+    return format_feed(rows, limit)
+
+async def history_view(db: AsyncSession, user_id: int, limit: int) -> dict:
+    return format_history(*[(await db.scalars(query)).all() for query in history_queries(user_id, limit)], limit)
+
+@history_router.get("", response_model=HistoryResponse, dependencies=[query_budget(3)])
+async def user_history(
+    request: Request,
+    user_id: int = Depends(current_user_id),
+    db: AsyncSession = Depends(get_async_read_db),
+    limit: int = HISTORY_DEFAULT_LIMIT  # Parámetro opcional para limitar resultados
+):
+    if limit != HISTORY_DEFAULT_LIMIT:
+        return await history_view(db, user_id, limit)
+    # Solo se cachea la página por defecto; las escrituras la invalidan en todos los workers
+    key = f"history:{user_id}"
+    entry = await user_cache.aget(key)
+    if entry is None:
+        entry = await user_cache.aset(key, serialize_model(history_adapter, await history_view(db, user_id, limit)))
+    return cached_json_response(request, entry)
\ No newline at end of file
@@ -0,0 +1,97 @@
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.cache import (
+    ainvalidate_users,
+    cached_json_response,
+    serialize_model,
+    user_cache,
+)
+from src.database import (
+    async_read_session_factory,
+    get_async_read_db,
+    get_async_write_db,
+)
+from src.instrumentation import query_budget
+from src.orders import owned_portfolio_query
+from src.portfolio_snapshot import async_snapshot_lines
+from src.portfolio_view import format_portfolios, portfolios_view_query
+from src.valuation import valuation_query, value_positions
+
+from ..auth import current_user_id
+from ..portfolio import (
+    PortfolioResponse,
+    UpdatePortfolioNameRequest,
+    ValuationResponse,
+    portfolio_not_found,
+    portfolios_adapter,
+)
+
+portfolio_router = APIRouter(prefix="/v1/portfolio", tags=["Portfolio"])
+
+@portfolio_router.get("", response_model=list[PortfolioResponse], dependencies=[query_budget(4)])
+async def get_user_portfolios(
+    request: Request,
+    user_id: int = Depends(current_user_id),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    # Vista cacheada por usuario; las escrituras la invalidan en todos los workers
+    key = f"portfolio:{user_id}"
+    entry = await user_cache.aget(key)
+    if entry is None:
+        portfolios = (await db.scalars(portfolios_view_query(user_id))).all()
+        entry = await user_cache.aset(key, serialize_model(portfolios_adapter, format_portfolios(portfolios)))
+    return cached_json_response(request, entry)
+
+async def stream_snapshot(factory, user_id: int, orders_limit: int):
+    async with factory() as db:
+        async for line in async_snapshot_lines(db, user_id, orders_limit):
+            yield line
+
+@portfolio_router.get("/snapshot", dependencies=[query_budget(4)])
+async def get_portfolio_snapshot(
+    request: Request,
+    user_id: int = Depends(current_user_id),
+    orders_limit: int = Query(50, gt=0, le=500)
+):
+    return StreamingResponse(
+        stream_snapshot(async_read_session_factory(request), user_id, orders_limit),
+        media_type="application/x-ndjson"
+    )
+
+@portfolio_router.get("/valuation", response_model=ValuationResponse, dependencies=[query_budget(1)])
+async def get_portfolio_valuation(
+    user_id: int = Depends(current_user_id),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    rows = (await db.execute(valuation_query(user_id))).all()
+    
+    return value_positions(rows)
+
+@portfolio_router.patch("/update-name")
+async def update_portfolio_name(
+    update_data: UpdatePortfolioNameRequest,
+    user_id: int = Depends(current_user_id),
+    db: AsyncSession = Depends(get_async_write_db)
+):
+    # Verificar que el portfolio pertenece al usuario
+    portfolio = await db.scalar(owned_portfolio_query(user_id, update_data.portfolio_id))
+    if not portfolio:
+        raise portfolio_not_found()
+    
+    try:
+        # Actualizar el nombre
+        portfolio.portfolio = update_data.new_name
+        await db.commit()
+        await ainvalidate_users(user_id)
+        
+        return {"message": "Nombre del portfolio actualizado correctamente"}
+    
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al actualizar el nombre: {e!s}"
+        ) from e
\ No newline at end of file
@@ -0,0 +1,271 @@
+from datetime import datetime
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.cache import ainvalidate_users, cached_json_response, catalogue_cache
+from src.database import get_async_read_db, get_async_write_db
+from src.execution import MODELS, cancel_pending, execution_engine, request_cancel
+from src.instrumentation import query_budget
+from src.ledger import debit_balance, order_row, plan_batch
+from src.models import Broker, BuyOrder, OrderState, SellOrder, Stock, utcnow
+from src.orders import (
+    batch_registered,
+    batch_reservations,
+    batch_targets,
+    broker_ids_query,
+    buy_order_registered,
+    cancel_registered,
+    order_status,
+    owned_portfolio_ids_query,
+    owned_portfolio_query,
+    release_reservation,
+    reserve_order,
+    reserved_positions,
+    sell_order_registered,
+    stocks_query,
+    user_order_query,
+)
+from src.prices import build_candles, candles_query
+
+from ..auth import current_user_id
+from ..stock import (
+    BatchOrderRequest,
+    CandleResponse,
+    OrderStatusResponse,
+    RegisterOrderRequest,
+    check_batch_targets,
+    check_order_targets,
+    insufficient_funds,
+    insufficient_stocks,
+    not_found,
+    serialize_stocks,
+)
+
+stock_router = APIRouter(prefix="/v1/stock", tags=["Stocks"])
+
+@stock_router.get("", dependencies=[query_budget(1)])
+async def get_stocks(
+    request: Request,
+    user_id: int = Depends(current_user_id),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    entry = await catalogue_cache.aget("stocks")
+    if entry is None:
+        stocks = (await db.scalars(select(Stock))).all()
+        entry = await catalogue_cache.aset("stocks", serialize_stocks(stocks))
+    
+    return cached_json_response(request, entry)
+
+@stock_router.get("/{stock_id}/candles", response_model=list[CandleResponse], dependencies=[query_budget(2)])
+async def get_stock_candles(
+    stock_id: int,
+    interval: int = Query(3600, gt=0),  # Segundos por vela
+    start: datetime | None = None,
+    end: datetime | None = None,
+    user_id: int = Depends(current_user_id),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    if not await db.get(Stock, stock_id):
+        raise not_found("Acción no encontrada")
+    
+    rows = (await db.execute(candles_query(stock_id, interval, start, end))).all()
+    
+    return build_candles(rows, interval)
+
+# Buy Order Endpoint
+@stock_router.post("/register-buy-order")
+async def register_buy_order(
+    order_data: RegisterOrderRequest,
+    user_id: int = Depends(current_user_id),
+    db: AsyncSession = Depends(get_async_write_db)
+):
+    stock = await db.get(Stock, order_data.stock_id)
+    check_order_targets(
+        await db.scalar(owned_portfolio_query(user_id, order_data.portfolio_id)),
+        stock,
+        order_data.broker_id is None or await db.get(Broker, order_data.broker_id) is not None
+    )
+    buy_order = BuyOrder(**order_row(order_data, stock, utcnow()))
+    
+    try:
+        # Reserve the funds, only if they are sufficient (atomic); the position
+        # is updated once the order is filled (src/execution.py)
+        new_balance = (await db.execute(debit_balance(user_id, buy_order.amount))).scalar()
+        if new_balance is None:
+            raise insufficient_funds()
+        
+        db.add(buy_order)
+        await db.commit()
+        execution_engine.notify()
+        await ainvalidate_users(user_id)
+        
+        return buy_order_registered(buy_order, new_balance)
+        
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al registrar orden de compra: {e!s}"
+        ) from e
+
+# Sell Order Endpoint
+@stock_router.post("/register-sell-order")
+async def register_sell_order(
+    order_data: RegisterOrderRequest,
+    user_id: int = Depends(current_user_id),
+    db: AsyncSession = Depends(get_async_write_db)
+):
+    stock = await db.get(Stock, order_data.stock_id)
+    check_order_targets(
+        await db.scalar(owned_portfolio_query(user_id, order_data.portfolio_id)),
+        stock,
+        order_data.broker_id is None or await db.get(Broker, order_data.broker_id) is not None
+    )
+    sell_order = SellOrder(**order_row(order_data, stock, utcnow()))
+    
+    try:
+        # Set aside the stocks, only if the portfolio holds enough (atomic);
+        # proceeds and realized P&L are booked once the order is filled
+        remaining_stocks = (await db.execute(reserve_order(order_data))).scalar()
+        if remaining_stocks is None:
+            raise insufficient_stocks()
+        
+        db.add(sell_order)
+        await db.commit()
+        execution_engine.notify()
+        await ainvalidate_users(user_id)
+        
+        return sell_order_registered(sell_order, remaining_stocks)
+        
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al registrar orden de venta: {e!s}"
+        ) from e
+
+# Batch Order Endpoint
+@stock_router.post("/orders/batch")
+async def register_batch_orders(
+    batch: BatchOrderRequest,
+    user_id: int = Depends(current_user_id),
+    db: AsyncSession = Depends(get_async_write_db)
+):
+    # Portfolios, stocks and brokers are validated with one query each
+    targets = portfolio_ids, stock_ids, broker_ids = batch_targets(batch.orders)
+    owned = set((await db.scalars(owned_portfolio_ids_query(user_id, portfolio_ids))).all())
+    stocks = {stock.id: stock for stock in (await db.scalars(stocks_query(stock_ids))).all()}
+    brokers = set((await db.scalars(broker_ids_query(broker_ids))).all()) if broker_ids else set()
+    check_batch_targets(targets, owned, stocks, brokers)
+    
+    buy_rows, sell_rows, sells = plan_batch(batch.orders, stocks, utcnow())
+    buy_amount = sum(row["amount"] for row in buy_rows)
+    
+    try:
+        conn = await db.connection()
+        
+        # Set aside the stocks of every sell; each position must hold enough
+        # or the whole batch is rejected
+        if sells:
+            reserved = 0
+            for statement, params in batch_reservations(conn.dialect, sells):
+                reserved += reserved_positions(await conn.execute(statement, params))
+            if reserved != len(sells):
+                raise insufficient_stocks()
+        
+        # Reserve the funds of every buy at once (atomic). Sell proceeds are
+        # credited when those orders fill, so they can't fund buys in the batch
+        new_balance = (await db.execute(debit_balance(user_id, buy_amount))).scalar()
+        if new_balance is None:
+            raise insufficient_funds()
+        
+        # Bulk insert orders
+        buy_order_ids = (await db.scalars(
+            insert(BuyOrder).returning(BuyOrder.id), buy_rows
+        )).all() if buy_rows else []
+        sell_order_ids = (await db.scalars(
+            insert(SellOrder).returning(SellOrder.id), sell_rows
+        )).all() if sell_rows else []
+        
+        await db.commit()
+        execution_engine.notify()
+        await ainvalidate_users(user_id)
+        
+        return batch_registered(new_balance, buy_order_ids, sell_order_ids)
+        
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al registrar órdenes: {e!s}"
+        ) from e
+
+# Order Status Endpoint (pending -> routed -> filled | rejected)
+@stock_router.get("/orders/{side}/{order_id}", response_model=OrderStatusResponse, dependencies=[query_budget(1)])
+async def get_order_status(
+    side: Literal["buy", "sell"],
+    order_id: int,
+    user_id: int = Depends(current_user_id),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    order = await db.scalar(user_order_query(MODELS[side], order_id, user_id))
+    if not order:
+        raise not_found("Orden no encontrada")
+    
+    return order_status(side, order)
+
+# Cancel Order Endpoint
+@stock_router.delete("/orders/{side}/{order_id}")
+async def cancel_order(
+    side: Literal["buy", "sell"],
+    order_id: int,
+    user_id: int = Depends(current_user_id),
+    db: AsyncSession = Depends(get_async_write_db)
+):
+    model = MODELS[side]
+    order = await db.scalar(user_order_query(model, order_id, user_id))
+    if not order:
+        raise not_found("Orden no encontrada")
+    
+    try:
+        # Pending orders haven't reached the broker or the book: cancel them
+        # here and release their reservation in the same transaction
+        if (await db.execute(cancel_pending(model, order_id))).scalar() is not None:
+            await db.execute(release_reservation(side, user_id, order))
+            state = OrderState.CANCELLED
+        # Resting limit orders are taken out of the book by the execution engine
+        elif (await db.execute(request_cancel(model, order_id))).scalar() is not None:
+            state = OrderState.CANCELLING
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="La orden ya no se puede cancelar"
+            )
+        
+        await db.commit()
+        execution_engine.notify()
+        await ainvalidate_users(user_id)
+        
+        return cancel_registered(order_id, state)
+        
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al cancelar orden: {e!s}"
+        ) from e
\ No newline at end of file
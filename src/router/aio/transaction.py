@@ -0,0 +1,86 @@
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.cache import ainvalidate_users
+from src.database import get_async_write_db
+from src.ledger import credit_balance, debit_balance
+
+from ..auth import current_user_id
+from ..transaction import (
+    AddFundsRequest,
+    RetireFundsRequest,
+    funds_amount,
+    funds_transaction,
+    funds_updated,
+)
+
+transaction_router = APIRouter(prefix="/v1/transaction", tags=["Transactions"])
+
+@transaction_router.post("/add-funds")
+async def add_funds(
+    funds_data: AddFundsRequest,
+    user_id: int = Depends(current_user_id),
+    db: AsyncSession = Depends(get_async_write_db)
+):
+    amount = funds_amount(funds_data)
+    
+    try:
+        # Update user balance (atomic)
+        new_balance = (await db.execute(credit_balance(user_id, amount))).scalar()
+        if new_balance is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Usuario no encontrado"
+            )
+        
+        # Create transaction record
+        db.add(funds_transaction(user_id, amount))
+        await db.commit()
+        await ainvalidate_users(user_id)
+        
+        return funds_updated("Fondos agregados exitosamente", new_balance)
+        
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al agregar fondos: {e!s}"
+        ) from e
+
+@transaction_router.post("/retire-funds")
+async def retire_funds(
+    funds_data: RetireFundsRequest,
+    user_id: int = Depends(current_user_id),
+    db: AsyncSession = Depends(get_async_write_db)
+):
+    amount = funds_amount(funds_data)
+    
+    try:
+        # Update user balance, only if funds are sufficient (atomic)
+        new_balance = (await db.execute(debit_balance(user_id, amount))).scalar()
+        if new_balance is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Fondos insuficientes"
+            )
+        
+        # Create transaction record (negative amount for withdrawal)
+        db.add(funds_transaction(user_id, -amount))
+        await db.commit()
+        await ainvalidate_users(user_id)
+        
+        return funds_updated("Fondos retirados exitosamente", new_balance)
+        
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al retirar fondos: {e!s}"
+        ) from e
\ No newline at end of file
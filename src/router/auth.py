@@ -1,13 +1,25 @@
-from pydantic import BaseModel
-from fastapi import APIRouter, Depends, HTTPException, status, Response
-
+import hashlib
+import hmac
+import math
 from datetime import datetime, timedelta
-from src.models import User
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from src.database import get_db
-from src.config import SECRET_KEY, COOKIE_NAME, TOKEN_EXPIRE_MINUTES, pwd_context
-import hmac
-import hashlib
+
+from src.cache import TTLCache
+from src.config import COOKIE_NAME, SECRET_KEY, TOKEN_CACHE_SIZE, TOKEN_EXPIRE_MINUTES
+from src.database import get_async_db, get_db
+from src.instrumentation import mark_threadpool_start
+from src.models import User, utcnow
+from src.passwords import (
+    PasswordPoolBusy,
+    RateLimited,
+    check_login_rate,
+    password_hasher,
+)
 
 auth_router = APIRouter(prefix="/v1/auth", tags=["Auth"])
 
@@ -15,26 +27,41 @@ class LoginData(BaseModel):
     username: str = 'john_doe'
     password: str = '123456'
 
-def verify_user(db: Session, username: str, password: str):
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not pwd_context.verify(password, user.hashed_password):
+async def verify_user(db: Session, username: str, password: str):
+    # La consulta usa un thread del servidor solo lo que tarda; bcrypt corre en su propio pool
+    user = await run_in_threadpool(lambda: db.query(User).filter(User.username == username).first())
+    if not user or not await password_hasher.averify(password, user.hashed_password):
         return None
     return user
 
+def password_pool_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Servicio de autenticación saturado, intente nuevamente",
+        headers={"Retry-After": "1"}
+    )
+
 def sign_token(data: str) -> str:
     return hmac.new(SECRET_KEY.encode(), data.encode(), hashlib.sha256).hexdigest()
 
 def create_auth_token(user_id: int) -> str:
     # Token simple: user_id:firma
-    token_data = f"{user_id}:{datetime.utcnow().timestamp()}"
+    token_data = f"{user_id}:{utcnow().timestamp()}"
     signature = sign_token(token_data)
     return f"{token_data}:{signature}"
 
+# Tokens ya verificados, por firma: (token, user_id); cada entrada expira junto con su token
+verified_tokens = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_EXPIRE_MINUTES * 60)
+
 def validate_auth_token(token: str) -> int:
     """Valida el token y devuelve el user_id si es válido"""
     if not token:
         return None
     
+    cached = verified_tokens.get(token.rpartition(':')[2])
+    if cached is not None and hmac.compare_digest(cached[0], token):
+        return cached[1]
+    
     try:
         # Dividir el token en sus partes
         parts = token.split(':')
@@ -51,23 +78,95 @@ def validate_auth_token(token: str) -> int:
         
         # 2. Verificar expiración (opcional)
         timestamp = float(parts[1])
-        if datetime.utcnow() > datetime.fromtimestamp(timestamp) + timedelta(minutes=TOKEN_EXPIRE_MINUTES):
+        expires_at = datetime.fromtimestamp(timestamp) + timedelta(minutes=TOKEN_EXPIRE_MINUTES)
+        remaining = (expires_at - utcnow()).total_seconds()
+        if remaining < 0:
             return None
         
         # 3. Devolver el user_id si todo es válido
-        return int(parts[0])
+        user_id = int(parts[0])
+        verified_tokens.set(received_signature, (token, user_id), ttl=remaining)
+        return user_id
     
     except (ValueError, IndexError):
         return None
 
+def current_user_id(request: Request) -> int:
+    """Dependencia sin estado: confía en el token firmado y no consulta la DB"""
+    mark_threadpool_start()
+    token = request.cookies.get(COOKIE_NAME)
+    user_id = validate_auth_token(token)
+    
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="No autenticado"
+        )
+    
+    return user_id
+
+class CurrentUser:
+    """Usuario autenticado; la fila User se carga solo cuando el handler la necesita
+    y como máximo una vez por request"""
+    def __init__(self, user_id: int, db):
+        self.id = user_id
+        self._db = db
+        self._user = None
+    
+    def _check(self, user):
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Usuario no encontrado"
+            )
+        self._user = user
+        return user
+    
+    @property
+    def user(self) -> User:
+        if self._user is None:
+            return self._check(self._db.get(User, self.id))
+        return self._user
+    
+    async def load(self) -> User:
+        """Equivalente a `user` para sesiones async"""
+        if self._user is None:
+            return self._check(await self._db.get(User, self.id))
+        return self._user
+
+def current_user(
+    user_id: int = Depends(current_user_id),
+    db: Session = Depends(get_db)
+) -> CurrentUser:
+    return CurrentUser(user_id, db)
+
+def async_current_user(
+    user_id: int = Depends(current_user_id),
+    db: AsyncSession = Depends(get_async_db)
+) -> CurrentUser:
+    return CurrentUser(user_id, db)
+
 # Endpoints
 @auth_router.post("/login")
-def login(
+async def login(
+    request: Request,
     response: Response,
     login_data: LoginData,
     db: Session = Depends(get_db)
 ):
-    user = verify_user(db, login_data.username, login_data.password)
+    client_ip = request.client.host if request.client else "unknown"
+    try:
+        check_login_rate(login_data.username, client_ip)
+        user = await verify_user(db, login_data.username, login_data.password)
+    except RateLimited as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Demasiados intentos de login",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    except PasswordPoolBusy:
+        raise password_pool_busy()
+    
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -87,6 +186,10 @@ def login(
     
     return {"message": "Login exitoso"}
 
+@auth_router.get("/token-cache-stats")
+def token_cache_stats(user_id: int = Depends(current_user_id)):
+    return verified_tokens.stats
+
 @auth_router.post("/logout")
 def logout(response: Response):
     response.delete_cookie(COOKIE_NAME)
@@ -1,34 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from src.database import get_db
-from .auth import validate_auth_token
+from fastapi import APIRouter, Depends, Request
 from sqlalchemy.orm import Session
-from src.config import COOKIE_NAME
-from src.models import User, Broker
 
+from src.cache import cached_json_response, catalogue_cache, serialize
+from src.database import get_read_db
+from src.instrumentation import query_budget
+from src.models import Broker
+
+from .auth import current_user_id
 
 broker_router = APIRouter(prefix="/v1/broker", tags=["Broker"])
 
-@broker_router.get("")
+@broker_router.get("", dependencies=[query_budget(1)])
 def get_brokers(
     request: Request,
-    db: Session = Depends(get_db)
+    user_id: int = Depends(current_user_id),
+    db: Session = Depends(get_read_db)
 ):
-    token = request.cookies.get(COOKIE_NAME)
-    user_id = validate_auth_token(token)
-    
-    if not user_id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="No autenticado"
-        )
-    
-    user = db.query(User).get(user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Usuario no encontrado"
-        )
-    
-    broker = db.query(Broker).all()
+    entry = catalogue_cache.get("brokers")
+    if entry is None:
+        broker = db.query(Broker).all()
+        entry = catalogue_cache.set("brokers", serialize({"stocks": [
+            {"id": b.id, "broker": b.broker} for b in broker
+        ]}))
     
-    return {"stocks": broker}
\ No newline at end of file
+    return cached_json_response(request, entry)
\ No newline at end of file
@@ -1,13 +1,19 @@
 from datetime import datetime
-from typing import List
-from pydantic import BaseModel
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from src.models import Portfolio, BuyOrder, Transaction, SellOrder
-from src.database import get_db
-from src.config import COOKIE_NAME
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, TypeAdapter
 from sqlalchemy.orm import Session
-from .auth import validate_auth_token
 
+from src.cache import cached_json_response, serialize_model, user_cache
+from src.database import get_read_db, read_session_factory
+from src.history_export import ENCODERS, export_chunks
+from src.history_feed import decode_cursor, feed_query, format_feed
+from src.history_view import format_history, history_queries
+from src.instrumentation import query_budget
+
+from .auth import current_user_id
 
 history_router = APIRouter(prefix="/v1/history", tags=["Historail"])
 
@@ -29,80 +35,96 @@ class OrderResponse(BaseModel):
     timestamp: datetime
 
 class HistoryResponse(BaseModel):
-    transactions: List[TransactionResponse]
-    orders: List[OrderResponse]
+    transactions: list[TransactionResponse]
+    orders: list[OrderResponse]
 
-@history_router.get("", response_model=HistoryResponse)
-def user_history(
-    request: Request,
-    db: Session = Depends(get_db),
-    limit: int = 10  # Parámetro opcional para limitar resultados
-):
-    # Autenticación
-    token = request.cookies.get(COOKIE_NAME)
-    user_id = validate_auth_token(token)
-    
-    if not user_id:
+history_adapter = TypeAdapter(HistoryResponse)
+HISTORY_DEFAULT_LIMIT = 10
+
+class HistoryItemResponse(BaseModel):
+    id: int
+    type: str
+    amount: float
+    stock_symbol: str | None = None
+    quantity: float | None = None
+    portfolio_name: str | None = None
+    timestamp: datetime
+
+class HistoryFeedResponse(BaseModel):
+    items: list[HistoryItemResponse]
+    next_cursor: str | None = None
+
+def parse_cursor(cursor: str | None):
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="No autenticado"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor inválido"
         )
-    
-    # Obtener transacciones de dinero
-    money_transactions = db.query(Transaction).filter(
-        Transaction.user_id == user_id
-    ).order_by(
-        Transaction.timestamp.desc()
-    ).limit(limit).all()
-    
-    # Obtener órdenes de compra/venta
-    buy_orders = db.query(BuyOrder).join(
-        BuyOrder.portfolio
-    ).filter(
-        Portfolio.user_id == user_id
-    ).order_by(
-        BuyOrder.timestamp.desc()
-    ).limit(limit).all()
-    
-    sell_orders = db.query(SellOrder).join(
-        SellOrder.portfolio
-    ).filter(
-        Portfolio.user_id == user_id
-    ).order_by(
-        SellOrder.timestamp.desc()
-    ).limit(limit).all()
-    
-    # Formatear respuesta
-    formatted_transactions = [
-        TransactionResponse(
-            id=t.id,
-            type="deposit" if t.amount > 0 else "withdrawal",
-            amount=abs(t.amount),
-            description="Transferencia de fondos",
-            timestamp=t.timestamp
-        ) for t in money_transactions
-    ]
-    
-    formatted_orders = []
-    
-    for order in buy_orders + sell_orders:
-        order_type = "buy" if isinstance(order, BuyOrder) else "sell"
-        formatted_orders.append(
-            OrderResponse(
-                id=order.id,
-                type=order_type,
-                stock_symbol=order.stock.stock,
-                quantity=order.stock_quantity,
-                amount=order.amount,
-                portfolio_name=order.portfolio.portfolio,
-                timestamp=order.timestamp
-            )
+
+ExportFormat = Literal["csv", "ndjson", "parquet"]
+
+def export_encoder(format: str):
+    try:
+        return ENCODERS[format]()
+    except ImportError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Formato parquet no disponible: falta instalar pyarrow"
         )
+
+def export_response(chunks, encoder) -> StreamingResponse:
+    return StreamingResponse(
+        chunks,
+        media_type=encoder.media_type,
+        headers={"Content-Disposition": f'attachment; filename="history.{encoder.extension}"'}
+    )
+
+def stream_export(factory, user_id: int, encoder):
+    # La sesión vive lo que dura el stream, no lo que dura el handler
+    with factory() as db:
+        yield from export_chunks(db, user_id, encoder)
+
+@history_router.get("/export", dependencies=[query_budget(3)])
+def export_user_history(
+    request: Request,
+    user_id: int = Depends(current_user_id),
+    format: ExportFormat = "csv"
+):
+    """Historial completo (transacciones, compras y ventas) en orden cronológico"""
+    encoder = export_encoder(format)
     
-    # Ordenar todas las órdenes por timestamp (más reciente primero)
-    formatted_orders.sort(key=lambda x: x.timestamp, reverse=True)
+    return export_response(stream_export(read_session_factory(request), user_id, encoder), encoder)
+
+@history_router.get("/feed", response_model=HistoryFeedResponse, dependencies=[query_budget(1)])
+def user_history_feed(
+    user_id: int = Depends(current_user_id),
+    db: Session = Depends(get_read_db),
+    cursor: str | None = None,  # next_cursor de la página anterior
+    limit: int = Query(20, gt=0, le=200)
+):
+    rows = db.execute(feed_query(user_id, parse_cursor(cursor), limit + 1)).all()
     
-    return HistoryResponse(
-        transactions=formatted_transactions,
-        orders=formatted_orders[:limit]  # Aplicar límite también a las órdenes combinadas
-    )
\ No newline at end of file
+    return format_feed(rows, limit)
+
+def history_view(db: Session, user_id: int, limit: int) -> dict:
+    return format_history(*(db.scalars(query).all() for query in history_queries(user_id, limit)), limit)
+
+@history_router.get("", response_model=HistoryResponse, dependencies=[query_budget(3)])
+def user_history(
+    request: Request,
+    user_id: int = Depends(current_user_id),
+    db: Session = Depends(get_read_db),
+    limit: int = HISTORY_DEFAULT_LIMIT  # Parámetro opcional para limitar resultados
+):
+    if limit != HISTORY_DEFAULT_LIMIT:
+        return history_view(db, user_id, limit)
+    # Solo se cachea la página por defecto; las escrituras la invalidan en todos los workers
+    key = f"history:{user_id}"
+    entry = user_cache.get(key)
+    if entry is None:
+        entry = user_cache.set(key, serialize_model(history_adapter, history_view(db, user_id, limit)))
+    return cached_json_response(request, entry)
\ No newline at end of file
@@ -1,15 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from src.database import get_db
-from .auth import validate_auth_token
-from sqlalchemy.orm import Session
-from src.config import COOKIE_NAME
-from src.models import Portfolio
-from typing import List
-from pydantic import BaseModel
 from datetime import datetime
-from sqlalchemy.orm import joinedload
 
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy.orm import Session
+
+from src.cache import (
+    cached_json_response,
+    invalidate_users,
+    serialize_model,
+    user_cache,
+)
+from src.database import get_read_db, get_write_db, read_session_factory
+from src.instrumentation import query_budget
+from src.orders import owned_portfolio_query
+from src.portfolio_snapshot import snapshot_lines
+from src.portfolio_view import format_portfolios, portfolios_view_query
+from src.valuation import valuation_query, value_positions
 
+from .auth import current_user_id
 
 portfolio_router = APIRouter(prefix="/v1/portfolio", tags=["Portfolio"])
 
@@ -40,81 +49,88 @@ class SellOrderResponse(BaseModel):
 class PortfolioResponse(BaseModel):
     id: int
     name: str
-    stocks: List[PortfolioStockResponse]
-    buy_orders: List[BuyOrderResponse]
-    sell_orders: List[SellOrderResponse]
+    stocks: list[PortfolioStockResponse]
+    buy_orders: list[BuyOrderResponse]
+    sell_orders: list[SellOrderResponse]
+
+portfolios_adapter = TypeAdapter(list[PortfolioResponse])
 
-@portfolio_router.get("", response_model=List[PortfolioResponse])
+def portfolio_not_found() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Portfolio no encontrado o no pertenece al usuario"
+    )
+
+@portfolio_router.get("", response_model=list[PortfolioResponse], dependencies=[query_budget(4)])
 def get_user_portfolios(
     request: Request,
-    db: Session = Depends(get_db)
+    user_id: int = Depends(current_user_id),
+    db: Session = Depends(get_read_db)
 ):
-    # Autenticación
-    token = request.cookies.get(COOKIE_NAME)
-    user_id = validate_auth_token(token)
-    
-    if not user_id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="No autenticado"
-        )
-    
-    # Obtener todos los portfolios del usuario con sus relaciones
-    portfolios = db.query(Portfolio).filter(
-        Portfolio.user_id == user_id
-    ).options(
-        joinedload(Portfolio.portfolio_stocks),
-        joinedload(Portfolio.buy_orders),
-        joinedload(Portfolio.sell_orders)
-    ).all()
-    
-    if not portfolios:
-        return []
-    
-    # Formatear la respuesta
-    response = []
-    for portfolio in portfolios:
-        portfolio_data = {
-            "id": portfolio.id,
-            "name": portfolio.portfolio,
-            "stocks": [],
-            "buy_orders": [],
-            "sell_orders": []
-        }
-        
-        # Stocks en el portfolio
-        for stock in portfolio.portfolio_stocks:
-            portfolio_data["stocks"].append({
-                "stock_id": stock.stock_id,
-                "quantity": stock.quantity,
-                "average_price": stock.average_price
-            })
-        
-        # Órdenes de compra
-        for order in portfolio.buy_orders:
-            portfolio_data["buy_orders"].append({
-                "id": order.id,
-                "stock_id": order.stock_id,
-                "amount": order.amount,
-                "stock_quantity": order.stock_quantity,
-                "state": order.state,
-                "timestamp": order.timestamp
-            })
-        
-        # Órdenes de venta
-        for order in portfolio.sell_orders:
-            portfolio_data["sell_orders"].append({
-                "id": order.id,
-                "stock_id": order.stock_id,
-                "amount": order.amount,
-                "stock_quantity": order.stock_quantity,
-                "state": order.state,
-                "timestamp": order.timestamp
-            })
-        
-        response.append(portfolio_data)
+    # Vista cacheada por usuario; las escrituras la invalidan en todos los workers
+    key = f"portfolio:{user_id}"
+    entry = user_cache.get(key)
+    if entry is None:
+        portfolios = db.scalars(portfolios_view_query(user_id)).all()
+        entry = user_cache.set(key, serialize_model(portfolios_adapter, format_portfolios(portfolios)))
+    return cached_json_response(request, entry)
+
+def stream_snapshot(factory, user_id: int, orders_limit: int):
+    # La sesión vive lo que dura el stream, no lo que dura el handler
+    with factory() as db:
+        yield from snapshot_lines(db, user_id, orders_limit)
+
+@portfolio_router.get("/snapshot", dependencies=[query_budget(4)])
+def get_portfolio_snapshot(
+    request: Request,
+    user_id: int = Depends(current_user_id),
+    orders_limit: int = Query(50, gt=0, le=500)  # Órdenes de compra y de venta por portfolio
+):
+    """NDJSON: una línea por portfolio con la forma de PortfolioResponse, las
+    `orders_limit` órdenes más recientes de cada tipo y `more_buy_orders` /
+    `more_sell_orders` si hay más (el resto se pagina con /v1/history/feed)"""
+    return StreamingResponse(
+        stream_snapshot(read_session_factory(request), user_id, orders_limit),
+        media_type="application/x-ndjson"
+    )
+
+class PositionValuationResponse(BaseModel):
+    stock_id: int
+    symbol: str
+    quantity: float
+    price: float
+    average_cost: float
+    market_value: float
+    cost_basis: float
+    unrealized_pnl: float
+    realized_pnl: float
+    weight: float
+
+class PortfolioValuationResponse(BaseModel):
+    id: int
+    name: str | None
+    market_value: float
+    cost_basis: float
+    unrealized_pnl: float
+    realized_pnl: float
+    weight: float
+    positions: list[PositionValuationResponse]
+
+class ValuationResponse(BaseModel):
+    market_value: float
+    cost_basis: float
+    unrealized_pnl: float
+    realized_pnl: float
+    portfolios: list[PortfolioValuationResponse]
+
+@portfolio_router.get("/valuation", response_model=ValuationResponse, dependencies=[query_budget(1)])
+def get_portfolio_valuation(
+    user_id: int = Depends(current_user_id),
+    db: Session = Depends(get_read_db)
+):
+    rows = db.execute(valuation_query(user_id)).all()
     
-    return response
+    return value_positions(rows)
 
 class UpdatePortfolioNameRequest(BaseModel):
     new_name: str
@@ -122,36 +138,20 @@ class UpdatePortfolioNameRequest(BaseModel):
 
 @portfolio_router.patch("/update-name")
 def update_portfolio_name(
-    request: Request,
     update_data: UpdatePortfolioNameRequest,
-    db: Session = Depends(get_db)
+    user_id: int = Depends(current_user_id),
+    db: Session = Depends(get_write_db)
 ):
-    # Autenticación
-    token = request.cookies.get(COOKIE_NAME)
-    user_id = validate_auth_token(token)
-    
-    if not user_id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="No autenticado"
-        )
-    
     # Verificar que el portfolio pertenece al usuario
-    portfolio = db.query(Portfolio).filter(
-        Portfolio.id == update_data.portfolio_id,
-        Portfolio.user_id == user_id
-    ).first()
-    
+    portfolio = db.scalar(owned_portfolio_query(user_id, update_data.portfolio_id))
     if not portfolio:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Portfolio no encontrado o no pertenece al usuario"
-        )
+        raise portfolio_not_found()
     
     try:
         # Actualizar el nombre
         portfolio.portfolio = update_data.new_name
         db.commit()
+        invalidate_users(user_id)
         
         return {"message": "Nombre del portfolio actualizado correctamente"}
     
@@ -159,5 +159,5 @@ def update_portfolio_name(
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error al actualizar el nombre: {str(e)}"
-        )
\ No newline at end of file
+            detail=f"Error al actualizar el nombre: {e!s}"
+        ) from e
\ No newline at end of file
@@ -0,0 +1,44 @@
+import hmac
+from datetime import datetime
+
+from fastapi import APIRouter, Header, HTTPException, status
+from pydantic import BaseModel
+
+from src.config import PRICE_FEED_KEY
+from src.ingestion import price_ingestor
+
+price_router = APIRouter(prefix="/v1/price", tags=["Prices"])
+
+class PriceTick(BaseModel):
+    symbol: str
+    price: float
+    timestamp: datetime | None = None
+
+class PriceTickBatch(BaseModel):
+    ticks: list[PriceTick]
+
+def check_feed_key(key: str | None):
+    if not key or not hmac.compare_digest(key, PRICE_FEED_KEY):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Clave de feed inválida"
+        )
+
+@price_router.post("/ticks", status_code=status.HTTP_202_ACCEPTED)
+def ingest_ticks(
+    batch: PriceTickBatch,
+    x_feed_key: str | None = Header(None)
+):
+    check_feed_key(x_feed_key)
+    
+    accepted = price_ingestor.submit(
+        (tick.symbol, tick.price, tick.timestamp) for tick in batch.ticks
+    )
+    
+    return {"accepted": accepted}
+
+@price_router.get("/ingestion-stats")
+def ingestion_stats(x_feed_key: str | None = Header(None)):
+    check_feed_key(x_feed_key)
+    
+    return price_ingestor.stats
\ No newline at end of file
@@ -1,231 +1,351 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from src.database import get_db
-from .auth import validate_auth_token
-from sqlalchemy.orm import Session
-from src.config import COOKIE_NAME
-from src.models import User, Stock, Portfolio, BuyOrder, SellOrder, PortfolioStock
-from pydantic import BaseModel
 from datetime import datetime
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from pydantic import BaseModel, Field
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from src.cache import cached_json_response, catalogue_cache, invalidate_users, serialize
+from src.database import get_read_db, get_write_db
+from src.execution import MODELS, cancel_pending, execution_engine, request_cancel
+from src.instrumentation import query_budget
+from src.ledger import debit_balance, order_row, plan_batch
+from src.models import Broker, BuyOrder, OrderState, SellOrder, Stock, utcnow
+from src.money import to_major
+from src.orders import (
+    batch_registered,
+    batch_reservations,
+    batch_targets,
+    broker_ids_query,
+    buy_order_registered,
+    cancel_registered,
+    order_status,
+    owned_portfolio_ids_query,
+    owned_portfolio_query,
+    release_reservation,
+    reserve_order,
+    reserved_positions,
+    sell_order_registered,
+    stocks_query,
+    user_order_query,
+)
+from src.prices import build_candles, candles_query
+
+from .auth import current_user_id
 
 stock_router = APIRouter(prefix="/v1/stock", tags=["Stocks"])
 
-@stock_router.get("")
+# Validaciones compartidas con src/router/aio/stock.py; las consultas y las
+# respuestas están en src/orders.py
+def not_found(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=detail
+    )
+
+def insufficient_funds() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Fondos insuficientes para completar la compra"
+    )
+
+def insufficient_stocks() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="No tienes suficientes acciones en tu portafolio para esta venta"
+    )
+
+def check_order_targets(portfolio, stock, broker_found: bool):
+    if not portfolio:
+        raise not_found("Portfolio no encontrado o no pertenece al usuario")
+    if not stock:
+        raise not_found("Acción no encontrada")
+    if not broker_found:
+        raise not_found("Broker no encontrado")
+
+def check_batch_targets(targets: tuple, owned: set, stocks: dict, brokers: set):
+    """`targets` viene de batch_targets(); el resto, de sus consultas"""
+    portfolio_ids, stock_ids, broker_ids = targets
+    check_order_targets(owned == portfolio_ids, len(stocks) == len(stock_ids), brokers == broker_ids)
+
+def serialize_stocks(stocks):
+    return serialize({"stocks": [
+        {
+            "id": stock.id,
+            "stock": stock.stock,
+            "quantity": stock.quantity,
+            "unit_value": to_major(stock.unit_value)
+        } for stock in stocks
+    ]})
+
+@stock_router.get("", dependencies=[query_budget(1)])
 def get_stocks(
     request: Request,
-    db: Session = Depends(get_db)
+    user_id: int = Depends(current_user_id),
+    db: Session = Depends(get_read_db)
 ):
-    token = request.cookies.get(COOKIE_NAME)
-    user_id = validate_auth_token(token)
-    
-    if not user_id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="No autenticado"
-        )
+    entry = catalogue_cache.get("stocks")
+    if entry is None:
+        stocks = db.query(Stock).all()
+        entry = catalogue_cache.set("stocks", serialize_stocks(stocks))
     
-    user = db.query(User).get(user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Usuario no encontrado"
-        )
+    return cached_json_response(request, entry)
+
+class CandleResponse(BaseModel):
+    timestamp: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+
+@stock_router.get("/{stock_id}/candles", response_model=list[CandleResponse], dependencies=[query_budget(2)])
+def get_stock_candles(
+    stock_id: int,
+    interval: int = Query(3600, gt=0),  # Segundos por vela
+    start: datetime | None = None,
+    end: datetime | None = None,
+    user_id: int = Depends(current_user_id),
+    db: Session = Depends(get_read_db)
+):
+    if not db.get(Stock, stock_id):
+        raise not_found("Acción no encontrada")
     
-    stocks = db.query(Stock).all()
+    rows = db.execute(candles_query(stock_id, interval, start, end)).all()
     
-    return {"stocks": stocks}
+    return build_candles(rows, interval)
 
 class RegisterOrderOrder(BaseModel):
     stockId: int
     portfolioId: int
     ammount: float
-    stock_quantity: float
+    stock_quantity: float = Field(gt=0)
 
 # Request Models
 class RegisterOrderRequest(BaseModel):
     portfolio_id: int
     stock_id: int
-    stock_quantity: float
+    stock_quantity: float = Field(gt=0)
     amount: float
+    broker_id: int | None = None
+    # Sin precio límite la orden va al broker a precio de mercado
+    limit_price: float | None = Field(default=None, gt=0)
 
 # Buy Order Endpoint
 @stock_router.post("/register-buy-order")
 def register_buy_order(
-    request: Request,
     order_data: RegisterOrderRequest,
-    db: Session = Depends(get_db)
+    user_id: int = Depends(current_user_id),
+    db: Session = Depends(get_write_db)
 ):
-    # Authentication
-    token = request.cookies.get(COOKIE_NAME)
-    user_id = validate_auth_token(token)
-    
-    if not user_id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="No autenticado"
-        )
-    
-    # Get user and validate portfolio ownership
-    user = db.query(User).get(user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Usuario no encontrado"
-        )
-    
-    portfolio = db.query(Portfolio).filter(
-        Portfolio.id == order_data.portfolio_id,
-        Portfolio.user_id == user_id
-    ).first()
-    
-    if not portfolio:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Portfolio no encontrado o no pertenece al usuario"
-        )
-    
-    # Get stock and calculate total amount
-    stock = db.query(Stock).get(order_data.stock_id)
-    if not stock:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Acción no encontrada"
-        )
-    
-    total_amount = stock.unit_value * order_data.stock_quantity
-    
-    # Check sufficient funds
-    if user.balance is None or user.balance < total_amount:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Fondos insuficientes para completar la compra"
-        )
+    stock = db.get(Stock, order_data.stock_id)
+    check_order_targets(
+        db.scalar(owned_portfolio_query(user_id, order_data.portfolio_id)),
+        stock,
+        order_data.broker_id is None or db.get(Broker, order_data.broker_id) is not None
+    )
+    buy_order = BuyOrder(**order_row(order_data, stock, utcnow()))
     
     try:
-        # Deduct from user balance
-        user.balance -= total_amount
-        
-        # Create buy order
-        buy_order = BuyOrder(
-            portfolio_id=order_data.portfolio_id,
-            broker_id=None,
-            stock_id=order_data.stock_id,
-            amount=total_amount,
-            stock_quantity=order_data.stock_quantity,
-            state="completed",
-            timestamp=datetime.utcnow()
-        )
+        # Reserve the funds, only if they are sufficient (atomic); the position
+        # is updated once the order is filled (src/execution.py)
+        new_balance = db.execute(debit_balance(user_id, buy_order.amount)).scalar()
+        if new_balance is None:
+            raise insufficient_funds()
         
         db.add(buy_order)
-        
         db.commit()
+        execution_engine.notify()
+        invalidate_users(user_id)
         
-        return {
-            "message": "Orden de compra registrada exitosamente",
-            "new_balance": user.balance,
-            "order_id": buy_order.id
-        }
+        return buy_order_registered(buy_order, new_balance)
         
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error al registrar orden de compra: {str(e)}"
-        )
+            detail=f"Error al registrar orden de compra: {e!s}"
+        ) from e
 
 # Sell Order Endpoint
 @stock_router.post("/register-sell-order")
 def register_sell_order(
-    request: Request,
     order_data: RegisterOrderRequest,
-    db: Session = Depends(get_db)
+    user_id: int = Depends(current_user_id),
+    db: Session = Depends(get_write_db)
 ):
-    # Authentication
-    token = request.cookies.get(COOKIE_NAME)
-    user_id = validate_auth_token(token)
+    stock = db.get(Stock, order_data.stock_id)
+    check_order_targets(
+        db.scalar(owned_portfolio_query(user_id, order_data.portfolio_id)),
+        stock,
+        order_data.broker_id is None or db.get(Broker, order_data.broker_id) is not None
+    )
+    sell_order = SellOrder(**order_row(order_data, stock, utcnow()))
     
-    if not user_id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="No autenticado"
-        )
-    
-    # Get user
-    user = db.query(User).get(user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Usuario no encontrado"
-        )
-    
-    # Validate portfolio ownership
-    portfolio = db.query(Portfolio).filter(
-        Portfolio.id == order_data.portfolio_id,
-        Portfolio.user_id == user_id
-    ).first()
-    
-    if not portfolio:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Portfolio no encontrado o no pertenece al usuario"
-        )
-    
-    # Get stock
-    stock = db.query(Stock).get(order_data.stock_id)
-    if not stock:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Acción no encontrada"
-        )
-    
-    # Check stock quantity in portfolio
-    portfolio_stock = db.query(PortfolioStock).filter(
-        PortfolioStock.portfolio_id == order_data.portfolio_id,
-        PortfolioStock.stock_id == order_data.stock_id
-    ).first()
-    
-    if not portfolio_stock or portfolio_stock.quantity < order_data.stock_quantity:
+    try:
+        # Set aside the stocks, only if the portfolio holds enough (atomic);
+        # proceeds and realized P&L are booked once the order is filled
+        remaining_stocks = db.execute(reserve_order(order_data)).scalar()
+        if remaining_stocks is None:
+            raise insufficient_stocks()
+        
+        db.add(sell_order)
+        db.commit()
+        execution_engine.notify()
+        invalidate_users(user_id)
+        
+        return sell_order_registered(sell_order, remaining_stocks)
+        
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No tienes suficientes acciones en tu portafolio para esta venta"
-        )
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al registrar orden de venta: {e!s}"
+        ) from e
+
+class OrderLeg(BaseModel):
+    side: Literal["buy", "sell"]
+    portfolio_id: int
+    stock_id: int
+    stock_quantity: float = Field(gt=0)
+    broker_id: int | None = None
+    limit_price: float | None = Field(default=None, gt=0)
+
+class BatchOrderRequest(BaseModel):
+    orders: list[OrderLeg] = Field(min_length=1)
+
+# Batch Order Endpoint
+@stock_router.post("/orders/batch")
+def register_batch_orders(
+    batch: BatchOrderRequest,
+    user_id: int = Depends(current_user_id),
+    db: Session = Depends(get_write_db)
+):
+    # Portfolios, stocks and brokers are validated with one query each
+    targets = portfolio_ids, stock_ids, broker_ids = batch_targets(batch.orders)
+    owned = set(db.scalars(owned_portfolio_ids_query(user_id, portfolio_ids)).all())
+    stocks = {stock.id: stock for stock in db.scalars(stocks_query(stock_ids)).all()}
+    brokers = set(db.scalars(broker_ids_query(broker_ids)).all()) if broker_ids else set()
+    check_batch_targets(targets, owned, stocks, brokers)
     
-    total_amount = stock.unit_value * order_data.stock_quantity
+    buy_rows, sell_rows, sells = plan_batch(batch.orders, stocks, utcnow())
+    buy_amount = sum(row["amount"] for row in buy_rows)
     
     try:
-        # Update user balance
-        user.balance += total_amount
+        conn = db.connection()
         
-        # Create sell order
-        sell_order = SellOrder(
-            portfolio_id=order_data.portfolio_id,
-            broker_id=None,
-            stock_id=order_data.stock_id,
-            amount=total_amount,
-            stock_quantity=order_data.stock_quantity,
-            state="completed",
-            timestamp=datetime.utcnow()
-        )
-        db.add(sell_order)
+        # Set aside the stocks of every sell; each position must hold enough
+        # or the whole batch is rejected
+        if sells:
+            reserved = 0
+            for statement, params in batch_reservations(conn.dialect, sells):
+                reserved += reserved_positions(conn.execute(statement, params))
+            if reserved != len(sells):
+                raise insufficient_stocks()
         
-        # Update portfolio stock quantity
-        portfolio_stock.quantity -= order_data.stock_quantity
+        # Reserve the funds of every buy at once (atomic). Sell proceeds are
+        # credited when those orders fill, so they can't fund buys in the batch
+        new_balance = db.execute(debit_balance(user_id, buy_amount)).scalar()
+        if new_balance is None:
+            raise insufficient_funds()
         
-        # If quantity reaches zero, remove the stock from portfolio
-        if portfolio_stock.quantity <= 0:
-            db.delete(portfolio_stock)
+        # Bulk insert orders
+        buy_order_ids = db.scalars(
+            insert(BuyOrder).returning(BuyOrder.id), buy_rows
+        ).all() if buy_rows else []
+        sell_order_ids = db.scalars(
+            insert(SellOrder).returning(SellOrder.id), sell_rows
+        ).all() if sell_rows else []
         
         db.commit()
+        execution_engine.notify()
+        invalidate_users(user_id)
         
-        return {
-            "message": "Orden de venta registrada exitosamente",
-            "new_balance": user.balance,
-            "order_id": sell_order.id,
-            "remaining_stocks": portfolio_stock.quantity if portfolio_stock.quantity > 0 else 0
-        }
+        return batch_registered(new_balance, buy_order_ids, sell_order_ids)
         
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al registrar órdenes: {e!s}"
+        ) from e
+
+class OrderStatusResponse(BaseModel):
+    id: int
+    side: Literal["buy", "sell"]
+    portfolio_id: int
+    broker_id: int | None
+    stock_id: int
+    amount: float
+    stock_quantity: float
+    limit_price: float | None
+    filled_quantity: float
+    state: str
+    timestamp: datetime
+
+# Order Status Endpoint (pending -> routed -> filled | rejected)
+@stock_router.get("/orders/{side}/{order_id}", response_model=OrderStatusResponse, dependencies=[query_budget(1)])
+def get_order_status(
+    side: Literal["buy", "sell"],
+    order_id: int,
+    user_id: int = Depends(current_user_id),
+    db: Session = Depends(get_read_db)
+):
+    order = db.scalar(user_order_query(MODELS[side], order_id, user_id))
+    if not order:
+        raise not_found("Orden no encontrada")
+    
+    return order_status(side, order)
+
+# Cancel Order Endpoint
+@stock_router.delete("/orders/{side}/{order_id}")
+def cancel_order(
+    side: Literal["buy", "sell"],
+    order_id: int,
+    user_id: int = Depends(current_user_id),
+    db: Session = Depends(get_write_db)
+):
+    model = MODELS[side]
+    order = db.scalar(user_order_query(model, order_id, user_id))
+    if not order:
+        raise not_found("Orden no encontrada")
+    
+    try:
+        # Pending orders haven't reached the broker or the book: cancel them
+        # here and release their reservation in the same transaction
+        if db.execute(cancel_pending(model, order_id)).scalar() is not None:
+            db.execute(release_reservation(side, user_id, order))
+            state = OrderState.CANCELLED
+        # Resting limit orders are taken out of the book by the execution engine
+        elif db.execute(request_cancel(model, order_id)).scalar() is not None:
+            state = OrderState.CANCELLING
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="La orden ya no se puede cancelar"
+            )
+        
+        db.commit()
+        execution_engine.notify()
+        invalidate_users(user_id)
+        
+        return cancel_registered(order_id, state)
+        
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error al registrar orden de venta: {str(e)}"
-        )
\ No newline at end of file
+            detail=f"Error al cancelar orden: {e!s}"
+        ) from e
\ No newline at end of file
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from src.config import STREAM_RETRY_MS
+from src.streaming import current_prices, sse, stream_hub
+
+from .auth import current_user_id
+
+stream_router = APIRouter(prefix="/v1/stream", tags=["Stream"])
+
+@stream_router.get("")
+async def stream(
+    symbols: str = Query("", description="Símbolos separados por coma, ej: AAPL,MSFT"),
+    user_id: int = Depends(current_user_id)
+):
+    """Server-Sent Events: `prices` con los cambios de precio de los símbolos
+    pedidos y `orders` con los cambios de estado de las órdenes del usuario"""
+    wanted = {symbol.strip().upper() for symbol in symbols.split(",") if symbol.strip()}
+    
+    async def events():
+        # Se suscribe antes de leer los precios actuales para no perder cambios
+        subscription = stream_hub.subscribe(user_id, wanted)
+        try:
+            # Espera del cliente antes de reconectarse (ver STREAM_MAX_SECONDS)
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            if wanted:
+                yield sse("prices", await run_in_threadpool(current_prices, wanted))
+            async for message in subscription.messages():
+                yield message
+        finally:
+            stream_hub.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
\ No newline at end of file
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from src.cache import cache_bus
+from src.execution import execution_engine
+from src.metrics import render_metrics
+from src.pool import pool_metrics
+
+from .auth import current_user_id
+
+system_router = APIRouter(prefix="/v1/system", tags=["System"])
+# Sin prefijo ni auth, para el scraper de Prometheus
+metrics_router = APIRouter(tags=["System"])
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return render_metrics()
+
+@system_router.get("/pool-stats")
+def pool_stats(user_id: int = Depends(current_user_id)):
+    return {name: metrics.snapshot() for name, metrics in pool_metrics.items()}
+
+@system_router.get("/execution-stats")
+def execution_stats(user_id: int = Depends(current_user_id)):
+    return execution_engine.stats
+
+@system_router.get("/cache-stats")
+def cache_stats(user_id: int = Depends(current_user_id)):
+    return {
+        "caches": {name: cache.stats for name, cache in cache_bus.caches.items()},
+        "bus": {"connected": cache_bus.client is not None, **cache_bus.stats},
+    }
\ No newline at end of file
@@ -1,140 +1,108 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from src.database import get_db
-from .auth import validate_auth_token
-from sqlalchemy.orm import Session
-from src.config import COOKIE_NAME
-from src.models import User, Transaction
-from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
+from sqlalchemy.orm import Session
 
+from src.cache import invalidate_users
+from src.database import get_write_db
+from src.ledger import credit_balance, debit_balance
+from src.models import Transaction, utcnow
+from src.money import to_major, to_minor
+
+from .auth import current_user_id
 
 transaction_router = APIRouter(prefix="/v1/transaction", tags=["Transactions"])
 
+# Compartidos con src/router/aio/transaction.py
+def funds_amount(funds_data) -> int:
+    # Validate amount (in minor units: less than a cent rounds to zero)
+    amount = to_minor(funds_data.amount)
+    if amount <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El monto debe ser mayor que cero"
+        )
+    return amount
+
+def funds_transaction(user_id: int, amount: int) -> Transaction:
+    return Transaction(user_id=user_id, amount=amount, timestamp=utcnow())
+
+def funds_updated(message: str, new_balance: int) -> dict:
+    return {
+        "message": message,
+        "new_balance": to_major(new_balance)
+    }
+
 class AddFundsRequest(BaseModel):
     amount: float
 
 @transaction_router.post("/add-funds")
 def add_funds(
-    request: Request,
     funds_data: AddFundsRequest,
-    db: Session = Depends(get_db)
+    user_id: int = Depends(current_user_id),
+    db: Session = Depends(get_write_db)
 ):
-    # Authentication
-    token = request.cookies.get(COOKIE_NAME)
-    user_id = validate_auth_token(token)
-    
-    if not user_id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="No autenticado"
-        )
-    
-    # Validate amount
-    if funds_data.amount <= 0:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="El monto debe ser mayor que cero"
-        )
-    
-    # Get user
-    user = db.query(User).get(user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Usuario no encontrado"
-        )
+    amount = funds_amount(funds_data)
     
     try:
-        # Update user balance
-        if user.balance is None:
-            user.balance = 0.0
-        user.balance += funds_data.amount
+        # Update user balance (atomic)
+        new_balance = db.execute(credit_balance(user_id, amount)).scalar()
+        if new_balance is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Usuario no encontrado"
+            )
         
         # Create transaction record
-        transaction = Transaction(
-            user_id=user_id,
-            amount=funds_data.amount,
-            timestamp=datetime.utcnow()
-        )
-        
-        db.add(transaction)
+        db.add(funds_transaction(user_id, amount))
         db.commit()
+        invalidate_users(user_id)
         
-        return {
-            "message": "Fondos agregados exitosamente",
-            "new_balance": user.balance
-        }
+        return funds_updated("Fondos agregados exitosamente", new_balance)
         
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error al agregar fondos: {str(e)}"
-        )
+            detail=f"Error al agregar fondos: {e!s}"
+        ) from e
     
 class RetireFundsRequest(BaseModel):
     amount: float
 
 @transaction_router.post("/retire-funds")
 def retire_funds(
-    request: Request,
     funds_data: RetireFundsRequest,
-    db: Session = Depends(get_db)
+    user_id: int = Depends(current_user_id),
+    db: Session = Depends(get_write_db)
 ):
-    # Authentication
-    token = request.cookies.get(COOKIE_NAME)
-    user_id = validate_auth_token(token)
-    
-    if not user_id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="No autenticado"
-        )
-    
-    # Validate amount
-    if funds_data.amount <= 0:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="El monto debe ser mayor que cero"
-        )
-    
-    # Get user
-    user = db.query(User).get(user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Usuario no encontrado"
-        )
-    
-    # Check sufficient funds
-    if user.balance is None or user.balance < funds_data.amount:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Fondos insuficientes"
-        )
+    amount = funds_amount(funds_data)
     
     try:
-        # Update user balance
-        user.balance -= funds_data.amount
+        # Update user balance, only if funds are sufficient (atomic)
+        new_balance = db.execute(debit_balance(user_id, amount)).scalar()
+        if new_balance is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Fondos insuficientes"
+            )
         
         # Create transaction record (negative amount for withdrawal)
-        transaction = Transaction(
-            user_id=user_id,
-            amount=-funds_data.amount,  # Negative amount indicates withdrawal
-            timestamp=datetime.utcnow()
-        )
-        
-        db.add(transaction)
+        db.add(funds_transaction(user_id, -amount))
         db.commit()
+        invalidate_users(user_id)
         
-        return {
-            "message": "Fondos retirados exitosamente",
-            "new_balance": user.balance
-        }
+        return funds_updated("Fondos retirados exitosamente", new_balance)
         
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error al retirar fondos: {str(e)}"
-        )
\ No newline at end of file
+            detail=f"Error al retirar fondos: {e!s}"
+        ) from e
\ No newline at end of file
@@ -1,37 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from src.database import get_db
-from .auth import validate_auth_token
-from sqlalchemy.orm import Session
-from src.config import COOKIE_NAME, pwd_context
-from src.models import User
+from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel, EmailStr
+from sqlalchemy.orm import Session
 
+from src.database import get_write_db
+from src.models import User
+from src.passwords import PasswordPoolBusy, password_hasher
 
+from .auth import CurrentUser, current_user, password_pool_busy
 
 user_router = APIRouter(prefix="/v1/user", tags=["Users"])
 
 @user_router.get("/user")
 def protected_route(
-    request: Request,
-    db: Session = Depends(get_db)
+    current: CurrentUser = Depends(current_user)
 ):
-    token = request.cookies.get(COOKIE_NAME)
-    user_id = validate_auth_token(token)
-    
-    if not user_id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="No autenticado"
-        )
-    
-    user = db.query(User).get(user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Usuario no encontrado"
-        )
-    
-    return {"message": f"Hola {user.username}"}
+    return {"message": f"Hola {current.user.username}"}
 
 
 # Request model for updating user information
@@ -43,35 +26,38 @@ class UpdateUserInfoRequest(BaseModel):
 
 @user_router.patch("/update-info")
 def update_user_info(
-    request: Request,
     update_data: UpdateUserInfoRequest,
-    db: Session = Depends(get_db)
+    current: CurrentUser = Depends(current_user),
+    db: Session = Depends(get_write_db)
 ):
-    # Authentication
-    token = request.cookies.get(COOKIE_NAME)
-    user_id = validate_auth_token(token)
-    
-    if not user_id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="No autenticado"
-        )
-    
-    # Get user
-    user = db.query(User).get(user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Usuario no encontrado"
-        )
-    
     try:
+        # bcrypt corre antes de abrir la transacción de escritura: en el modo
+        # rendimiento de SQLite esa transacción toma el lock de escritor del proceso
+        hashed_password = None
+        if update_data.new_password is not None:
+            if not update_data.current_password:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Se requiere la contraseña actual para cambiarla"
+                )
+            
+            verified_hash = current.user.hashed_password
+            if not password_hasher.verify(update_data.current_password, verified_hash):
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Contraseña actual incorrecta"
+                )
+            
+            hashed_password = password_hasher.hash(update_data.new_password)
+        
+        user = CurrentUser(current.id, db).user
+        
         # Update username if provided
         if update_data.username is not None:
             # Check if username already exists (excluding current user)
             existing_user = db.query(User).filter(
                 User.username == update_data.username,
-                User.id != user_id
+                User.id != current.id
             ).first()
             if existing_user:
                 raise HTTPException(
@@ -85,7 +71,7 @@ def update_user_info(
             # Check if email already exists (excluding current user)
             existing_email = db.query(User).filter(
                 User.email == update_data.email,
-                User.id != user_id
+                User.id != current.id
             ).first()
             if existing_email:
                 raise HTTPException(
@@ -95,22 +81,14 @@ def update_user_info(
             user.email = update_data.email
         
         # Update password if provided
-        if update_data.new_password is not None:
-            if not update_data.current_password:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Se requiere la contraseña actual para cambiarla"
-                )
-            
-            # Verify current password (you'll need to implement this)
-            if not pwd_context.verify(update_data.current_password, user.hashed_password):
+        if hashed_password is not None:
+            # Otro request pudo cambiarla mientras corría bcrypt
+            if user.hashed_password != verified_hash:
                 raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Contraseña actual incorrecta"
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="La contraseña cambió durante la actualización, intente nuevamente"
                 )
-            
-            # Hash and update new password (you'll need to implement hash_password)
-            user.hashed_password = pwd_context.hash(update_data.new_password)
+            user.hashed_password = hashed_password
         
         db.commit()
         
@@ -126,9 +104,12 @@ def update_user_info(
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
+    except PasswordPoolBusy:
+        db.rollback()
+        raise password_pool_busy()
     except Exception as e:
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error al actualizar información: {str(e)}"
-        )
\ No newline at end of file
+            detail=f"Error al actualizar información: {e!s}"
+        ) from e
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""Perfil de producción para SQLite: WAL y pragmas al conectar, y un único escritor.
+
+Las lecturas usan BEGIN diferido y corren en paralelo gracias a WAL. Las
+transacciones de escritura (engines/sesiones con la opción `sqlite_writer`) abren
+con BEGIN IMMEDIATE y, en el engine sync, pasan de a una por un lock del proceso,
+así los escritores esperan en cola en vez de fallar con "database is locked".
+"""
+import threading
+
+from sqlalchemy import event
+
+from src.config import SQLITE_BUSY_TIMEOUT_MS, SQLITE_CACHE_SIZE, SQLITE_MMAP_SIZE
+
+WRITER_OPTION = "sqlite_writer"
+
+writer_lock = threading.Lock()
+
+
+def _set_pragmas(dbapi_connection, connection_record):
+    # El driver no abre transacciones por su cuenta; las abre el evento "begin"
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    cursor.close()
+
+
+def _release(conn):
+    if conn.info.pop("sqlite_writer_lock", False):
+        writer_lock.release()
+
+
+def configure_sqlite(engine, single_writer: bool = True):
+    """Aplica el perfil a un engine sync (para uno async, pasar `async_engine.sync_engine`).
+    `single_writer` serializa los escritores en un lock; no usarlo en engines
+    async, donde bloquearía el event loop: ahí la cola la hace busy_timeout."""
+    event.listen(engine, "connect", _set_pragmas)
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        if not conn.get_execution_options().get(WRITER_OPTION):
+            conn.exec_driver_sql("BEGIN")
+            return
+        if single_writer:
+            if not writer_lock.acquire(timeout=SQLITE_BUSY_TIMEOUT_MS / 1000):
+                raise TimeoutError("Tiempo de espera agotado por el escritor de SQLite")
+            conn.info["sqlite_writer_lock"] = True
+        try:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        except BaseException:
+            _release(conn)
+            raise
+
+    event.listen(engine, "commit", _release)
+    event.listen(engine, "rollback", _release)
\ No newline at end of file
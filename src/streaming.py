@@ -0,0 +1,179 @@
+"""Push de precios y estados de órdenes por Server-Sent Events.
+
+Los productores (PriceTickIngestor, ExecutionEngine) publican desde sus hilos en
+el StreamHub, que solo guarda el último valor por símbolo. Cada `interval`
+segundos una tarea del event loop reparte lo acumulado entre las suscripciones
+(índices por símbolo y por usuario), así el costo de un tick no depende de la
+cantidad de conexiones. Cada suscripción también guarda solo el último precio
+por símbolo y el último estado por orden: un cliente lento recibe el valor más
+reciente y los intermedios se descartan.
+
+Los eventos llegan solo a las conexiones del proceso que los produjo. Cada stream
+se cierra tras STREAM_MAX_SECONDS y el cliente (EventSource) se reconecta solo:
+así un reinicio no espera indefinidamente a las conexiones abiertas.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import select
+
+from src.config import STREAM_INTERVAL, STREAM_KEEPALIVE, STREAM_MAX_SECONDS
+from src.database import SessionLocal
+from src.metrics import collectors
+from src.models import Stock
+from src.money import to_major
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=datetime.isoformat)}\n\n"
+
+
+def current_prices(symbols: set) -> dict:
+    """Precio actual de los símbolos pedidos, para el primer mensaje del stream"""
+    with SessionLocal() as db:
+        return {
+            row.stock: {"price": to_major(row.unit_value), "timestamp": None}
+            for row in db.execute(select(Stock.stock, Stock.unit_value).where(Stock.stock.in_(symbols)))
+        }
+
+
+class Subscription:
+    __slots__ = ("orders", "prices", "ready", "symbols", "user_id")
+
+    def __init__(self, user_id: int, symbols: set):
+        self.user_id = user_id
+        self.symbols = symbols
+        # Pendientes de enviar: símbolo -> precio y (side, id) -> evento
+        self.prices: dict = {}
+        self.orders: dict = {}
+        self.ready = asyncio.Event()
+
+    async def messages(self, keepalive: float = STREAM_KEEPALIVE, max_seconds: float = STREAM_MAX_SECONDS):
+        """Un mensaje por tipo de evento cada vez que el hub entrega algo; un
+        comentario cada `keepalive` segundos para que proxies no corten la conexión"""
+        deadline = time.monotonic() + max_seconds
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                await asyncio.wait_for(self.ready.wait(), min(keepalive, remaining))
+            except TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            self.ready.clear()
+            prices, self.prices = self.prices, {}
+            orders, self.orders = self.orders, {}
+            if prices:
+                yield sse("prices", prices)
+            if orders:
+                yield sse("orders", list(orders.values()))
+
+
+class StreamHub:
+    def __init__(self, interval: float = STREAM_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        # Acumulado desde la última entrega, escrito por los productores
+        self._prices: dict = {}
+        self._orders: list = []
+        # Índices de suscripciones; solo se tocan desde el event loop
+        self._by_symbol: dict = defaultdict(set)
+        self._by_user: dict = defaultdict(set)
+        self._task: asyncio.Task | None = None
+        self.stats = {"connections": 0, "delivered": 0, "dropped": 0}
+
+    def has_order_subscribers(self) -> bool:
+        return bool(self._by_user)
+
+    def publish_prices(self, prices: dict):
+        """prices: símbolo -> (precio en unidades menores, timestamp); se puede
+        llamar desde cualquier hilo"""
+        if not self._by_symbol:
+            return
+        with self._lock:
+            for symbol, (price, timestamp) in prices.items():
+                self._prices[symbol] = {"price": to_major(price), "timestamp": timestamp}
+
+    def publish_orders(self, events: list):
+        """events: (user_id, evento); solo se guardan los de usuarios conectados"""
+        by_user = self._by_user
+        events = [event for event in events if event[0] in by_user]
+        if events:
+            with self._lock:
+                self._orders.extend(events)
+
+    def subscribe(self, user_id: int, symbols: set) -> Subscription:
+        subscription = Subscription(user_id, symbols)
+        for symbol in symbols:
+            self._by_symbol[symbol].add(subscription)
+        self._by_user[user_id].add(subscription)
+        self.stats["connections"] += 1
+        if self._task is None or self._task.done():
+            self.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for symbol in subscription.symbols:
+            self._discard(self._by_symbol, symbol, subscription)
+        self._discard(self._by_user, subscription.user_id, subscription)
+        self.stats["connections"] -= 1
+
+    @staticmethod
+    def _discard(index: dict, key, subscription: Subscription):
+        subscriptions = index.get(key)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del index[key]
+
+    def deliver(self):
+        """Reparte lo acumulado; si una suscripción todavía no envió el valor
+        anterior de un símbolo, se reemplaza (y se cuenta como descartado)"""
+        with self._lock:
+            prices, self._prices = self._prices, {}
+            orders, self._orders = self._orders, []
+        woken = set()
+        for symbol, tick in prices.items():
+            for subscription in self._by_symbol.get(symbol, ()):
+                if symbol in subscription.prices:
+                    self.stats["dropped"] += 1
+                subscription.prices[symbol] = tick
+                woken.add(subscription)
+        for user_id, event in orders:
+            for subscription in self._by_user.get(user_id, ()):
+                subscription.orders[(event["side"], event["id"])] = event
+                woken.add(subscription)
+        for subscription in woken:
+            subscription.ready.set()
+        self.stats["delivered"] += len(woken)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.deliver()
+
+    def start(self):
+        """Inicia la entrega en el event loop actual"""
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+stream_hub = StreamHub()
+
+
+def _collect_streams() -> list:
+    return [
+        "# TYPE stream_connections gauge",
+        f"stream_connections {stream_hub.stats['connections']}",
+        "# TYPE stream_dropped_ticks_total counter",
+        f"stream_dropped_ticks_total {stream_hub.stats['dropped']}",
+    ]
+
+
+collectors.append(_collect_streams)
\ No newline at end of file
@@ -0,0 +1,104 @@
+import numpy as np
+from sqlalchemy import func, select
+
+from src.models import Portfolio, PortfolioStock, Stock
+from src.money import MINOR_UNITS, to_major, to_major_array
+
+
+def valuation_query(user_id: int):
+    """Una fila por posición del ledger con cantidad, precio actual, costo y P&L
+    realizado (montos en unidades menores)"""
+    return select(
+        Portfolio.id,
+        Portfolio.portfolio,
+        Stock.id,
+        Stock.stock,
+        func.coalesce(PortfolioStock.quantity, 0),
+        func.coalesce(Stock.unit_value, 0),
+        func.coalesce(PortfolioStock.cost_basis, 0),
+        func.coalesce(PortfolioStock.realized_pnl, 0)
+    ).select_from(
+        PortfolioStock
+    ).join(
+        Portfolio, Portfolio.id == PortfolioStock.portfolio_id
+    ).join(
+        Stock, Stock.id == PortfolioStock.stock_id
+    ).where(
+        Portfolio.user_id == user_id
+    ).order_by(
+        Portfolio.id, Stock.id
+    )
+
+
+def value_positions(rows) -> dict:
+    """Valoriza todas las posiciones en una pasada sobre arrays NumPy. Los montos
+    son int64 en unidades menores, así los totales son exactos; solo los pesos y
+    el costo promedio son cocientes en float"""
+    if not rows:
+        return {"market_value": 0.0, "cost_basis": 0.0, "unrealized_pnl": 0.0,
+                "realized_pnl": 0.0, "portfolios": []}
+    
+    (portfolio_ids, portfolio_names, stock_ids, symbols, quantity, price,
+     cost_basis, realized) = zip(*rows)
+    quantity = np.asarray(quantity, dtype=np.int64)
+    price = np.asarray(price, dtype=np.int64)
+    cost_basis = np.asarray(cost_basis, dtype=np.int64)
+    realized = np.asarray(realized, dtype=np.int64)
+    
+    market_value = quantity * price
+    unrealized = market_value - cost_basis
+    average_cost = np.divide(cost_basis, quantity * MINOR_UNITS,
+                             out=np.zeros(len(quantity)), where=quantity > 0)
+    
+    # Totales por portfolio: las filas vienen ordenadas por portfolio, así cada
+    # grupo es un tramo contiguo y reduceat suma en int64 sin pasar por float
+    unique_ids, starts = np.unique(np.asarray(portfolio_ids), return_index=True)
+    group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(quantity)]))
+    group_value = np.add.reduceat(market_value, starts)
+    group_cost = np.add.reduceat(cost_basis, starts)
+    group_unrealized = np.add.reduceat(unrealized, starts)
+    group_realized = np.add.reduceat(realized, starts)
+    total_value = int(group_value.sum())
+    
+    position_weight = np.divide(market_value, group_value[group],
+                                out=np.zeros(len(market_value)), where=group_value[group] > 0)
+    portfolio_weight = np.divide(group_value, total_value,
+                                 out=np.zeros(len(group_value)), where=total_value > 0)
+    
+    columns = zip(stock_ids, symbols, quantity.tolist(), to_major_array(price).tolist(), average_cost.tolist(),
+                  to_major_array(market_value).tolist(), to_major_array(cost_basis).tolist(),
+                  to_major_array(unrealized).tolist(), to_major_array(realized).tolist(), position_weight.tolist())
+    portfolios = {}
+    names = dict(zip(portfolio_ids, portfolio_names))
+    for i, portfolio_id in enumerate(unique_ids.tolist()):
+        portfolios[portfolio_id] = {
+            "id": portfolio_id,
+            "name": names[portfolio_id],
+            "market_value": to_major(int(group_value[i])),
+            "cost_basis": to_major(int(group_cost[i])),
+            "unrealized_pnl": to_major(int(group_unrealized[i])),
+            "realized_pnl": to_major(int(group_realized[i])),
+            "weight": float(portfolio_weight[i]),
+            "positions": []
+        }
+    for portfolio_id, (stock_id, symbol, qty, px, avg, mv, cb, upnl, rpnl, weight) in zip(portfolio_ids, columns):
+        portfolios[portfolio_id]["positions"].append({
+            "stock_id": stock_id,
+            "symbol": symbol,
+            "quantity": qty,
+            "price": px,
+            "average_cost": avg,
+            "market_value": mv,
+            "cost_basis": cb,
+            "unrealized_pnl": upnl,
+            "realized_pnl": rpnl,
+            "weight": weight
+        })
+    
+    return {
+        "market_value": to_major(total_value),
+        "cost_basis": to_major(int(group_cost.sum())),
+        "unrealized_pnl": to_major(int(group_unrealized.sum())),
+        "realized_pnl": to_major(int(group_realized.sum())),
+        "portfolios": list(portfolios.values())
+    }
\ No newline at end of file
@@ -0,0 +1,76 @@
+"""src/config.py lee el entorno al importar: cada prueba carga la app con su
+propio entorno y una base SQLite nueva en tmp_path."""
+import importlib
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+USER = {"username": "john_doe", "password": "123456"}
+
+
+def _purge():
+    for name in list(sys.modules):
+        if name in ("main", "src") or name.startswith("src."):
+            del sys.modules[name]
+
+
+@pytest.fixture
+def environment(tmp_path, monkeypatch):
+    """environment(**env) aplica las variables de prueba más `env` y descarta los
+    módulos de src ya importados, así el próximo import las lee; devuelve la URL
+    de la base"""
+    database = tmp_path / "test.sqlite"
+
+    def apply(**env) -> str:
+        settings = {
+            "APP_ENV": "DEV",
+            "DB_URL": f"sqlite:///{database}",
+            "ASYNC_DB_URL": "",
+            "QUERY_GUARD": "raise",
+            "EXECUTION_INTERVAL": "0.05",
+            "SIMULATED_BROKER_LATENCY": "0",
+            "PRICE_FLUSH_INTERVAL": "0.05",
+        }
+        if env.pop("ASYNC", False):
+            settings["ASYNC_DB_URL"] = f"sqlite+aiosqlite:///{database}"
+        settings.update({key: str(value) for key, value in env.items()})
+        for key, value in settings.items():
+            monkeypatch.setenv(key, value)
+        _purge()
+        return settings["DB_URL"]
+
+    yield apply
+    _purge()
+
+
+@pytest.fixture
+def load_app(environment):
+    """load_app(**env) importa main con esas variables, corre el lifespan y
+    devuelve un TestClient ya autenticado como el usuario de ejemplo"""
+    clients = []
+
+    def load(**env) -> TestClient:
+        environment(**env)
+        client = TestClient(importlib.import_module("main").app)
+        client.__enter__()
+        clients.append(client)
+        assert client.post("/v1/auth/login", json=USER).status_code == 200
+        return client
+
+    yield load
+    for client in clients:
+        client.__exit__(None, None, None)
+
+
+@pytest.fixture
+def balance():
+    """balance() lee el saldo actual del usuario de ejemplo, en unidades menores"""
+    def read() -> int:
+        from src.database import SessionLocal
+        from src.models import User
+
+        with SessionLocal() as db:
+            return db.query(User.balance).filter(User.username == USER["username"]).scalar()
+
+    return read
\ No newline at end of file
@@ -0,0 +1,46 @@
+import pytest
+
+
+def feed_pages(client, limit: int) -> list:
+    pages, cursor = [], None
+    while True:
+        params = {"limit": limit} if cursor is None else {"limit": limit, "cursor": cursor}
+        response = client.get("/v1/history/feed", params=params)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        pages.append([(item["type"], item["id"]) for item in page["items"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("is_async", [False, True], ids=["sync", "async"])
+def test_feed_pages_cover_every_entry_once(load_app, is_async):
+    client = load_app(ASYNC=is_async)
+    for amount in (100, 200):
+        assert client.post("/v1/transaction/add-funds", json={"amount": amount}).status_code == 200
+    # Las patas de un batch comparten timestamp: el orden lo desempatan rank e id
+    legs = [{"side": "buy", "portfolio_id": 2, "stock_id": 1, "stock_quantity": 1} for _ in range(3)] + \
+           [{"side": "sell", "portfolio_id": 1, "stock_id": 1, "stock_quantity": 1} for _ in range(2)]
+    assert client.post("/v1/stock/orders/batch", json={"orders": legs}).status_code == 200
+    assert client.post("/v1/transaction/retire-funds", json={"amount": 50}).status_code == 200
+
+    (everything,) = feed_pages(client, 200)
+    assert everything == [
+        ("withdrawal", 3),
+        ("sell", 2), ("sell", 1), ("buy", 3), ("buy", 2), ("buy", 1),
+        ("deposit", 2), ("deposit", 1),
+    ]
+    for limit in (1, 3, 8):
+        pages = feed_pages(client, limit)
+        assert [entry for page in pages for entry in page] == everything
+        assert all(len(page) == limit for page in pages[:-1])
+
+
+@pytest.mark.parametrize("is_async", [False, True], ids=["sync", "async"])
+def test_feed_rejects_invalid_cursor(load_app, is_async):
+    client = load_app(ASYNC=is_async)
+
+    response = client.get("/v1/history/feed", params={"cursor": "no-es-un-cursor"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cursor inválido"
\ No newline at end of file
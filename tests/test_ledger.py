@@ -0,0 +1,63 @@
+import threading
+from collections import Counter
+
+import pytest
+
+
+def transactions() -> list:
+    from src.database import SessionLocal
+    from src.models import Transaction
+
+    with SessionLocal() as db:
+        return [amount for (amount,) in db.query(Transaction.amount).order_by(Transaction.id)]
+
+
+@pytest.mark.parametrize("is_async", [False, True], ids=["sync", "async"])
+def test_concurrent_withdrawals_never_overdraw(load_app, balance, is_async):
+    client = load_app(ASYNC=is_async)
+    before = balance()
+    # 8 hilos x 10 retiros de un décimo del saldo: solo 10 pueden pasar
+    amount = before // 10
+    codes = Counter()
+
+    def withdraw():
+        for _ in range(10):
+            response = client.post("/v1/transaction/retire-funds", json={"amount": amount / 100})
+            codes[response.status_code] += 1
+
+    threads = [threading.Thread(target=withdraw) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert codes == {200: 10, 400: 70}
+    assert balance() == before - 10 * amount
+    assert transactions() == [-amount] * 10
+
+
+@pytest.mark.parametrize("is_async", [False, True], ids=["sync", "async"])
+@pytest.mark.parametrize("route", ["add-funds", "retire-funds"])
+@pytest.mark.parametrize("amount", [-50, 0, 0.001])
+def test_non_positive_amounts_are_rejected(load_app, balance, is_async, route, amount):
+    client = load_app(ASYNC=is_async)
+    before = balance()
+
+    response = client.post(f"/v1/transaction/{route}", json={"amount": amount})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "El monto debe ser mayor que cero"
+    assert balance() == before
+    assert transactions() == []
+
+
+def test_debit_only_applies_when_funds_suffice(load_app, balance):
+    load_app()
+    from src.database import engine
+    from src.ledger import credit_balance, debit_balance
+
+    before = balance()
+    with engine.begin() as conn:
+        assert conn.execute(debit_balance(1, before + 1)).scalar() is None
+        assert conn.execute(debit_balance(1, before)).scalar() == 0
+        assert conn.execute(credit_balance(1, 250)).scalar() == 250
+    assert balance() == 250
\ No newline at end of file
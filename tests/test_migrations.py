@@ -0,0 +1,138 @@
+import pytest
+from sqlalchemy import inspect, text
+
+
+def test_unique_indexes_are_not_created_over_duplicates(environment):
+    environment(APP_ENV="PROD")
+    from src.database import Base, engine
+    from src.migrations import DuplicateValues, add_missing_indexes
+
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text('DROP INDEX ix_user_email'))
+        conn.execute(text('DROP INDEX ix_stock_stock'))
+        conn.execute(text('DROP INDEX ix_transaction_user_id_timestamp'))
+        conn.execute(text(
+            "INSERT INTO user (username, email, hashed_password) VALUES "
+            "('ana', 'repetido@example.dev', 'x'), ('bea', 'repetido@example.dev', 'x')"
+        ))
+
+    with pytest.raises(DuplicateValues, match=r"ix_user_email en user \(email\): \('repetido@example.dev',\) x2"):
+        add_missing_indexes(engine)
+    # No se crea ninguno, tampoco los que no tenían problemas
+    created = {index["name"] for index in inspect(engine).get_indexes("stock")}
+    assert "ix_stock_stock" not in created
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE user SET email = 'bea@example.dev' WHERE username = 'bea'"))
+    assert set(add_missing_indexes(engine)) == {"ix_stock_stock", "ix_transaction_user_id_timestamp", "ix_user_email"}
+
+def test_null_timestamps_are_backfilled_and_paginated(environment):
+    environment(APP_ENV="PROD")
+    from src.database import Base, engine
+    from src.history_feed import decode_cursor, feed_query, format_feed
+    from src.migrations import migrate
+
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        # Esquema anterior: timestamp aceptaba NULL
+        conn.execute(text('DROP TABLE "transaction"'))
+        conn.execute(text(
+            'CREATE TABLE "transaction" (id INTEGER PRIMARY KEY, '
+            'user_id INTEGER NOT NULL REFERENCES user (id), amount BIGINT NOT NULL, timestamp DATETIME)'
+        ))
+        conn.execute(text("INSERT INTO user (id, username, email, hashed_password) VALUES (1, 'ana', 'ana@example.dev', 'x')"))
+        conn.execute(text(
+            'INSERT INTO "transaction" (id, user_id, amount, timestamp) VALUES '
+            "(1, 1, 100, '2024-01-02 00:00:00.000000'), (2, 1, 200, NULL), (3, 1, 300, '2024-01-03 00:00:00.000000')"
+        ))
+
+    migrate(engine)
+    columns = {column["name"]: column for column in inspect(engine).get_columns("transaction")}
+    assert columns["timestamp"]["nullable"] is False
+
+    ids, cursor = [], None
+    with engine.connect() as conn:
+        while True:
+            page = format_feed(conn.execute(feed_query(1, cursor, 2)).all(), 1)
+            ids += [item["id"] for item in page["items"]]
+            if page["next_cursor"] is None:
+                break
+            cursor = decode_cursor(page["next_cursor"])
+    # Sin fecha conocida queda como el movimiento más viejo
+    assert ids == [3, 1, 2]
+
+
+# Esquema inicial del proyecto: montos en float, sin índices ni columnas nuevas
+BASELINE_SCHEMA = [
+    ('CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR NOT NULL, email VARCHAR NOT NULL, '
+     'hashed_password VARCHAR NOT NULL, balance FLOAT)'),
+    'CREATE TABLE stock (id INTEGER PRIMARY KEY, stock VARCHAR NOT NULL, quantity INTEGER, unit_value FLOAT)',
+    ('CREATE TABLE "transaction" (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES user (id), '
+     'amount FLOAT NOT NULL, timestamp DATETIME)'),
+    'CREATE TABLE portfolio (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES user (id), portfolio VARCHAR)',
+    ('CREATE TABLE portfolio_stock (id INTEGER PRIMARY KEY, portfolio_id INTEGER NOT NULL REFERENCES portfolio (id), '
+     'stock_id INTEGER NOT NULL REFERENCES stock (id), quantity INTEGER)'),
+    'CREATE TABLE broker (id INTEGER PRIMARY KEY, broker VARCHAR)',
+    *(
+        f'CREATE TABLE {table} (id INTEGER PRIMARY KEY, portfolio_id INTEGER NOT NULL REFERENCES portfolio (id), '
+        'broker_id INTEGER REFERENCES broker (id), stock_id INTEGER NOT NULL REFERENCES stock (id), '
+        'amount FLOAT NOT NULL, stock_quantity INTEGER NOT NULL, state VARCHAR, timestamp DATETIME)'
+        for table in ("buy_order", "sell_order")
+    ),
+]
+
+BASELINE_ROWS = [
+    "INSERT INTO user VALUES (1, 'ana', 'ana@example.dev', 'x', 1234.56)",
+    "INSERT INTO stock VALUES (1, 'AAPL', 100, 175.5)",
+    """INSERT INTO "transaction" VALUES (1, 1, 100.25, '2024-01-02 00:00:00.000000'), (2, 1, -0.1, NULL)""",
+    "INSERT INTO portfolio VALUES (1, 1, 'Retiro')",
+    "INSERT INTO portfolio_stock VALUES (1, 1, 1, 3)",
+    "INSERT INTO buy_order VALUES (1, 1, NULL, 1, 351.0, 2, 'filled', NULL)",
+    "INSERT INTO sell_order VALUES (1, 1, NULL, 1, 175.5, 1, 'filled', '2024-01-03 00:00:00.000000')",
+]
+
+
+def test_baseline_database_is_migrated(environment):
+    environment(APP_ENV="PROD")
+    from src.database import Base, engine
+    from src.migrations import check_query_plans, migrate, money_conversions
+
+    with engine.begin() as conn:
+        for statement in BASELINE_SCHEMA + BASELINE_ROWS:
+            conn.execute(text(statement))
+
+    def snapshot() -> dict:
+        with engine.connect() as conn:
+            return {
+                "balance": conn.scalar(text("SELECT balance FROM user")),
+                "unit_value": conn.scalar(text("SELECT unit_value FROM stock")),
+                "transactions": conn.execute(text('SELECT amount, timestamp FROM "transaction" ORDER BY id')).all(),
+                "orders": conn.execute(text(
+                    "SELECT amount, timestamp FROM buy_order UNION ALL SELECT amount, timestamp FROM sell_order"
+                )).all(),
+            }
+
+    migrate(engine)
+    migrated = snapshot()
+    assert migrated == {
+        "balance": 123456,
+        "unit_value": 17550,
+        "transactions": [(10025, "2024-01-02 00:00:00.000000"), (-10, "1970-01-01 00:00:00.000000")],
+        "orders": [(35100, "1970-01-01 00:00:00.000000"), (17550, "2024-01-03 00:00:00.000000")],
+    }
+
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        columns = {column["name"]: column for column in inspector.get_columns(table.name)}
+        assert set(columns) == {column.name for column in table.columns}, table.name
+        assert {index["name"] for index in inspector.get_indexes(table.name)} >= {index.name for index in table.indexes}
+        for column in table.columns:
+            if not column.nullable and not column.primary_key:
+                assert columns[column.name]["nullable"] is False, f"{table.name}.{column.name}"
+    assert money_conversions(engine) == {}
+    assert check_query_plans(engine)
+
+    # Correrla de nuevo no vuelve a convertir ni rellenar nada
+    migrate(engine)
+    assert snapshot() == migrated
\ No newline at end of file
@@ -0,0 +1,116 @@
+import pytest
+
+from src.order_book import BUY, SELL, Fill, OrderBook
+
+
+def test_crossing_order_fills_at_resting_price_in_time_priority():
+    book = OrderBook()
+    assert book.submit(SELL, 1, 18000, 1) == []
+    assert book.submit(SELL, 2, 18000, 2) == []
+    assert book.submit(SELL, 3, 17500, 1) == []
+
+    fills = book.submit(BUY, 10, 18500, 3)
+    # Primero el mejor precio, luego por orden de llegada dentro del nivel
+    assert fills == [Fill(10, 3, 17500, 1), Fill(10, 1, 18000, 1), Fill(10, 2, 18000, 1)]
+    assert book.depth() == {"bids": [], "asks": [{"price": 18000, "quantity": 1}]}
+    assert (SELL, 2) in book and (SELL, 1) not in book
+
+
+def test_unfilled_remainder_rests_on_the_book():
+    book = OrderBook()
+    book.submit(BUY, 1, 17000, 2)
+
+    assert book.submit(SELL, 2, 17500, 1) == []
+    assert book.submit(SELL, 3, 16000, 5) == [Fill(1, 3, 17000, 2)]
+    assert book.best_bid() is None
+    assert book.best_ask() == 16000
+    assert book.depth()["asks"] == [{"price": 16000, "quantity": 3}, {"price": 17500, "quantity": 1}]
+
+
+def test_cancelled_orders_are_not_matched():
+    book = OrderBook()
+    book.submit(SELL, 1, 18000, 1)
+    book.submit(SELL, 2, 18100, 1)
+
+    assert book.cancel(SELL, 1).id == 1
+    assert book.cancel(SELL, 1) is None
+    assert book.best_ask() == 18100
+    # El nivel vaciado puede volver a crearse antes de salir del heap
+    book.submit(SELL, 3, 18000, 1)
+    assert book.submit(BUY, 4, 18200, 2) == [Fill(4, 3, 18000, 1), Fill(4, 2, 18100, 1)]
+    assert len(book) == 0
+
+
+@pytest.fixture(params=[False, True], ids=["sync", "async"])
+def engine_app(request, load_app):
+    """App con el motor de ejecución detenido: cada ciclo se corre a mano"""
+    client = load_app(ASYNC=request.param)
+    from src.execution import execution_engine
+
+    execution_engine.stop()
+
+    def run():
+        while execution_engine.run_once():
+            pass
+
+    yield client, run
+    execution_engine.start()
+
+
+def order(side: str, order_id: int) -> tuple:
+    from src.database import SessionLocal
+    from src.models import BuyOrder, SellOrder
+
+    with SessionLocal() as db:
+        row = db.get(BuyOrder if side == "buy" else SellOrder, order_id)
+        return row.state, row.filled_quantity
+
+
+def test_limit_orders_cross_and_cancel_refunds_the_rest(engine_app, balance):
+    client, run = engine_app
+    start = balance()
+
+    def post(side: str, portfolio_id: int, quantity: int, limit_price: float) -> int:
+        response = client.post(f"/v1/stock/register-{side}-order", json={
+            "portfolio_id": portfolio_id, "stock_id": 1, "stock_quantity": quantity,
+            "amount": 0, "limit_price": limit_price
+        })
+        assert response.status_code == 200, response.text
+        return response.json()["order_id"]
+
+    sell_id = post("sell", 1, 1, 180)
+    run()
+    assert order("sell", sell_id) == ("open", 0)
+
+    # Reserva 2 x 185; cruza 1 a 180 y queda 1 en reposo
+    buy_id = post("buy", 2, 2, 185)
+    assert balance() == start - 37000
+    run()
+    assert order("sell", sell_id) == ("filled", 1)
+    assert order("buy", buy_id) == ("open", 1)
+    # Vuelven los 5 de diferencia con el límite y entran los 180 de la venta
+    assert balance() == start - 37000 + 500 + 18000
+
+    response = client.delete(f"/v1/stock/orders/buy/{buy_id}")
+    assert response.json()["state"] == "cancelling"
+    run()
+    assert order("buy", buy_id) == ("cancelled", 1)
+    # Se devuelve la reserva de la acción que no se ejecutó
+    assert balance() == start
+    assert client.delete(f"/v1/stock/orders/buy/{buy_id}").status_code == 409
+
+
+def test_cancelling_a_pending_order_releases_its_reservation(engine_app, balance):
+    client, _ = engine_app
+    start = balance()
+
+    response = client.post("/v1/stock/register-buy-order", json={
+        "portfolio_id": 1, "stock_id": 1, "stock_quantity": 2, "amount": 0
+    })
+    order_id = response.json()["order_id"]
+    assert balance() < start
+
+    response = client.delete(f"/v1/stock/orders/buy/{order_id}")
+    assert response.json()["state"] == "cancelled"
+    assert order("buy", order_id) == ("cancelled", 0)
+    assert balance() == start
\ No newline at end of file
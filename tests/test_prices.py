@@ -0,0 +1,34 @@
+from datetime import datetime
+
+
+def rollup_and_price(symbol: str):
+    from sqlalchemy import select
+
+    from src.database import SessionLocal
+    from src.models import Stock, StockPriceRollup
+
+    with SessionLocal() as db:
+        stock = db.execute(select(Stock).where(Stock.stock == symbol)).scalar_one()
+        rollup = db.execute(select(StockPriceRollup).where(StockPriceRollup.stock_id == stock.id)).scalar_one()
+        return (rollup.open, rollup.high, rollup.low, rollup.close), stock.unit_value
+
+
+def test_late_ticks_do_not_overwrite_newer_prices(load_app):
+    load_app()
+    from src.database import SessionLocal
+    from src.ingestion import price_ingestor
+    from src.models import Stock
+
+    with SessionLocal() as db:
+        symbol = db.query(Stock.stock).first()[0]
+
+    price_ingestor.submit([(symbol, 100, datetime(2026, 1, 5, 10, 30))])
+    price_ingestor.flush()
+    # Llega tarde: es la apertura del bucket, pero ni el cierre ni el precio actual
+    price_ingestor.submit([(symbol, 90, datetime(2026, 1, 5, 10, 10))])
+    price_ingestor.flush()
+    assert rollup_and_price(symbol) == ((9000, 10000, 9000, 10000), 10000)
+
+    price_ingestor.submit([(symbol, 110, datetime(2026, 1, 5, 10, 50))])
+    price_ingestor.flush()
+    assert rollup_and_price(symbol) == ((9000, 11000, 9000, 11000), 11000)
\ No newline at end of file
@@ -0,0 +1,55 @@
+import pytest
+
+BUDGETED_ROUTES = [
+    "/v1/stock",
+    "/v1/stock/1/candles",
+    "/v1/stock/orders/buy/{order_id}",
+    "/v1/broker",
+    "/v1/portfolio",
+    "/v1/portfolio/valuation",
+    "/v1/portfolio/snapshot",
+    "/v1/history",
+    "/v1/history/feed",
+    "/v1/history/export",
+]
+
+
+@pytest.mark.parametrize("performance_mode", [False, True], ids=["default", "performance"])
+@pytest.mark.parametrize("is_async", [False, True], ids=["sync", "async"])
+def test_budgeted_routes_stay_within_budget(load_app, performance_mode, is_async):
+    client = load_app(SQLITE_PERFORMANCE_MODE=performance_mode, ASYNC=is_async)
+    order = client.post("/v1/stock/register-buy-order", json={
+        "portfolio_id": 1, "stock_id": 1, "stock_quantity": 1, "amount": 0
+    })
+    assert order.status_code == 200
+
+    for route in BUDGETED_ROUTES:
+        response = client.get(route.format(order_id=order.json()["order_id"]))
+        assert response.status_code == 200, (route, response.text)
+
+
+def test_transaction_control_is_not_counted():
+    from src import query_guard
+
+    for statement in ("BEGIN", "BEGIN IMMEDIATE", "commit", "ROLLBACK TO SAVEPOINT sa_1",
+                      "SAVEPOINT sa_1", "RELEASE SAVEPOINT sa_1", "PRAGMA journal_mode=WAL"):
+        assert query_guard.is_control(statement)
+    assert not query_guard.is_control("SELECT * FROM portfolio")
+    assert not query_guard.is_control("UPDATE begin_table SET x = 1")
+
+
+def test_repeated_statements_are_reported():
+    from collections import Counter
+
+    from src import query_guard
+    from src.instrumentation import RequestStats
+
+    stats = RequestStats()
+    stats.query_budget = 100
+    stats.fingerprints = Counter()
+    for stock_id in range(query_guard.QUERY_REPEAT_THRESHOLD):
+        stats.sql_queries += 1
+        stats.fingerprints[query_guard.fingerprint(f"SELECT * FROM stock WHERE id = {stock_id}")] += 1
+
+    found = query_guard.violations(stats)
+    assert found["repeated"] == {"SELECT * FROM stock WHERE id = ?": query_guard.QUERY_REPEAT_THRESHOLD}
\ No newline at end of file
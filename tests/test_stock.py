@@ -0,0 +1,15 @@
+import pytest
+
+
+@pytest.mark.parametrize("is_async", [False, True], ids=["sync", "async"])
+@pytest.mark.parametrize("side", ["buy", "sell"])
+@pytest.mark.parametrize("quantity", [-5, 0])
+def test_order_quantity_must_be_positive(load_app, balance, is_async, side, quantity):
+    client = load_app(ASYNC=is_async)
+    before = balance()
+
+    response = client.post(f"/v1/stock/register-{side}-order", json={
+        "portfolio_id": 1, "stock_id": 1, "stock_quantity": quantity, "amount": 0
+    })
+    assert response.status_code == 422
+    assert balance() == before
\ No newline at end of file
@@ -0,0 +1,52 @@
+import threading
+
+
+class OwnedLock:
+    """Lock que recuerda qué thread lo tiene"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.owner = None
+
+    def acquire(self, *args, **kwargs) -> bool:
+        acquired = self._lock.acquire(*args, **kwargs)
+        if acquired:
+            self.owner = threading.get_ident()
+        return acquired
+
+    def release(self):
+        self.owner = None
+        self._lock.release()
+
+
+def test_password_change_hashes_outside_the_writer_lock(load_app, monkeypatch):
+    client = load_app(SQLITE_PERFORMANCE_MODE=True)
+    from src import sqlite
+    from src.passwords import password_hasher
+
+    # El motor de ejecución y el ingestor también escriben: solo importa si lo tiene el request
+    lock = OwnedLock()
+    monkeypatch.setattr(sqlite, "writer_lock", lock)
+    held = []
+    for method in ("verify", "hash"):
+        original = getattr(password_hasher, method)
+        def spy(*args, original=original):
+            held.append(lock.owner == threading.get_ident())
+            return original(*args)
+        monkeypatch.setattr(password_hasher, method, spy)
+
+    response = client.patch("/v1/user/update-info", json={
+        "current_password": "123456", "new_password": "654321"
+    })
+    assert response.status_code == 200, response.text
+    assert held == [False, False]
+
+    client.cookies.clear()
+    assert client.post("/v1/auth/login", json={"username": "john_doe", "password": "654321"}).status_code == 200
+
+
+def test_wrong_current_password_is_rejected(load_app):
+    client = load_app()
+    response = client.patch("/v1/user/update-info", json={
+        "current_password": "incorrecta", "new_password": "654321"
+    })
+    assert response.status_code == 401
\ No newline at end of file